@@ -47,6 +47,7 @@ class MemAP(AP):
         self.csw_ainc       = self.csw_reset & 0x00000030
         self.csw            = -1
         self.base_component = None
+        self.component_ids  = {}
 
     def __repr__(self):
         features = [v for k, v in MemAP.FLAGS_TABLE.items() if self.flags & k]
@@ -64,6 +65,9 @@ class MemAP(AP):
     def read_bulk(self, addr, size):
         return self.db.read_bulk(addr, size, self.ap_num)
 
+    def read_bulk_into(self, addr, buf):
+        self.db.read_bulk_into(addr, buf, self.ap_num)
+
     def write_32(self, v, addr):
         self.db.write_32(v, addr, self.ap_num)
 
@@ -180,12 +184,18 @@ IDR_MAPPERS = [
     ]
 
 
-def probe_ap(db, ap_num, verbose=False):
-    try:
-        idr = db.read_ap_reg(ap_num, 0xFC)
-        if idr == 0:
+def probe_ap(db, ap_num, verbose=False, idr=None):
+    '''
+    Instantiates the AP with the specified number, or returns None if it isn't
+    present or isn't recognized.  If the caller has already read the AP's IDR
+    then it can be passed in to save reading it again.
+    '''
+    if idr is None:
+        try:
+            idr = db.read_ap_reg(ap_num, 0xFC)
+        except Exception:
             return None
-    except Exception:
+    if idr == 0:
         return None
 
     for im in IDR_MAPPERS:
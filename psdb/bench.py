@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import argparse
+import datetime
+import io
+import json
+import platform
+import random
+import sys
+import time
+
+import psdb.probes
+import psdb.block
+import psdb.elf
+import psdb.hexfile
+
+
+# Transfer sizes and start-address misalignments for the bulk benchmarks.
+BULK_SIZES      = [4, 64, 1024, 16384]
+BULK_ALIGNMENTS = [0, 1, 3]
+
+# Number of reads in each exec_cmd_list() batch benchmark.
+CMD_LIST_SIZES = [1, 8, 32, 128]
+
+# Percentiles reported for every benchmark.
+PERCENTILES = [50, 90, 99]
+
+EXCLUDE_SRAMS = ['Backup SRAM']
+
+RESULTS_VERSION = 1
+
+
+def percentile(samples, p):
+    '''
+    Returns the pth percentile of a sorted list of samples, interpolating
+    linearly between the closest ranks.
+    '''
+    pos  = (len(samples) - 1) * p / 100
+    i    = int(pos)
+    frac = pos - i
+    if i + 1 < len(samples):
+        return samples[i] + (samples[i + 1] - samples[i]) * frac
+    return samples[i]
+
+
+class Result:
+    '''
+    The timings of one benchmark.  If nbytes is set, each sample transferred
+    that many bytes and a throughput is derived from the median time.
+    '''
+    def __init__(self, name, samples, nbytes=None):
+        self.name    = name
+        self.samples = sorted(samples)
+        self.nbytes  = nbytes
+
+    @property
+    def median(self):
+        return percentile(self.samples, 50)
+
+    def to_dict(self):
+        d = {'name'  : self.name,
+             'n'     : len(self.samples),
+             'min'   : self.samples[0],
+             'max'   : self.samples[-1],
+             'mean'  : sum(self.samples) / len(self.samples),
+             }
+        for p in PERCENTILES:
+            d['p%u' % p] = percentile(self.samples, p)
+        if self.nbytes is not None:
+            d['bytes']          = self.nbytes
+            d['bytes_per_sec']  = (self.nbytes / self.median
+                                   if self.median else None)
+        return d
+
+    def __str__(self):
+        s = '%-40s %5u' % (self.name, len(self.samples))
+        for p in PERCENTILES:
+            s += ' %12s' % fmt_time(percentile(self.samples, p))
+        if self.nbytes is not None and self.median:
+            s += ' %10.2f K/s' % (self.nbytes / (1024 * self.median))
+        return s
+
+
+def fmt_time(t):
+    if t < 1e-3:
+        return '%.2f us' % (t * 1e6)
+    if t < 1:
+        return '%.3f ms' % (t * 1e3)
+    return '%.3f s' % t
+
+
+class Runner:
+    '''
+    Runs benchmarks whose names match the filters and collects their results.
+    Each benchmark is run once untimed to warm up and then timed iterations
+    times; the optional setup callable runs untimed before every iteration.
+    The human-readable results are printed to out as they complete.
+    '''
+    def __init__(self, iterations, filters=None, out=sys.stdout):
+        self.iterations = iterations
+        self.filters    = filters
+        self.out        = out
+        self.results    = []
+
+    def wanted(self, name):
+        return not self.filters or any(f in name for f in self.filters)
+
+    def run(self, name, fn, nbytes=None, iterations=None, setup=None,
+            warmup=True):
+        if not self.wanted(name):
+            return
+
+        if warmup:
+            if setup:
+                setup()
+            fn()
+
+        samples = []
+        for _ in range(iterations or self.iterations):
+            if setup:
+                setup()
+            t0 = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - t0)
+
+        r = Result(name, samples, nbytes=nbytes)
+        self.results.append(r)
+        print(r, file=self.out)
+
+
+def bench_python(runner, rv):
+    '''
+    Benchmarks the host-side costs that don't involve a probe.
+    '''
+    rng  = random.Random(0)
+    data = rng.randbytes(rv.image_size)
+    dv   = [(0x08000000, data)]
+
+    f = io.StringIO()
+    psdb.hexfile.write_hex(f, dv)
+    text = f.getvalue()
+
+    runner.run('python.hex_write',
+               lambda: psdb.hexfile.write_hex(io.StringIO(), dv),
+               nbytes=len(data))
+    runner.run('python.hex_parse',
+               lambda: psdb.hexfile.HEXFile(io.StringIO(text)),
+               nbytes=len(data))
+
+    if rv.elf:
+        runner.run('python.elf_parse',
+                   lambda: psdb.elf.ELFBinary.from_path(rv.elf).flash_dv)
+        runner.run('python.elf_index',
+                   lambda: psdb.elf.ELFBinary.from_path(rv.elf).index)
+
+        elf   = psdb.elf.ELFBinary.from_path(rv.elf)
+        funcs = [s.st_value & ~1 for s in elf.index.symbols
+                 if s.type == 'STT_FUNC']
+        if funcs:
+            addrs = [rng.randrange(min(funcs), max(funcs) + 1)
+                     for _ in range(1000)]
+            runner.run('python.elf_lookup_x1000',
+                       lambda: [elf.lookup_func(a) for a in addrs])
+
+    def rambd_write():
+        bd = psdb.block.RAMBD(2048, first_block=0x08000000 // 2048,
+                              nblocks=len(data) // 2048 + 1)
+        for pos in range(0, len(data), 1000):
+            bd.write(0x08000000 + pos, data[pos:pos + 1000])
+
+    runner.run('python.rambd_write', rambd_write, nbytes=len(data))
+
+
+def find_device_reg(target):
+    '''
+    Returns a (device, register name, field name) tuple for a readable,
+    shadowable register with at least one field.
+    '''
+    for dev in target.devs.values():
+        for r in dev.regs:
+            if r.offset in dev.shadow_regs and r.fields_map:
+                return dev, '_' + r.name.upper(), next(iter(r.fields_map))
+    return None, None, None
+
+
+def find_ram(target):
+    rds = [rd for rd in target.ram_devs.values()
+           if rd.name not in EXCLUDE_SRAMS]
+    return max(rds, key=lambda rd: rd.size) if rds else None
+
+
+def bench_probe(runner, rv, db):
+    '''
+    Benchmarks topology probing, register access latency, bulk transfers
+    and exec_cmd_list() batches against the connected target.
+    '''
+    def probe_cold():
+        db.probe(connect_under_reset=rv.connect_under_reset, use_cache=False)
+
+    def probe_cached():
+        db.probe(connect_under_reset=rv.connect_under_reset)
+
+    runner.run('probe.topology_cold', probe_cold,
+               iterations=rv.slow_iterations, warmup=False)
+    runner.run('probe.topology_cached', probe_cached,
+               iterations=rv.slow_iterations)
+
+    target = db.target
+    db.set_max_target_tck_freq()
+
+    rd = find_ram(target)
+    if rd is None:
+        print('No SRAM found, skipping memory benchmarks.')
+        return
+    ap   = rd.ap
+    addr = rd.dev_base
+
+    runner.run('reg.dp_read', lambda: db.read_dp_reg(0x00))
+    runner.run('reg.read_32', lambda: ap.read_32(addr))
+    runner.run('reg.write_32', lambda: ap.write_32(0x12345678, addr))
+
+    rng = random.Random(0)
+    for size in BULK_SIZES:
+        for align in BULK_ALIGNMENTS:
+            if size + align > rd.size:
+                continue
+            data = rng.randbytes(size)
+            a    = addr + align
+            runner.run('bulk.read.%u+%u' % (size, align),
+                       lambda a=a, size=size: ap.read_bulk(a, size),
+                       nbytes=size)
+            runner.run('bulk.write.%u+%u' % (size, align),
+                       lambda a=a, data=data: ap.write_bulk(data, a),
+                       nbytes=size)
+
+    for n in CMD_LIST_SIZES:
+        n    = min(n, rd.size // 4)
+        cmds = [psdb.devices.ReadCommand(ap, addr + i * 4, 4)
+                for i in range(n)]
+        runner.run('cmd_list.%u' % n, lambda cmds=cmds: db.exec_cmd_list(cmds),
+                   nbytes=n * 4)
+
+    dev, reg_name, field = find_device_reg(target)
+    if dev is not None:
+        rdc = dev.reg_map[reg_name]
+        runner.run('device.field_read', lambda: getattr(rdc, field))
+        with dev.shadowed([reg_name]):
+            runner.run('device.field_read_shadowed',
+                       lambda: getattr(rdc, field))
+
+
+def bench_flash(runner, rv, db):
+    '''
+    Benchmarks erasing, writing and verifying flash.  This destroys the
+    flash contents.
+    '''
+    target = db.target
+    flash  = target.flash
+    if rv.no_loader:
+        flash.loader = None
+
+    size = min(rv.flash_size, flash.flash_size)
+    size = max(size // flash.sector_size, 1) * flash.sector_size
+    addr = flash.mem_base
+    data = random.Random(0).randbytes(size)
+
+    def set_burn_freq():
+        if flash.loader:
+            db.set_max_target_tck_freq()
+        else:
+            db.set_max_burn_tck_freq(flash)
+
+    def erase():
+        flash.erase(addr, size, verbose=False)
+
+    def prepare_write():
+        db.set_max_target_tck_freq()
+        erase()
+        set_burn_freq()
+
+    def burn_dv():
+        flash.burn_dv([(addr, data)], verbose=False)
+
+    verifier = flash.get_verifier()
+    runner.run('flash.erase', erase, nbytes=size,
+               iterations=rv.slow_iterations, setup=db.set_max_target_tck_freq)
+    runner.run('flash.write', lambda: flash.write(addr, data, verbose=False),
+               nbytes=size, iterations=rv.slow_iterations,
+               setup=prepare_write)
+    runner.run('flash.verify.%s' % verifier.NAME,
+               lambda: verifier.region_matches(addr, data), nbytes=size,
+               iterations=rv.slow_iterations, setup=db.set_max_target_tck_freq)
+    runner.run('flash.burn_dv', burn_dv, nbytes=size,
+               iterations=rv.slow_iterations)
+    runner.run('flash.erase_all', lambda: flash.erase_all(verbose=False),
+               iterations=rv.slow_iterations, setup=db.set_max_target_tck_freq)
+
+
+def compare(results, path, threshold):
+    '''
+    Compares the median of each result against a previous run's results file
+    and returns the list of benchmarks that got slower by more than threshold
+    percent.
+    '''
+    with open(path, 'r') as f:
+        baseline = {r['name'] : r for r in json.load(f)['results']}
+
+    regressions = []
+    print('%-40s %12s %12s %8s' % ('Benchmark', 'Baseline', 'Current',
+                                   'Change'))
+    for r in results:
+        b = baseline.get(r.name)
+        if b is None or not b['p50']:
+            continue
+
+        change = 100 * (r.median - b['p50']) / b['p50']
+        flag   = ''
+        if change > threshold:
+            regressions.append(r.name)
+            flag = ' REGRESSION'
+        print('%-40s %12s %12s %+7.1f%%%s' % (r.name, fmt_time(b['p50']),
+                                              fmt_time(r.median), change,
+                                              flag))
+    return regressions
+
+
+def main(rv):
+    # Dump all debuggers if requested.
+    if rv.dump_debuggers:
+        psdb.probes.dump_probes()
+        return
+
+    # Keep stdout clean for the results if they are going there.
+    out    = sys.stderr if rv.json == '-' else sys.stdout
+    groups = set(rv.group or ['python', 'probe'])
+    runner = Runner(rv.iterations, filters=rv.filter, out=out)
+    info   = {'version'   : RESULTS_VERSION,
+              'timestamp' : datetime.datetime.now().isoformat(),
+              'host'      : platform.node(),
+              'python'    : platform.python_version(),
+              'groups'    : sorted(groups),
+              }
+
+    print('%-40s %5s' % ('Benchmark', 'N') +
+          ''.join(' %12s' % ('p%u' % p) for p in PERCENTILES), file=out)
+    if 'python' in groups:
+        bench_python(runner, rv)
+
+    if groups & {'probe', 'flash'}:
+        db = psdb.probes.make_one_ns(rv)
+        db.set_tck_freq(rv.probe_freq)
+        db.probe(verbose=rv.verbose,
+                 connect_under_reset=rv.connect_under_reset)
+        info['probe']      = str(db)
+        info['serial_num'] = getattr(db, 'serial_num', None)
+        info['target']     = repr(db.target)
+        info['tck_freq']   = db.set_max_target_tck_freq()
+
+        if 'probe' in groups:
+            bench_probe(runner, rv, db)
+        if 'flash' in groups:
+            bench_flash(runner, rv, db)
+            db.target.reset_halt()
+
+    if rv.json:
+        info['results'] = [r.to_dict() for r in runner.results]
+        if rv.json == '-':
+            json.dump(info, sys.stdout, indent=1)
+            print()
+        else:
+            with open(rv.json, 'w') as f:
+                json.dump(info, f, indent=1)
+
+    if rv.compare:
+        if compare(runner.results, rv.compare, rv.threshold):
+            sys.exit(2)
+
+
+def _main():
+    parser = argparse.ArgumentParser(
+        description='Benchmarks probe transfers, flash operations and the '
+                    'host-side hot paths.  The flash group erases and '
+                    'rewrites the target flash.')
+    parser.add_argument('--dump-debuggers', '-d', action='store_true')
+    parser.add_argument('--usb-path')
+    parser.add_argument('--serial-num')
+    parser.add_argument('--connect-under-reset', action='store_true')
+    parser.add_argument('--probe-freq', type=int, default=1000000)
+    parser.add_argument('--max-tck-freq', type=int)
+    parser.add_argument('--verbose', '-v', action='store_true')
+    parser.add_argument('--group', '-g', action='append',
+                        choices=['python', 'probe', 'flash'])
+    parser.add_argument('--filter', '-f', action='append')
+    parser.add_argument('--iterations', '-n', type=int, default=20)
+    parser.add_argument('--slow-iterations', type=int, default=3)
+    parser.add_argument('--image-size', type=int, default=256*1024)
+    parser.add_argument('--flash-size', type=int, default=64*1024)
+    parser.add_argument('--no-loader', action='store_true')
+    parser.add_argument('--elf')
+    parser.add_argument('--json')
+    parser.add_argument('--compare')
+    parser.add_argument('--threshold', type=float, default=10)
+    rv = parser.parse_args()
+
+    try:
+        main(rv)
+    except psdb.ProbeException as e:
+        print(e)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    _main()
@@ -17,6 +17,7 @@ class RAMBD(bd.BlockDevice):
     def write(self, addr, data):
         block_size = len(self.fill)
 
+        data = memoryview(data).cast('B')
         while data:
             avail    = block_size - (addr % block_size)
             count    = min(len(data), avail)
@@ -24,11 +25,11 @@ class RAMBD(bd.BlockDevice):
             if blocknum < self.first_block or blocknum >= self.end_block:
                 raise bd.BlockOutOfRangeException(self, blocknum)
 
-            blockaddr = blocknum*block_size
-            block     = self.blocks.get(blocknum,
-                                        bd.Block(blockaddr, self.fill))
+            block = self.blocks.get(blocknum)
+            if block is None:
+                block = bd.Block(blocknum*block_size, self.fill)
+                self.blocks[blocknum] = block
             block.write(addr, data[:count])
 
-            self.blocks[blocknum] = block
-            data                  = data[count:]
-            addr                 += count
+            data  = data[count:]
+            addr += count
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import argparse
+import sys
+
+import psdb.probes
+from psdb.probes import tck_calibration
+
+
+def show_calibration(cal):
+    if not cal:
+        print('Not calibrated.')
+        return
+
+    print('  SWD frequency: %.3f MHz' % (cal['read_freq'] / 1e6))
+    if cal.get('burn_freq'):
+        print(' Burn frequency: %.3f MHz' % (cal['burn_freq'] / 1e6))
+    else:
+        print(' Burn frequency: not calibrated')
+
+
+def main(rv):
+    # Dump all debuggers if requested.
+    if rv.dump_debuggers:
+        psdb.probes.dump_probes()
+        return
+
+    # Probe the specified serial number (or find the default if no serial number
+    # was specified.
+    probe = psdb.probes.make_one_ns(rv)
+
+    # SRST the target, if requested.  We have to assert this for at least 1 us.
+    if rv.srst:
+        probe.srst_target()
+
+    # Use the probe to detect a target platform.
+    f = probe.set_tck_freq(rv.probe_freq)
+    print('Probing with SWD frequency at %.3f MHz' % (f/1.e6))
+    target = probe.probe(verbose=rv.verbose,
+                         connect_under_reset=rv.connect_under_reset)
+    print('Calibration key: %s' % tck_calibration.cache_key(probe))
+
+    if rv.forget:
+        if tck_calibration.forget(probe):
+            print('Calibration discarded.')
+        else:
+            print('Not calibrated.')
+        return
+
+    if rv.show:
+        show_calibration(probe.get_tck_calibration())
+        return
+
+    cal = tck_calibration.calibrate(probe, burn=rv.burn, rounds=rv.rounds,
+                                    margin=rv.margin, min_freq=rv.probe_freq,
+                                    verbose=True)
+    show_calibration(cal)
+
+    # Leave the target reset, since its SRAM has been trashed.
+    target.reset_halt()
+    if rv.resume:
+        target.resume()
+
+
+def _main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dump-debuggers', '-d', action='store_true')
+    parser.add_argument('--usb-path')
+    parser.add_argument('--serial-num')
+    parser.add_argument('--srst', action='store_true')
+    parser.add_argument('--connect-under-reset', action='store_true')
+    parser.add_argument('--probe-freq', type=int, default=1000000)
+    parser.add_argument('--max-tck-freq', type=int)
+    parser.add_argument('--burn', action='store_true')
+    parser.add_argument('--rounds', type=int, default=4)
+    parser.add_argument('--margin', type=int, default=1)
+    parser.add_argument('--show', action='store_true')
+    parser.add_argument('--forget', action='store_true')
+    parser.add_argument('--resume', action='store_true')
+    parser.add_argument('--verbose', '-v', action='store_true')
+    rv = parser.parse_args()
+
+    try:
+        main(rv)
+    except psdb.ProbeException as e:
+        print(e)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    _main()
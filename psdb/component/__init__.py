@@ -1,10 +1,12 @@
 # Copyright (c) 2018-2019 Phase Advanced Sensor Systems, Inc.
 from .component import Component
 from .matcher import Matcher, StaticMatcher, M33Matcher
+from . import topology
 
 
 __all__ = ['Component',
            'Matcher',
            'StaticMatcher',
            'M33Matcher',
+           'topology',
            ]
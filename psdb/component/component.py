@@ -8,10 +8,9 @@ class Component:
         self.ap       = ap
         self.addr     = addr
         self.subtype  = subtype
-        self.cidr     = self.read_id_block(self.addr + 0xFF0)
-        self.pidr     = ((self.read_id_block(self.addr + 0xFD0) << 32) |
-                         (self.read_id_block(self.addr + 0xFE0) <<  0))
         self.children = []
+        self.cidr, self.pidr = Component.read_ids(ap, addr)
+        self.matcher_index   = None
 
     def __repr__(self):
         return "Component '%s':0x%08X:0x%08X:0x%016X %s" % (
@@ -84,12 +83,31 @@ class Component:
 
             offset += 4
 
-    def read_id_block(self, addr):
-        mem = self.ap.read_bulk(addr, 16)
-        return (((ord(mem[12:13]) << 24) & 0xFF000000) |
-                ((ord(mem[ 8: 9]) << 16) & 0x00FF0000) |
-                ((ord(mem[ 4: 5]) <<  8) & 0x0000FF00) |
-                ((ord(mem[ 0: 1]) <<  0) & 0x000000FF))
+    @staticmethod
+    def read_id_block(ap, addr):
+        mem = ap.read_bulk(addr, 16)
+        return ((mem[12] << 24) |
+                (mem[ 8] << 16) |
+                (mem[ 4] <<  8) |
+                (mem[ 0] <<  0))
+
+    @staticmethod
+    def read_ids(ap, addr):
+        '''
+        Returns the (CIDR, PIDR) pair for the component at the specified
+        address.  The values are remembered in the AP's component_ids dict
+        for the lifetime of the AP object, so that a matched component class
+        re-initializing itself or a target's is_mcu() check doesn't read them
+        again, and so that a cached topology can supply them without reading
+        anything at all.
+        '''
+        ids = ap.component_ids.get(addr)
+        if ids is None:
+            cidr = Component.read_id_block(ap, addr + 0xFF0)
+            pidr = ((Component.read_id_block(ap, addr + 0xFD0) << 32) |
+                    (Component.read_id_block(ap, addr + 0xFE0) <<  0))
+            ids  = ap.component_ids[addr] = (cidr, pidr)
+        return ids
 
     def find_component(self, cidr, pidr):
         if self.cidr == cidr and self.pidr == pidr:
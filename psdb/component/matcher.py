@@ -1,4 +1,7 @@
 # Copyright (c) 2018-2019 Phase Advanced Sensor Systems, Inc.
+import hashlib
+
+
 MATCHERS = []
 
 
@@ -73,5 +76,31 @@ def match(c):
     scores.sort(key=lambda s: s[0])
     if scores and scores[-1][0] > 0:
         m = scores[-1][1]
-        return m.cls(c, m.subtype)
+        return instantiate(c, MATCHERS.index(m))
     return c
+
+
+def instantiate(c, index):
+    '''
+    Instantiates the class of the matcher at the specified index in MATCHERS
+    for the component, recording the index so that the match can be replayed
+    later from a topology cache without scoring.
+    '''
+    m  = MATCHERS[index]
+    mc = m.cls(c, m.subtype)
+    mc.matcher_index = index
+    return mc
+
+
+def signature():
+    '''
+    Returns a hash identifying the current list of matchers, which changes
+    whenever matchers are added, removed, reordered or modified.
+    '''
+    h = hashlib.sha1()
+    for m in MATCHERS:
+        h.update(('%s.%s %s %s\n' % (m.cls.__module__, m.cls.__name__,
+                                     type(m).__name__,
+                                     sorted((k, v) for k, v in vars(m).items()
+                                            if k != 'cls'))).encode())
+    return h.hexdigest()
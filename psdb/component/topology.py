@@ -0,0 +1,185 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import psdb
+from . import matcher
+from .component import Component
+
+
+CACHE_NAME  = 'topology.json'
+MAX_ENTRIES = 32
+
+
+class Topology:
+    '''
+    A recorded probe result: the AP IDRs behind a DP, plus the component tree
+    on each MEM-AP along with the index of the matcher that identified each
+    component.  Replaying a topology constructs the same component objects
+    as a full probe would, in the same order, but without walking the ROM
+    tables, reading component ID blocks or scoring matchers.
+
+    A topology is only replayed if the fingerprint, consisting of the BASE
+    register and root component CIDR/PIDR of every MEM-AP, reads back the
+    same as when it was recorded.  The caller should additionally compare the
+    identified target against the recorded one; for STM32 parts that covers
+    the DBGMCU IDCODE.
+    '''
+    def __init__(self, dpidr, aps, fingerprint, trees, target):
+        self.dpidr       = dpidr
+        self.aps         = aps
+        self.fingerprint = fingerprint
+        self.trees       = trees
+        self.target      = target
+
+    @staticmethod
+    def from_json(e):
+        return Topology(e['dpidr'], {int(k) : v for k, v in e['aps'].items()},
+                        [tuple(f) for f in e['fingerprint']],
+                        {int(k) : v for k, v in e['trees'].items()},
+                        e['target'])
+
+    def to_json(self):
+        return {'dpidr'       : self.dpidr,
+                'aps'         : self.aps,
+                'fingerprint' : self.fingerprint,
+                'trees'       : self.trees,
+                'target'      : self.target,
+                }
+
+    @staticmethod
+    def record(db, dpidr):
+        '''
+        Records the topology of a freshly-probed debug probe.
+        '''
+        trees = {}
+        for ap_num, ap in db.aps.items():
+            if getattr(ap, 'base_component', None):
+                trees[ap_num] = _record_tree(ap.base_component)
+        return Topology(dpidr, {n : ap.idr for n, ap in db.aps.items()},
+                        read_fingerprint(db), trees, repr(db.target))
+
+    def open_aps(self, db, verbose=False):
+        '''
+        Opens just the APs recorded in the topology, populating db.aps.
+        Returns False if any of them has a different IDR now, or if the AP
+        following the highest recorded one is present; that would be a
+        related part with more APs, such as a dual-core variant of a
+        single-core MCU, which needs a full scan.
+        '''
+        db.aps  = {}
+        ap_nums = sorted(self.aps)
+        if not ap_nums:
+            return False
+
+        probe_nums = ap_nums[:]
+        if ap_nums[-1] < 255:
+            probe_nums.append(ap_nums[-1] + 1)
+        idrs = db.read_ap_idrs(probe_nums)
+        if len(probe_nums) > len(ap_nums) and idrs[-1]:
+            return False
+
+        for ap_num, idr in zip(ap_nums, idrs):
+            if not idr or idr != self.aps[ap_num]:
+                return False
+
+            ap = psdb.access_port.probe_ap(db, ap_num, verbose=verbose,
+                                           idr=idr)
+            if not ap:
+                return False
+            db.aps[ap_num] = ap
+
+        return True
+
+    def replay(self, db, verbose=False):
+        '''
+        Reconstructs the component trees on each MEM-AP.
+        '''
+        for ap_num, tree in sorted(self.trees.items()):
+            ap = db.aps[ap_num]
+            ap.base_component = _replay_tree(ap, tree, None, '', verbose)
+
+
+def _record_tree(c):
+    return [c.addr, c.cidr, c.pidr, c.matcher_index,
+            [_record_tree(cc) for cc in c.children]]
+
+
+def _replay_tree(ap, tree, parent, prefix, verbose):
+    addr, cidr, pidr, index, children = tree
+    ap.component_ids[addr] = (cidr, pidr)
+    c = Component(parent, ap, addr)
+    if index is not None:
+        c = matcher.instantiate(c, index)
+    if verbose:
+        print('  %s%s' % (prefix, c))
+
+    for child in children:
+        c.children.append(_replay_tree(ap, child, c, prefix + '  ', verbose))
+    return c
+
+
+def read_fingerprint(db):
+    '''
+    Reads the BASE register and root component CIDR/PIDR of every MEM-AP.
+    Targets read the root IDs anyway while identifying themselves in
+    pre_probe(), so this mostly costs the BASE register reads.
+    '''
+    fingerprint = []
+    for ap_num, ap in sorted(db.aps.items()):
+        if not hasattr(ap, 'probe_components'):
+            continue
+
+        base = ap._read_base()
+        addr = base & 0xFFFFF000
+        if base != 0xFFFFFFFF and (base & 0x00000003) == 0x00000003:
+            fingerprint.append((ap_num, base) + Component.read_ids(ap, addr))
+        else:
+            fingerprint.append((ap_num, base, None, None))
+    return fingerprint
+
+
+def _load_cache():
+    cache = psdb.util.cache.load_json(CACHE_NAME)
+    if not cache or cache.get('matchers') != matcher.signature():
+        return []
+    return cache.get('entries', [])
+
+
+def load(dpidr):
+    '''
+    Returns the list of cached topologies recorded behind a DP with the
+    specified DPIDR, most recent first.
+    '''
+    try:
+        return [Topology.from_json(e) for e in _load_cache()
+                if e['dpidr'] == dpidr]
+    except (KeyError, TypeError, ValueError):
+        return []
+
+
+def _other_entries(topology):
+    return [e for e in _load_cache()
+            if e.get('dpidr') != topology.dpidr or
+            [tuple(f) for f in e.get('fingerprint', [])] !=
+            topology.fingerprint]
+
+
+def _save_entries(entries):
+    psdb.util.cache.save_json(CACHE_NAME,
+                              {'matchers' : matcher.signature(),
+                               'entries'  : entries[:MAX_ENTRIES],
+                               })
+
+
+def save(topology):
+    '''
+    Adds the topology to the front of the persistent cache, replacing any
+    previous entry with the same fingerprint and evicting the oldest entries
+    if the cache is full.
+    '''
+    _save_entries([topology.to_json()] + _other_entries(topology))
+
+
+def discard(topology):
+    '''
+    Removes the topology from the persistent cache.
+    '''
+    _save_entries(_other_entries(topology))
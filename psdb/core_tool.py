@@ -28,6 +28,9 @@ def main(rv):
     # Generate the core file.
     c = psdb.elf.Core()
 
+    # Snapshot the peripheral registers in bulk if requested.
+    snap = target.snapshot_registers() if rv.peripheral_capture else None
+
     # Iterate over all devices to get memory and peripheral registers.
     for d in target.devs.values():
         if isinstance(d, psdb.devices.MemDevice):
@@ -44,11 +47,9 @@ def main(rv):
 
                 assert r.size == 4
                 pad          = r.offset - len(region_data)
+                v            = snap.get(d.name, r.name, 0xCACACACA)
                 region_data += b'\xCA'*pad
-                if r.flags & r.READABLE:
-                    region_data += struct.pack('<L', r.read(d))
-                else:
-                    region_data += struct.pack('<L', 0xCACACACA)
+                region_data += struct.pack('<L', v)
 
             if region_data:
                 c.add_mem_map(d.dev_base, region_data)
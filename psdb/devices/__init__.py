@@ -3,6 +3,7 @@ from .device import (Device, ReadCommand, Reg, Reg32, Reg32R, Reg32W, Reg32S,
                      Reg32RS, Reg8, Reg8S, AReg32, AReg32R, AReg32W, AReg32S,
                      AReg32RS, RegDiv, MemDevice, RAMDevice)
 from .flash import Flash
+from .snapshot import Snapshot
 from . import core
 
 
@@ -25,5 +26,6 @@ __all__ = ['AReg32',
            'Reg8',
            'Reg8S',
            'RegDiv',
+           'Snapshot',
            'core',
            ]
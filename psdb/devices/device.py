@@ -1,4 +1,6 @@
 # Copyright (c) 2018-2019 Phase Advanced Sensor Systems, Inc.
+import contextlib
+import functools
 
 
 def convert_positional_to_adjacency(fields):
@@ -252,7 +254,41 @@ class RDCapture:
         self.reg.write(self.dev, v)
 
 
+def with_shadow(*reg_names):
+    '''
+    Decorator for Device methods that should run inside a shadowed() context
+    that prefetches the named registers; see Device.shadowed().
+    '''
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(self, *args, **kwargs):
+            with self.shadowed(reg_names):
+                return f(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
 class Device:
+    '''
+    Base class for memory-mapped devices.  Register accesses normally go
+    straight to the target, but a device can keep a shadow copy of its
+    registers so that repeated field accesses don't each cost an SWD read:
+
+        - enable_shadow() turns shadowing on until disable_shadow() is
+          invoked.  Only devices whose readable, side-effect-free registers
+          don't change behind our back while the target is halted should do
+          this; the Target invalidates all shadows on resume and reset.
+        - shadowed() turns shadowing on for the duration of a with block and
+          can prefetch a list of registers in a single batch.
+        - transaction() additionally defers register writes until the end of
+          the with block, so that several field updates to the same register
+          result in a single write.
+
+    Registers flagged with SIDE_EFFECTS are never shadowed.  Writes to a
+    shadowed register update the shadow with the written value, so registers
+    that read back differently from what was written (write-1-to-clear bits,
+    for instance) should be invalidated with invalidate_shadow() afterwards.
+    '''
     def __init__(self, owner, ap, dev_base, name, regs, path=None):
         super().__setattr__(
                 'reg_map', {'_' + r.name.upper() : RDCapture(r, self, dev_base)
@@ -265,6 +301,14 @@ class Device:
         self.regs     = regs
         self.owner    = owner
 
+        self.shadow_regs    = {r.offset : r for r in regs
+                               if r.size == 4 and (r.flags & Reg.READABLE) and
+                               not (r.flags & Reg.SIDE_EFFECTS)}
+        self.shadow         = {}
+        self.shadow_enabled = False
+        self.shadow_depth   = 0
+        self.dirty          = None
+
         assert self.name not in self.owner.devs
         self.owner.devs[self.name] = self
 
@@ -286,6 +330,92 @@ class Device:
         else:
             super().__setattr__(name, value)
 
+    def _is_shadowing(self):
+        return self.shadow_enabled or self.shadow_depth
+
+    def enable_shadow(self):
+        self.shadow_enabled = True
+
+    def disable_shadow(self):
+        self.shadow_enabled = False
+        if not self.shadow_depth:
+            self.shadow = {}
+
+    def invalidate_shadow(self, rd=None):
+        '''
+        Discards the shadow copy of the specified RDCapture's register, or of
+        all registers if rd is None.
+        '''
+        if rd is None:
+            self.shadow = {}
+        else:
+            self.shadow.pop(rd.reg.offset, None)
+
+    def prefetch_shadow(self, reg_names=None):
+        '''
+        Reads all of the named registers that aren't already shadowed, or all
+        of the shadowable registers if reg_names is None, in a single batch
+        and stores them in the shadow.  Shadowing must already be active.
+        '''
+        assert self._is_shadowing()
+        if reg_names is None:
+            regs = list(self.shadow_regs.values())
+        else:
+            regs = [self.reg_map[n].reg for n in reg_names]
+        regs = [r for r in regs
+                if r.offset in self.shadow_regs and r.offset not in self.shadow]
+        if not regs:
+            return
+
+        vals = self.ap.db.exec_cmd_list([r.read_cmd(self) for r in regs])
+        for r, v in zip(regs, vals):
+            self.shadow[r.offset] = v
+
+    @contextlib.contextmanager
+    def shadowed(self, reg_names=()):
+        '''
+        Context manager that shadows register reads for the duration of the
+        with block, first prefetching the named registers in a single batch.
+        Unless shadowing was enabled with enable_shadow(), the shadow is
+        discarded when the outermost shadowed() block exits.
+        '''
+        self.shadow_depth += 1
+        try:
+            if reg_names:
+                self.prefetch_shadow(reg_names)
+            yield self
+        finally:
+            self.shadow_depth -= 1
+            if not self._is_shadowing():
+                self.shadow = {}
+
+    @contextlib.contextmanager
+    def transaction(self, reg_names=()):
+        '''
+        Context manager that shadows register reads and defers register
+        writes for the duration of the with block.  Each register written in
+        the block is written exactly once, with its final value, in the order
+        in which the registers were first written, when the block exits.  If
+        the block raises an exception the deferred writes are discarded.
+        Transactions can be nested, in which case the writes are deferred to
+        the end of the outermost transaction.
+        '''
+        outer = self.dirty is None
+        if outer:
+            self.dirty = {}
+        with self.shadowed(reg_names):
+            try:
+                yield self
+            except BaseException:
+                if outer:
+                    self.dirty = None
+                raise
+
+            if outer:
+                dirty, self.dirty = self.dirty, None
+                for offset, v in dirty.items():
+                    self._write_32(v, offset)
+
     def _read_8(self, offset):
         return self.ap.read_8(self.dev_base + offset)
 
@@ -293,16 +423,31 @@ class Device:
         return ReadCommand(self.ap, self.dev_base + offset, 1)
 
     def _read_32(self, offset):
-        return self.ap.read_32(self.dev_base + offset)
+        if self.dirty and offset in self.dirty:
+            return self.dirty[offset]
+        if not self._is_shadowing() or offset not in self.shadow_regs:
+            return self.ap.read_32(self.dev_base + offset)
+
+        v = self.shadow.get(offset)
+        if v is None:
+            v = self.shadow[offset] = self.ap.read_32(self.dev_base + offset)
+        return v
 
     def _read_32_cmd(self, offset):
         return ReadCommand(self.ap, self.dev_base + offset, 4)
 
     def _write_8(self, v, offset):
+        self.shadow.pop(offset & ~3, None)
         self.ap.write_8(v, self.dev_base + offset)
 
     def _write_32(self, v, offset):
+        if self.dirty is not None:
+            self.dirty[offset] = v
+            return
+
         self.ap.write_32(v, self.dev_base + offset)
+        if self._is_shadowing() and offset in self.shadow_regs:
+            self.shadow[offset] = v
 
     def _set_field(self, v, width, shift, offset):
         assert width + shift <= 32
@@ -4,7 +4,16 @@ import time
 from builtins import range
 
 import psdb
+import psdb.elf.dv
 from ..block import RAMBD, BlockOutOfRangeException
+from . import flash_loader
+from . import flash_verify
+
+
+# Trailing erased bytes are trimmed from the blocks written by burn_dv() in
+# multiples of this many bytes, which is a multiple of every flash's
+# programming unit.
+TRIM_ALIGN = 64
 
 
 class FlashException(Exception):
@@ -20,6 +29,12 @@ class FlashWriteException(Exception):
 
 
 class Flash:
+    # Drivers that can program through the on-target flash loader set these to
+    # the programming unit size and the status register busy and error masks.
+    LOADER_UNIT       = None
+    LOADER_BUSY_MASK  = None
+    LOADER_ERROR_MASK = None
+
     def __init__(self, mem_base, sector_size, nsectors, max_nowait_write_freq):
         super().__init__()
         self.mem_base              = mem_base
@@ -29,6 +44,45 @@ class Flash:
         self.nsectors              = nsectors
         self.all_mask              = (1 << nsectors) - 1
         self.max_nowait_write_freq = max_nowait_write_freq
+        self.loader                = None
+        self.verifiers             = [flash_verify.ReadbackVerifier(self)]
+
+    def attach_loader(self, ram, cpu=None, offset=0):
+        '''
+        Arranges for flash writes to go through a loader stub executing on the
+        target CPU out of the specified RAM device, if the driver supports it.
+        The RAM device is clobbered by every write, starting at the specified
+        offset.
+        '''
+        if self.LOADER_UNIT is None:
+            return
+        cpu = cpu or self.ap.db.cpus[0]  # pylint: disable=E1101
+        self.loader = flash_loader.FlashLoader(cpu, ram, self.LOADER_UNIT,
+                                               self.LOADER_BUSY_MASK,
+                                               self.LOADER_ERROR_MASK,
+                                               offset=offset)
+
+    def attach_crc(self, crc):
+        '''
+        Arranges for flash comparisons to use the specified CRC peripheral
+        device, driven by a stub running out of the flash loader's RAM.
+        '''
+        self.add_verifier(flash_verify.CRCPeripheralVerifier(self, crc))
+
+    def add_verifier(self, verifier):
+        '''
+        Registers a verifier that is faster than all the ones registered
+        before it.
+        '''
+        self.verifiers.insert(0, verifier)
+
+    def get_verifier(self):
+        '''
+        Returns the fastest verifier currently usable.
+        '''
+        for v in self.verifiers:
+            if v.is_usable():
+                return v
 
     def _mask_for_alp(self, addr, length):
         '''
@@ -97,6 +151,21 @@ class Flash:
         '''
         raise NotImplementedError
 
+    def read_into(self, addr, buf):
+        '''
+        Reads a region from the flash into the caller-supplied buffer, whose
+        length determines the size of the region.
+        '''
+        self.ap.read_bulk_into(addr, buf)  # pylint: disable=E1101
+
+    def region_matches(self, addr, data):
+        '''
+        Returns True if the flash region at the specified address already
+        contains exactly the specified data, using the fastest verifier
+        available.
+        '''
+        return self.get_verifier().region_matches(addr, data)
+
     def read_all(self):
         '''
         Reads the entire flash.
@@ -117,7 +186,24 @@ class Flash:
         '''
         return psdb.elf.dv.prune_dv(dv, self.mem_base, self.flash_size)
 
-    def burn_dv(self, dv, bank_swap=False, verbose=True, erase=True):
+    def _discard_unchanged_blocks(self, bd, verbose=True):
+        '''
+        Removes all blocks from the block device whose contents already match
+        the contents of the flash.
+        '''
+        verifier = self.get_verifier()
+        if verbose:
+            print('Comparing flash using %s...' % verifier.NAME)
+        nblocks = len(bd.blocks)
+        for k, block in psdb.piter(list(bd.blocks.items()), verbose=verbose):
+            if verifier.region_matches(block.addr, block.data):
+                del bd.blocks[k]
+        if verbose:
+            print('%u of %u sectors unchanged.'
+                  % (nblocks - len(bd.blocks), nblocks))
+
+    def burn_dv(self, dv, bank_swap=False, verbose=True, erase=True,
+                diff=False):
         '''
         Burns the specified data vector to flash, erasing sectors as necessary
         to perform the operation.  The data vector is a list of the form:
@@ -139,6 +225,10 @@ class Flash:
         would be performed to the lower 4K.  This is to allow writing a binary
         linked at an active base address into the inactive half of flash in a
         dual-banked system.
+
+        The diff option compares each sector that would be burned with the
+        current contents of the flash first, and sectors that already hold
+        the desired contents are neither erased nor rewritten.
         '''
         bd = RAMBD(self.sector_size,
                    first_block=self.mem_base // self.sector_size,
@@ -150,6 +240,11 @@ class Flash:
             except BlockOutOfRangeException:
                 pass
 
+        if diff:
+            self._discard_unchanged_blocks(bd, verbose=verbose)
+            if not bd.blocks:
+                return
+
         if erase:
             if verbose:
                 print('Erasing flash...')
@@ -158,7 +253,19 @@ class Flash:
                 mask |= self._mask_for_alp(block.addr, len(block.data))
             self.erase_sectors(mask, verbose=verbose)
 
-        f = self.ap.db.set_max_burn_tck_freq(self)  # pylint: disable=E1101
+        # Trailing erased bytes are trimmed from each block before writing it,
+        # in steps that keep the block a multiple of the programming unit and
+        # of the verifier's alignment; otherwise a CRC verifier would have to
+        # fall back to reading the block back.
+        verifier = self.get_verifier()
+        trim     = max(TRIM_ALIGN, getattr(verifier, 'ALIGN', 1))
+
+        # The flash loader only touches RAM over SWD, so there is no need to
+        # slow down for the flash controller.
+        if self.loader:
+            f = self.ap.db.set_max_target_tck_freq()  # pylint: disable=E1101
+        else:
+            f = self.ap.db.set_max_burn_tck_freq(self)  # pylint: disable=E1101
         if verbose:
             print('Set SWD frequency to %.3f MHz' % (f / 1.e6))
 
@@ -167,8 +274,8 @@ class Flash:
         if verbose:
             print('Burning flash...')
         for block in psdb.piter(bd.blocks.values(), verbose=verbose):
-            while block.data.endswith(b'\xff'*64):
-                block.data = block.data[:-64]
+            while block.data.endswith(b'\xff'*trim):
+                del block.data[-trim:]
             self.write(block.addr, block.data, verbose=False)
             total_len += len(block.data)
 
@@ -182,11 +289,14 @@ class Flash:
             print('Set SWD frequency to %.3f MHz' % (f / 1.e6))
 
         if verbose:
-            print('Verifying flash...')
+            print('Verifying flash using %s...' % verifier.NAME)
         t0 = time.time()
         for block in psdb.piter(bd.blocks.values(), verbose=verbose):
-            mem = self.read(block.addr, len(block.data))
-            assert mem == block.data
+            if not verifier.region_matches(block.addr, block.data):
+                raise FlashWriteException('Verify failed for region '
+                                          '[0x%08X - 0x%08X].'
+                                          % (block.addr, block.addr +
+                                             len(block.data) - 1))
         if verbose:
             elapsed = time.time() - t0
             print('Verified %u bytes in %.2f seconds (%.2f K/s).' %
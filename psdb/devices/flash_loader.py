@@ -0,0 +1,207 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import struct
+import time
+
+from . import flash
+
+
+# Position-independent ARMv6-M stub that programs flash from a pair of RAM
+# buffers.  The flash controller must already be unlocked and in programming
+# mode; the stub only copies words from RAM into flash, polling the status
+# register after every programming unit.  It is entered with r0 pointing at
+# the control block and exits via BKPT, either after the host posts the exit
+# marker or after the status register reports an error.  Assembled with:
+#
+#   llvm-mc -triple=thumbv6m-none-eabi -filetype=obj
+#
+#   start:  movs    r7, #20             @ r7 = offset of current descriptor
+#   next:   adds    r6, r0, r7
+#   wait:   ldr     r1, [r6, #0]        @ r1 = descriptor length
+#           cmp     r1, #0
+#           beq     wait                @ Buffer still empty.
+#           adds    r2, r1, #1
+#           beq     done                @ Exit marker.
+#           ldr     r2, [r6, #4]        @ r2 = flash address
+#           ldr     r3, [r6, #8]        @ r3 = RAM buffer address
+#   unit:   ldr     r4, [r0, #12]       @ r4 = programming unit size
+#   copy:   ldm     r3!, {r5}
+#           stm     r2!, {r5}
+#           subs    r1, #4
+#           subs    r4, #4
+#           bne     copy
+#           dsb
+#   poll:   ldr     r4, [r0, #0]
+#           ldr     r5, [r4]            @ r5 = status register
+#           ldr     r4, [r0, #4]
+#           tst     r5, r4
+#           bne     poll                @ Wait for busy bits to clear.
+#           ldr     r4, [r0, #8]
+#           tst     r5, r4
+#           bne     error
+#           cmp     r1, #0
+#           bne     unit
+#           str     r1, [r6, #0]        @ Hand the buffer back to the host.
+#           movs    r4, #52
+#           subs    r7, r4, r7          @ Flip between descriptors 0 and 1.
+#           b       next
+#   error:  str     r5, [r0, #16]       @ Post the status register to mailbox.
+#   done:   bkpt    #0
+STUB = bytes((0x14, 0x27, 0xC6, 0x19, 0x31, 0x68, 0x00, 0x29, 0xFC, 0xD0,
+              0x4A, 0x1C, 0x18, 0xD0, 0x72, 0x68, 0xB3, 0x68, 0xC4, 0x68,
+              0x20, 0xCB, 0x20, 0xC2, 0x04, 0x39, 0x04, 0x3C, 0xFA, 0xD1,
+              0xBF, 0xF3, 0x4F, 0x8F, 0x04, 0x68, 0x25, 0x68, 0x44, 0x68,
+              0x25, 0x42, 0xFA, 0xD1, 0x84, 0x68, 0x25, 0x42, 0x05, 0xD1,
+              0x00, 0x29, 0xED, 0xD1, 0x31, 0x60, 0x34, 0x24, 0xE7, 0x1B,
+              0xE1, 0xE7, 0x05, 0x61, 0x00, 0xBE))
+
+# Control block layout, located immediately after the stub:
+#
+#   +0x00   status register address
+#   +0x04   status register busy mask
+#   +0x08   status register error mask
+#   +0x0C   programming unit size in bytes
+#   +0x10   mailbox; the stub posts the status register here on error
+#   +0x14   descriptor 0 (length, flash address, RAM buffer address)
+#   +0x20   descriptor 1 (length, flash address, RAM buffer address)
+#
+# A descriptor length of 0 means the buffer belongs to the host; the host
+# hands a buffer to the stub by writing a non-zero length and the stub hands
+# it back by clearing the length once the buffer has been programmed.
+CTRL_OFFSET    = 0x50
+MAILBOX_OFFSET = 0x10
+DESC_OFFSETS   = (0x14, 0x20)
+BUF_OFFSET     = 0x100
+EXIT_MARKER    = 0xFFFFFFFF
+MAX_BUF_SIZE   = 4096
+assert len(STUB) <= CTRL_OFFSET
+
+
+class StubTimeoutException(Exception):
+    pass
+
+
+def start_stub(cpu, pc, r0):
+    '''
+    Starts a halted CPU executing a stub at the specified address with r0 set
+    to the specified value and interrupts masked.
+    '''
+    # The PRIMASK lives in the CONTROL/FAULTMASK/BASEPRI/PRIMASK register,
+    # which v6-M names differently.
+    cp = 'cfbp' if 'cfbp' in cpu.scs.core_regs else 'cp'
+    cpu.write_core_register(r0, 'r0')
+    cpu.write_core_register(pc, 'pc')
+    cpu.write_core_register(0x01000000, 'xpsr')
+    cpu.write_core_register(0x00000001, cp)
+    cpu.resume()
+
+
+def wait_halted(cpu, timeout):
+    '''
+    Waits for a stub started with start_stub() to halt, halting the CPU and
+    raising an exception if it takes longer than the timeout.
+    '''
+    t0 = time.time()
+    while not cpu.is_halted():
+        if time.time() - t0 > timeout:
+            cpu.halt()
+            raise StubTimeoutException('Stub timed out.')
+
+
+class FlashLoader:
+    '''
+    Programs flash by running a small stub on a target CPU.  The host streams
+    data into one of two RAM buffers while the stub programs the other one,
+    so SWD traffic only ever targets RAM and never stalls waiting on the flash
+    controller; this lets the burn run at the target's maximum SWD frequency.
+
+    The owning flash driver remains responsible for unlocking the controller,
+    enabling programming mode and checking the status register afterwards.
+    '''
+    def __init__(self, cpu, ram, unit, busy_mask, error_mask, offset=0,
+                 max_buf_size=MAX_BUF_SIZE, timeout=5):
+        assert unit % 4 == 0
+        assert offset % 4 == 0
+        buf_size = min(max_buf_size, (ram.size - offset - BUF_OFFSET) // 2)
+        buf_size -= buf_size % unit
+        assert buf_size > 0
+
+        self.cpu        = cpu
+        self.ram        = ram
+        self.unit       = unit
+        self.busy_mask  = busy_mask
+        self.error_mask = error_mask
+        self.timeout    = timeout
+        self.buf_size   = buf_size
+        self.base_addr  = ram.dev_base + offset
+        self.ctrl_addr  = self.base_addr + CTRL_OFFSET
+        self.buf_addrs  = (self.base_addr + BUF_OFFSET,
+                           self.base_addr + BUF_OFFSET + buf_size)
+
+    def _start(self, sr_addr):
+        '''
+        Downloads the stub and an empty control block and starts the CPU
+        executing the stub.
+        '''
+        ctrl = struct.pack('<IIIIIIIIIII', sr_addr, self.busy_mask,
+                           self.error_mask, self.unit, 0,
+                           0, 0, self.buf_addrs[0],
+                           0, 0, self.buf_addrs[1])
+        image = STUB + b'\x00'*(CTRL_OFFSET - len(STUB)) + ctrl
+        self.cpu.write_bulk(image, self.base_addr)
+        start_stub(self.cpu, self.base_addr, self.ctrl_addr)
+
+    def _wait_desc_free(self, desc_addr):
+        '''
+        Waits for the stub to hand the specified descriptor's buffer back to
+        the host.  Raises an exception if the stub stops before doing so.
+        '''
+        t0 = time.time()
+        while self.cpu.read_32(desc_addr):
+            if self.cpu.is_halted():
+                raise flash.FlashWriteException(
+                        'Flash loader stopped, mailbox 0x%08X'
+                        % self._read_mailbox())
+            if time.time() - t0 > self.timeout:
+                self.cpu.halt()
+                raise flash.FlashWriteException('Flash loader timed out.')
+
+    def _read_mailbox(self):
+        return self.cpu.read_32(self.ctrl_addr + MAILBOX_OFFSET)
+
+    def program(self, addr, data, sr_addr):
+        '''
+        Programs the data to flash at the specified address.  The flash
+        controller must already be in programming mode and the data must be a
+        multiple of the programming unit in length.  Programming stops early
+        if the status register reports an error; the caller should check the
+        status register afterwards as it would for a direct SWD write.
+        '''
+        assert self.cpu.is_halted()
+        assert len(data) % self.unit == 0
+        if not data:
+            return
+
+        self._start(sr_addr)
+        try:
+            i = 0
+            for pos in range(0, len(data), self.buf_size):
+                desc_addr = self.ctrl_addr + DESC_OFFSETS[i]
+                chunk     = data[pos:pos + self.buf_size]
+                self._wait_desc_free(desc_addr)
+                self.cpu.write_bulk(chunk, self.buf_addrs[i])
+                self.cpu.write_32(addr + pos, desc_addr + 4)
+                self.cpu.write_32(len(chunk), desc_addr)
+                i ^= 1
+
+            desc_addr = self.ctrl_addr + DESC_OFFSETS[i]
+            self._wait_desc_free(desc_addr)
+            self.cpu.write_32(EXIT_MARKER, desc_addr)
+            wait_halted(self.cpu, self.timeout)
+        except Exception:
+            self.cpu.halt()
+            raise
+
+        mailbox = self._read_mailbox()
+        if mailbox:
+            raise flash.FlashWriteException(
+                    'Flash loader failed, mailbox 0x%08X' % mailbox)
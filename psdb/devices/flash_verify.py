@@ -0,0 +1,116 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+from .flash_loader import StubTimeoutException
+from ..util import crc32_stm32
+
+
+class Verifier:
+    '''
+    Base class for methods of comparing flash contents against host data.
+    Each flash keeps a list of verifiers ordered from fastest to slowest and
+    uses the first one that reports itself usable.
+    '''
+    NAME = None
+
+    def __init__(self, flash):
+        self.flash = flash
+
+    def is_usable(self):
+        return True
+
+    def region_matches(self, addr, data):
+        '''
+        Returns True if the flash region at the specified address holds
+        exactly the specified data.
+        '''
+        raise NotImplementedError
+
+
+class ReadbackVerifier(Verifier):
+    '''
+    Reads the flash region back over SWD and compares it on the host.  This
+    always works but costs as much SWD bandwidth as the burn itself.
+    '''
+    NAME = 'readback'
+
+    def __init__(self, flash):
+        super().__init__(flash)
+        self.buf = bytearray()
+
+    def region_matches(self, addr, data):
+        if len(self.buf) < len(data):
+            self.buf = bytearray(len(data))
+        mem = memoryview(self.buf)[:len(data)]
+        self.flash.read_into(addr, mem)
+        return mem == data
+
+
+class CRCVerifier(Verifier):
+    '''
+    Base class for verifiers that compute a CRC-32 of the flash region on the
+    target and compare it against psdb.util.crc32_stm32() of the data, so that
+    only the 4-byte result has to cross SWD.  Before first use the on-target
+    CRC is checked once against a readback of the start of flash; if they
+    disagree the verifier reports itself unusable.  Regions that don't meet
+    the alignment requirement are read back instead.
+    '''
+    ALIGN           = 4
+    CALIBRATION_LEN = 1024
+
+    def __init__(self, flash):
+        super().__init__(flash)
+        self.usable   = None
+        self.readback = ReadbackVerifier(flash)
+
+    def compute_crc(self, addr, length):
+        raise NotImplementedError
+
+    def is_usable(self):
+        if self.usable is None:
+            base = self.flash.mem_base
+            data = self.flash.read(base, self.CALIBRATION_LEN)
+            try:
+                self.usable = (self.compute_crc(base, len(data)) ==
+                               crc32_stm32(data))
+            except StubTimeoutException:
+                self.usable = False
+        return self.usable
+
+    def region_matches(self, addr, data):
+        if not data:
+            return True
+        if addr % self.ALIGN or len(data) % self.ALIGN:
+            return self.readback.region_matches(addr, data)
+        return self.compute_crc(addr, len(data)) == crc32_stm32(data)
+
+
+class FlashCRCVerifier(CRCVerifier):
+    '''
+    Uses a CRC unit built into the flash controller, accessed through the
+    flash driver's compute_crc() method.
+    '''
+    NAME  = 'flash CRC unit'
+    ALIGN = 128
+
+    def compute_crc(self, addr, length):
+        return self.flash.compute_crc(addr, length)
+
+
+class CRCPeripheralVerifier(CRCVerifier):
+    '''
+    Uses the MCU's general-purpose CRC peripheral, fed by a stub running out
+    of the flash loader's RAM on the loader's CPU.  This is only usable while
+    a flash loader is attached, since otherwise we have no RAM to clobber.
+    '''
+    NAME = 'CRC peripheral'
+
+    def __init__(self, flash, crc):
+        super().__init__(flash)
+        self.crc = crc
+
+    def is_usable(self):
+        return self.flash.loader is not None and super().is_usable()
+
+    def compute_crc(self, addr, length):
+        loader = self.flash.loader
+        return self.crc.compute_crc(loader.cpu, loader.base_addr, addr,
+                                    length)
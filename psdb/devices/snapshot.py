@@ -0,0 +1,166 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import collections
+import struct
+import types
+
+from .device import Reg, RegDiv
+
+
+SnapshotEntry = collections.namedtuple('SnapshotEntry',
+                                       ['dev', 'reg', 'addr', 'value'])
+
+
+class Snapshot:
+    '''
+    An immutable set of register values captured by capture().  Values are
+    indexed by device name and register name:
+
+        v = snapshot['RCC', 'CR']
+
+    Registers that weren't captured because they aren't readable or have read
+    side effects are simply absent from the snapshot.  Iterating over a
+    snapshot yields SnapshotEntry tuples in device and register order.
+    '''
+    def __init__(self, entries):
+        self._entries = tuple(entries)
+        self._values  = types.MappingProxyType(
+                {(e.dev, e.reg) : e.value for e in self._entries})
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, dev_name, reg_name, default=None):
+        return self._values.get((dev_name, reg_name), default)
+
+    def device_values(self, dev_name):
+        '''
+        Returns a dict mapping register name to value for the named device.
+        '''
+        return {e.reg : e.value for e in self._entries if e.dev == dev_name}
+
+    def diff(self, other):
+        '''
+        Returns a list of (dev, reg, addr, old_value, new_value) tuples for
+        every register whose value differs between this snapshot and the
+        other, newer one.  Registers present in only one of the snapshots are
+        reported with a value of None on the other side.
+        '''
+        diffs = []
+        seen  = set()
+        for e in self._entries:
+            key = (e.dev, e.reg)
+            seen.add(key)
+            v = other.get(e.dev, e.reg)
+            if v != e.value:
+                diffs.append((e.dev, e.reg, e.addr, e.value, v))
+        for e in other:
+            if (e.dev, e.reg) not in seen:
+                diffs.append((e.dev, e.reg, e.addr, None, e.value))
+        return diffs
+
+
+def is_snapshottable(r):
+    '''
+    Returns True if the register can be safely read as part of a snapshot.
+    '''
+    return (not isinstance(r, RegDiv) and (r.flags & Reg.READABLE) and
+            not (r.flags & Reg.SIDE_EFFECTS))
+
+
+def _compile_spans(devs):
+    '''
+    Groups the snapshottable registers of the devices by AP and by address.
+    Runs of adjacent 32-bit registers are returned as spans to be read with
+    a single read_bulk() each; everything else is returned as a list of
+    single registers.  A register that aliases another register with read
+    side effects is never read.  Returns a tuple of the form:
+
+        ({ap : [(addr, [[(dev, reg), ...], ...]), ...]},
+         [[(dev, reg), ...], ...])
+
+    where each span lists the registers at each of its word addresses.
+    '''
+    by_ap  = collections.OrderedDict()
+    unsafe = set()
+    for d in devs:
+        regs = by_ap.setdefault(d.ap, collections.OrderedDict())
+        for r in d.regs:
+            if isinstance(r, RegDiv):
+                continue
+            addr = d.dev_base + r.offset
+            if is_snapshottable(r):
+                regs.setdefault((addr, r.size), []).append((d, r))
+            elif r.flags & Reg.SIDE_EFFECTS:
+                unsafe.add(addr)
+
+    spans   = {}
+    singles = []
+    for ap, regs in by_ap.items():
+        ap_spans = []
+        for (addr, size), regs_at in sorted(regs.items(),
+                                            key=lambda kv: kv[0]):
+            if addr in unsafe:
+                continue
+            if size != 4 or addr % 4:
+                singles.append(regs_at)
+                continue
+
+            if ap_spans and ap_spans[-1][0] + 4*len(ap_spans[-1][1]) == addr:
+                ap_spans[-1][1].append(regs_at)
+            else:
+                ap_spans.append((addr, [regs_at]))
+
+        spans[ap] = []
+        for span in ap_spans:
+            if len(span[1]) > 1:
+                spans[ap].append(span)
+            else:
+                singles.append(span[1][0])
+
+    return spans, singles
+
+
+def capture(devs):
+    '''
+    Reads every readable register without read side effects from the
+    specified devices and returns a Snapshot.  Runs of adjacent registers are
+    read with one read_bulk() each and the remaining registers are read in a
+    single exec_cmd_list() batch, which the probe may turn into scatter/gather
+    or pipelined operations.
+    '''
+    devs   = list(devs)
+    values = {}
+    spans, singles = _compile_spans(devs)
+    for ap, ap_spans in spans.items():
+        for addr, regs in ap_spans:
+            data = ap.read_bulk(addr, 4*len(regs))
+            for regs_at, v in zip(regs, struct.unpack('<%uI' % len(regs),
+                                                      data)):
+                for d, r in regs_at:
+                    values[(d, r)] = v
+
+    if singles:
+        db   = singles[0][0][0].ap.db
+        vals = db.exec_cmd_list([regs_at[0][1].read_cmd(regs_at[0][0])
+                                 for regs_at in singles])
+        for regs_at, v in zip(singles, vals):
+            for d, r in regs_at:
+                values[(d, r)] = v
+
+    entries = []
+    for d in devs:
+        for r in d.regs:
+            v = values.get((d, r))
+            if v is not None:
+                entries.append(SnapshotEntry(d.name, r.name,
+                                             d.dev_base + r.offset, v))
+    return Snapshot(entries)
@@ -22,6 +22,7 @@ from .qspi import QUADSPI
 from .octospi import OCTOSPI
 from .gpdma import GPDMA
 from .cordic import CORDIC
+from .crc import CRC
 from . import flash_type1
 
 
@@ -32,6 +33,7 @@ __all__ = ['ACT',
            'ADC16',
            'BT',
            'CORDIC',
+           'CRC',
            'CRS',
            'DAC',
            'DAC_Saw',
@@ -0,0 +1,72 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import struct
+
+from ..device import Device, AReg32
+from .. import flash_loader
+
+
+# ARMv6-M stub that feeds a word-aligned memory region through the CRC unit.
+# It is entered with r0 pointing at a control block holding the CRC unit's
+# base address, the region address and the region length, and posts the
+# resulting CRC to the fourth word of the control block before halting.
+# Assembled with:
+#
+#   llvm-mc -triple=thumbv6m-none-eabi -filetype=obj
+#
+#           ldr     r1, [r0, #0]        @ r1 = CRC base
+#           ldr     r2, [r0, #4]        @ r2 = region address
+#           ldr     r3, [r0, #8]        @ r3 = region length
+#   loop:   ldm     r2!, {r4}
+#           str     r4, [r1, #0]        @ CRC_DR = word
+#           subs    r3, #4
+#           bne     loop
+#           ldr     r4, [r1, #0]
+#           str     r4, [r0, #12]       @ Post CRC_DR to the control block.
+#           bkpt    #0
+STUB = bytes((0x01, 0x68, 0x42, 0x68, 0x83, 0x68, 0x10, 0xCA, 0x0C, 0x60,
+              0x04, 0x3B, 0xFB, 0xD1, 0x0C, 0x68, 0xC4, 0x60, 0x00, 0xBE))
+CTRL_OFFSET = 0x20
+assert len(STUB) <= CTRL_OFFSET
+
+
+class CRC(Device):
+    '''
+    Driver for the STM32 CRC calculation unit.
+    '''
+    REGS = [AReg32('DR',        0x000),
+            AReg32('IDR',       0x004),
+            AReg32('CR',        0x008, [('RESET',           0),
+                                        ('POLYSIZE',        3,  4),
+                                        ('REV_IN',          5,  6),
+                                        ('REV_OUT',         7),
+                                        ]),
+            AReg32('INIT',      0x010),
+            AReg32('POL',       0x014),
+            ]
+
+    def __init__(self, target, ap, name, addr, **kwargs):
+        super().__init__(target, ap, addr, name, CRC.REGS, **kwargs)
+
+    def compute_crc(self, cpu, ram_addr, addr, length, timeout=5):
+        '''
+        Computes the CRC of the word-aligned memory region by running a stub
+        on the specified halted CPU out of the RAM at ram_addr, which is
+        clobbered.  The unit is configured for the standard CRC-32 polynomial
+        with no reversal, so the result matches psdb.util.crc32_stm32().
+        '''
+        assert addr % 4 == 0
+        assert length and length % 4 == 0
+        assert cpu.is_halted()
+
+        self.owner.devs['RCC'].enable_device('CRC')
+        self._INIT = 0xFFFFFFFF
+        self._POL  = 0x04C11DB7
+        self._CR   = 1
+
+        ctrl_addr = ram_addr + CTRL_OFFSET
+        ctrl      = struct.pack('<IIII', self.dev_base, addr, length, 0)
+        image     = STUB + b'\x00'*(CTRL_OFFSET - len(STUB)) + ctrl
+        cpu.write_bulk(image, ram_addr)
+        flash_loader.start_stub(cpu, ram_addr, ctrl_addr)
+        flash_loader.wait_halted(cpu, timeout)
+        return cpu.read_32(ctrl_addr + 12)
@@ -45,6 +45,10 @@ class FLASH(Device, Flash):
     '''
     Common base class for many STM32 flash devices.
     '''
+    LOADER_UNIT       = 8
+    LOADER_BUSY_MASK  = 0x00010000
+    LOADER_ERROR_MASK = 0x0000C3F8
+
     def __init__(self, target, regs, sector_size, ap, name, dev_base, mem_base,
                  max_nowait_write_freq, otp_base, otp_len, **kwargs):
         Device.__init__(self, target, ap, dev_base, name, regs, **kwargs)
@@ -140,7 +144,10 @@ class FLASH(Device, Flash):
             self._clear_errors()
             self._CR = (1 << 0)
             try:
-                self.ap.write_bulk(data, addr)
+                if self.loader:
+                    self.loader.program(addr, data, self._SR.addr)
+                else:
+                    self.ap.write_bulk(data, addr)
                 self._wait_bsy_clear()
                 self._check_errors()
             finally:
@@ -1,6 +1,14 @@
 # Copyright (c) 2018-2019 Phase Advanced Sensor Systems, Inc.
 from ..device import Device, Reg32, Reg32R, Reg32W
 from ..flash import Flash
+from ..flash_verify import FlashCRCVerifier
+
+
+# FLASH_SR bits that indicate a failed operation: WRPERR, PGSERR, STRBERR,
+# INCERR, OPERR, RDPERR, RDSERR and DBECCERR.  SNECCERR reports an ECC error
+# that was corrected and CRCEND reports a finished CRC computation, so neither
+# is a failure.
+SR_ERROR_MASK = 0x05EE0000
 
 
 class FlashBank(Device):
@@ -99,7 +107,7 @@ class FlashBank(Device):
 
     def _check_errors(self):
         v = self._SR.read()
-        if v & 0x0FEE0000:
+        if v & SR_ERROR_MASK:
             raise Exception('Flash operation failed, FLASH_SR=0x%08X' % v)
 
     def _wait_prg_idle(self):
@@ -122,6 +130,43 @@ class FlashBank(Device):
         v = self._CR.read()
         self._CR = ((v & ~2) | 1)
 
+    def compute_crc(self, offset, length):
+        '''
+        Uses the bank's CRC unit to compute the CRC of length bytes starting at
+        the specified offset from the start of the bank.  The CRC unit reads
+        the flash in bursts of 4 flash words, so the offset and length must be
+        multiples of 128 bytes.  The result is the default STM32 CRC-32 of the
+        region, as computed by psdb.util.crc32_stm32().
+        '''
+        assert offset % 128 == 0
+        assert length and length % 128 == 0
+
+        locked = self._CR.read() & 1
+        if locked:
+            self._KEYR = 0x45670123
+            self._KEYR = 0xCDEF89AB
+        try:
+            self._CR.CRC_EN = 1
+            self._CCR       = 0x18000000
+            self._CRCSADDR  = offset
+            self._CRCEADDR  = offset + length - 4
+            self._CRCCR     = (1 << 17)
+            self._CRCCR     = (1 << 16)
+            while self._SR.CRC_BUSY:
+                pass
+
+            v = self._SR.read()
+            if v & 0x10000000:
+                raise Exception('Flash CRC read error, FLASH_SR=0x%08X' % v)
+            crc       = self._CRCDATAR.read()
+            self._CCR = 0x18000000
+        finally:
+            self._CR.CRC_EN = 0
+            if locked:
+                self._CR.LOCK = 1
+
+        return crc
+
 
 class UnlockedContextManager:
     def __init__(self, bank):
@@ -153,6 +198,10 @@ class FLASH(Device, Flash):
     '''
     Driver for the FLASH device on the STM32H7xx series of MCUs.
     '''
+    LOADER_UNIT       = 32
+    LOADER_BUSY_MASK  = 0x00000007
+    LOADER_ERROR_MASK = SR_ERROR_MASK
+
     REGS = [Reg32 ('ACR',           0x000),
             Reg32W('OPTKEYR',       0x008),
             Reg32 ('OPTCR',         0x018, [('OPTLOCK',         1),
@@ -180,6 +229,7 @@ class FLASH(Device, Flash):
                                  for i in range(nbanks)]
         self.sectors_per_bank = self.nsectors // nbanks
         self.bank_size        = self.sector_size * self.sectors_per_bank
+        self.add_verifier(FlashCRCVerifier(self))
 
     @staticmethod
     def _flash_bank_unlocked(bank):
@@ -232,6 +282,16 @@ class FLASH(Device, Flash):
         '''
         return self.ap.read_bulk(addr, length)
 
+    def compute_crc(self, addr, length):
+        '''
+        Computes the CRC of a flash region using the CRC unit of the bank that
+        contains it.  The region must not span banks.
+        '''
+        offset = addr - self.mem_base
+        n      = offset // self.bank_size
+        assert n == (offset + length - 1) // self.bank_size
+        return self.banks[n].compute_crc(offset % self.bank_size, length)
+
     def write(self, addr, data, verbose=True):
         '''
         Writes 32-byte lines of data to the flash.  The address must be
@@ -257,6 +317,9 @@ class FLASH(Device, Flash):
         bank = self.banks[(addr - self.mem_base) // self.bank_size]
         with self._flash_bank_unlocked(bank):
             bank._clear_errors()
-            self.ap.write_bulk(data, addr)
+            if self.loader:
+                self.loader.program(addr, data, bank._SR.addr)
+            else:
+                self.ap.write_bulk(data, addr)
             bank._wait_prg_idle()
             bank._check_errors()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+'''
+Runs the flash loader with the STM32H7 masks against the simulator's model
+of the loader stub, with status bits that don't indicate failure (CRCEND and
+SNECCERR) stuck on in FLASH_SR, and checks that the data is still programmed
+and accepted by the driver.  A real error bit must still stop the loader.
+
+    python3 -m psdb.devices.stm32h7.loader_test
+'''
+import random
+import types
+
+from psdb.devices.flash import FlashWriteException
+from psdb.devices.flash_loader import FlashLoader
+from psdb.devices.stm32h7.flash import FLASH, FlashBank
+from psdb.probes.sim import model
+
+
+ITCM_BASE  = 0x00000000
+FLASH_BASE = 0x08000000
+SR_ADDR    = 0x52002010
+
+SR_SNECCERR = (1 << 25)
+SR_CRCEND   = (1 << 27)
+SR_PGSERR   = (1 << 18)
+
+
+class SimCPU:
+    '''
+    Just enough of a CPU for FlashLoader, running the simulator's behavioral
+    loader stub whenever the host looks at the target.
+    '''
+    def __init__(self, bus):
+        self.bus     = bus
+        self.halted  = True
+        self.regs    = {}
+        self.program = None
+        self.scs     = types.SimpleNamespace(core_regs={'cp' : None})
+
+    def _tick(self):
+        if self.program and not self.halted:
+            self.program.step()
+
+    def breakpoint(self):
+        self.halted = True
+
+    def write_core_register(self, v, name):
+        self.regs[name] = v
+
+    def resume(self):
+        self.halted  = False
+        self.program = model.LoaderStub(self, self.regs['r0'])
+
+    def halt(self):
+        self.halted = True
+
+    def is_halted(self):
+        self._tick()
+        return self.halted
+
+    def read_32(self, addr):
+        self._tick()
+        return self.bus.read(addr, 4)
+
+    def write_32(self, v, addr):
+        self.bus.write(addr, v, 4)
+
+    def write_bulk(self, data, addr):
+        self.bus.write_block(addr, data, 4)
+
+
+def make_loader(sr):
+    bus   = model.Bus()
+    flash = bus.add(model.RAM(FLASH_BASE, 0x10000))
+    bus.add(model.RAM(ITCM_BASE, 0x10000))
+    bus.add(model.Registers(SR_ADDR & ~0xFFF, 0x1000,
+                            {SR_ADDR & 0xFFF : sr}))
+    ram    = types.SimpleNamespace(dev_base=ITCM_BASE, size=0x10000)
+    loader = FlashLoader(SimCPU(bus), ram, FLASH.LOADER_UNIT,
+                         FLASH.LOADER_BUSY_MASK, FLASH.LOADER_ERROR_MASK)
+    return loader, flash
+
+
+def check_errors(sr):
+    bank = types.SimpleNamespace(_SR=types.SimpleNamespace(read=lambda: sr))
+    FlashBank._check_errors(bank)
+
+
+def main():
+    data = random.randbytes(0x3000)
+
+    sr = SR_CRCEND | SR_SNECCERR
+    loader, flash = make_loader(sr)
+    loader.program(FLASH_BASE, data, SR_ADDR)
+    assert bytes(flash.buf[:len(data)]) == data
+    check_errors(sr)
+    print('Programmed with FLASH_SR=0x%08X.' % sr)
+
+    sr = SR_CRCEND | SR_PGSERR
+    loader, flash = make_loader(sr)
+    try:
+        loader.program(FLASH_BASE, data, SR_ADDR)
+        raise Exception('Loader ignored PGSERR.')
+    except FlashWriteException as e:
+        print('Stopped with FLASH_SR=0x%08X: %s' % (sr, e))
+    try:
+        check_errors(sr)
+        raise Exception('Driver ignored PGSERR.')
+    except Exception as e:
+        assert 'Flash operation failed' in str(e)
+
+    print('Success.')
+
+
+if __name__ == '__main__':
+    main()
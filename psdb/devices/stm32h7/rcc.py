@@ -2,9 +2,13 @@
 import time
 import math
 
-from ..device import Device, Reg32
+from ..device import Device, Reg32, with_shadow
 
 
+# Registers read when computing clock tree frequencies.
+CLOCK_REGS = ('_CR', '_CFGR', '_PLLCKSELR', '_PLLCFGR', '_PLL1DIVR',
+              '_D1CFGR', '_D2CFGR', '_D3CFGR')
+
 ENABLE_BITS = {
     # AHB3
     'MDMA'              : (0xD4,  0),
@@ -1492,9 +1496,11 @@ class RCC(Device):
         return 4000000
 
     @property
+    @with_shadow(*CLOCK_REGS)
     def f_hsi(self):
         while self._CR.HSIDIVF == 0:
             time.sleep(0.01)
+            self.invalidate_shadow(self._CR)
         return 64000000 >> self._CR.HSIDIV
 
     def set_f_hse(self, f):
@@ -1509,6 +1515,7 @@ class RCC(Device):
         return self._f_hse
 
     @property
+    @with_shadow(*CLOCK_REGS)
     def f_pllsrc(self):
         pllsrc = self._PLLCKSELR.PLLSRC
         if pllsrc == 0:
@@ -1520,6 +1527,7 @@ class RCC(Device):
         return 0
 
     @property
+    @with_shadow(*CLOCK_REGS)
     def f_pll1_p_clk(self):
         if self._CR.PLL1ON == 0:
             return 0
@@ -1532,6 +1540,7 @@ class RCC(Device):
         return self.f_pllsrc * N / (M * P)
 
     @property
+    @with_shadow(*CLOCK_REGS)
     def f_sysclk(self):
         sws = self._CFGR.SWS
         if sws == 0:
@@ -1545,42 +1554,49 @@ class RCC(Device):
         return 0
 
     @property
+    @with_shadow(*CLOCK_REGS)
     def f_sys_d1cpre_ck(self):
         d1cpre  = self._D1CFGR.D1CPRE
         divider = PRE_REV_MAP[d1cpre]
         return self.f_sysclk / divider
 
     @property
+    @with_shadow(*CLOCK_REGS)
     def f_hclk(self):
         hpre    = self._D1CFGR.HPRE
         divider = PRE_REV_MAP[hpre]
         return self.f_sys_d1cpre_ck / divider
 
     @property
+    @with_shadow(*CLOCK_REGS)
     def f_pclk1(self):
         d2ppre1 = self._D2CFGR.D2PPRE1
         divider = DPRE_REV_MAP[d2ppre1]
         return self.f_hclk / divider
 
     @property
+    @with_shadow(*CLOCK_REGS)
     def f_pclk2(self):
         d2ppre2 = self._D2CFGR.D2PPRE2
         divider = DPRE_REV_MAP[d2ppre2]
         return self.f_hclk / divider
 
     @property
+    @with_shadow(*CLOCK_REGS)
     def f_pclk3(self):
         d1ppre  = self._D1CFGR.D1PPRE
         divider = DPRE_REV_MAP[d1ppre]
         return self.f_hclk / divider
 
     @property
+    @with_shadow(*CLOCK_REGS)
     def f_pclk4(self):
         d3ppre  = self._D3CFGR.D3PPRE
         divider = DPRE_REV_MAP[d3ppre]
         return self.f_hclk / divider
 
     @property
+    @with_shadow(*CLOCK_REGS)
     def f_timx_ker_ck(self):
         d2ppre1 = self._D2CFGR.D2PPRE1
         timpre  = self._CFGR.TIMPRE
@@ -1588,6 +1604,7 @@ class RCC(Device):
         return self.f_hclk / divider
 
     @property
+    @with_shadow(*CLOCK_REGS)
     def f_timy_ker_ck(self):
         d2ppre2 = self._D2CFGR.D2PPRE2
         timpre  = self._CFGR.TIMPRE
@@ -1685,20 +1702,21 @@ class RCC(Device):
         assert P and not P % 2
         assert 2000000 <= f_pllref <= 16000000
 
-        self._PLLCKSELR.DIVM1 = M
-        if f_pllref <= 4000000:
-            self._PLLCFGR.PLL1RGE = 1
-        elif f_pllref <= 8000000:
-            self._PLLCFGR.PLL1RGE = 2
-        else:
-            self._PLLCFGR.PLL1RGE = 3
-        self._PLLCFGR.PLL1VCOSEL = 0
-        self._PLLCFGR.PLL1FRACEN = 0
-        self._PLL1DIVR.DIVN1     = N - 1
-        self._PLL1DIVR.DIVP1     = P - 1
-        self._PLL1FRACR          = 0
-        self._PLLCFGR.DIVP1EN    = 1
-        self._CR.PLL1ON          = 1
+        with self.transaction(('_PLLCKSELR', '_PLLCFGR', '_PLL1DIVR')):
+            self._PLLCKSELR.DIVM1 = M
+            if f_pllref <= 4000000:
+                self._PLLCFGR.PLL1RGE = 1
+            elif f_pllref <= 8000000:
+                self._PLLCFGR.PLL1RGE = 2
+            else:
+                self._PLLCFGR.PLL1RGE = 3
+            self._PLLCFGR.PLL1VCOSEL = 0
+            self._PLLCFGR.PLL1FRACEN = 0
+            self._PLL1DIVR.DIVN1     = N - 1
+            self._PLL1DIVR.DIVP1     = P - 1
+            self._PLL1FRACR          = 0
+            self._PLLCFGR.DIVP1EN    = 1
+        self._CR.PLL1ON = 1
         while self._CR.PLL1RDY == 0:
             time.sleep(0.01)
 
@@ -45,6 +45,10 @@ class FLASH(Device, Flash):
     '''
     Driver for the FLASH device on the STM32U585 series of MCUs.
     '''
+    LOADER_UNIT       = 16
+    LOADER_BUSY_MASK  = 0x00030000
+    LOADER_ERROR_MASK = 0x000020FA
+
     REGS = [AReg32('ACR',           0x000, [('LATENCY',         0, 3),
                                             ('PRFTEN',          8),
                                             ('LPM',             11),
@@ -301,7 +305,10 @@ class FLASH(Device, Flash):
             self._clear_errors()
             self._NSCR = (1 << 0)
             try:
-                self.ap.write_bulk(data, addr)
+                if self.loader:
+                    self.loader.program(addr, data, self._NSSR.addr)
+                else:
+                    self.ap.write_bulk(data, addr)
                 self._wait_bsy_clear()
                 self._check_errors()
             finally:
@@ -51,7 +51,9 @@ FUS is basically:
    will change whatever is in the flash back over and the MCU will boot into
    the wireless stack instead of FUS.
 '''
-from .ipc import IPC
+from .ipc import IPC, SRAM_BOOT_SIZE
 
 
-__all__ = ['IPC']
+__all__ = ['IPC',
+           'SRAM_BOOT_SIZE',
+           ]
@@ -21,6 +21,10 @@ SYSTEM_CMD_RSP_CHANNEL  = 2
 SYSTEM_EVENT_CHANNEL    = 2
 MM_CMD_CHANNEL          = 4
 
+# Size of the region at the start of SRAM1 that holds the vector table and
+# stack used when CPU1 is booted from SRAM.
+SRAM_BOOT_SIZE          = 512
+
 
 class IPC:
     def __init__(self, target, ap, base_addr, ram_size, vtor_addr):
@@ -63,7 +67,7 @@ class IPC:
         t = self.target
 
         # Write an infinite loop out of the reset handler vector.
-        sp   = self.vtor_addr + 512
+        sp   = self.vtor_addr + SRAM_BOOT_SIZE
         pc   = (self.vtor_addr + 8) | 1
         vtor = struct.pack('<LLH', sp, pc, 0xE7FE)
         self.ap.write_bulk(vtor, self.vtor_addr)
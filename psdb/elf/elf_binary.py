@@ -1,24 +1,103 @@
 # Copyright (c) 2018-2019 Phase Advanced Sensor Systems, Inc.
+import bisect
+import hashlib
+import io
+import mmap
+
 from elftools.elf.elffile import ELFFile
 
+import psdb.util.cache
+from .symbol_index import SymbolIndex
+
 
 class ELFBinary:
     '''
     Class used for reading the contents of an existing ELF file; typically used
     by flashing code to analyze an ELF executable and figure out which blocks
     of memory to be written where.
+
+    The file is memory-mapped if possible and segment contents are only
+    copied out of it when pv_dv or flash_dv is first used; read_p_addr() and
+    read_v_addr() read straight from the mapping.  The symbol table is parsed
+    into a SymbolIndex the first time a symbol is looked up, and the index is
+    cached on disk keyed by the SHA-256 of the file so that later runs against
+    the same file don't have to parse it again.
     '''
     def __init__(self, file_object):
         file_object.seek(0)
+        self.file     = file_object
+        self.image    = self._map_file(file_object)
         self.elf_file = ELFFile(file_object)
         self.symtab   = self.elf_file.get_section_by_name('.symtab')
         self.entry    = self.elf_file['e_entry']
-        self.pv_dv    = [(s['p_paddr'], s['p_vaddr'],
-                          s.data() + b'\x00'*(s['p_memsz'] - s['p_filesz']))
+        self.segments = [(s['p_paddr'], s['p_vaddr'], s['p_offset'],
+                          s['p_filesz'], s['p_memsz'])
                          for s in self.iter_segments()
                          if s['p_type'] == 'PT_LOAD'
                          ]
-        self.flash_dv = [(s[0], s[2]) for s in self.pv_dv]
+
+        # Per-address-index lists of segments sorted by base address, for
+        # _read().
+        self._seg_lists = []
+        for addr_index in (0, 1):
+            segs = sorted(self.segments, key=lambda seg: seg[addr_index])
+            self._seg_lists.append(([seg[addr_index] for seg in segs], segs))
+
+        self._pv_dv = None
+        self._index = None
+
+    @staticmethod
+    def _map_file(file_object):
+        '''
+        Returns a read-only view of the entire file: a memory mapping if the
+        file object is backed by a real file, otherwise a copy of its
+        contents.
+        '''
+        try:
+            return mmap.mmap(file_object.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, io.UnsupportedOperation, OSError, ValueError):
+            pass
+        file_object.seek(0)
+        data = file_object.read()
+        file_object.seek(0)
+        return data
+
+    def _segment_data(self, seg, offset, size):
+        '''
+        Returns size bytes from the specified offset in a segment's memory
+        image, zero-filling past the end of its file contents.
+        '''
+        _, _, f_offset, f_size, _ = seg
+        data = b''
+        if offset < f_size:
+            n    = min(size, f_size - offset)
+            data = self.image[f_offset + offset:f_offset + offset + n]
+        return bytes(data) + b'\x00'*(size - len(data))
+
+    @property
+    def pv_dv(self):
+        if self._pv_dv is None:
+            self._pv_dv = [(seg[0], seg[1], self._segment_data(seg, 0, seg[4]))
+                           for seg in self.segments]
+        return self._pv_dv
+
+    @property
+    def flash_dv(self):
+        return [(s[0], s[2]) for s in self.pv_dv]
+
+    @property
+    def index(self):
+        '''
+        Returns the SymbolIndex for the symbol table, loading it from the
+        cache or building it the first time it is used.
+        '''
+        if self._index is None:
+            if psdb.util.cache.cache_dir():
+                digest      = hashlib.sha256(self.image).hexdigest()
+                self._index = SymbolIndex.load(digest, self.symtab)
+            else:
+                self._index = SymbolIndex.from_symtab(self.symtab)
+        return self._index
 
     @staticmethod
     def from_path(path):
@@ -28,10 +107,10 @@ class ELFBinary:
         return self.elf_file.iter_segments()
 
     def get_symbols_by_substring(self, substr):
-        return [s for s in self.symtab.iter_symbols() if substr in s.name]
+        return self.index.get_by_substring(substr)
 
     def get_symbols_by_name(self, name):
-        return [s for s in self.symtab.iter_symbols() if s.name == name]
+        return self.index.get_by_name(name)
 
     def get_symbol_by_name(self, name):
         s = self.get_symbols_by_name(name)
@@ -41,14 +120,39 @@ class ELFBinary:
     def get_symbol_addr(self, sym):
         return self.get_symbol_by_name(sym)['st_value']
 
+    def lookup_func(self, addr):
+        '''
+        Returns the (addr, size, name) tuple of the function containing the
+        specified address, or None if the address isn't inside any function.
+        Functions with a size of 0 are assumed to extend up to the next
+        function symbol.
+        '''
+        return self.index.lookup_func(addr)
+
+    def lookup_symbol(self, addr):
+        '''
+        Returns the function or object symbol containing the specified
+        address, or None if there isn't one.
+        '''
+        return self.index.lookup_symbol(addr)
+
     def _read(self, addr, size, addr_index):
-        for v in self.pv_dv:
-            base = v[addr_index]
-            data = v[2]
-            if base <= addr and addr + size <= base + len(data):
-                offset = addr - base
-                return data[offset:offset + size]
-        return None
+        '''
+        Reads from the segment whose memory image contains the whole of the
+        specified range, returning None if there isn't one.  PT_LOAD segments
+        don't overlap, so the only candidate is the segment with the highest
+        base address not above addr.
+        '''
+        bases, segs = self._seg_lists[addr_index]
+        i = bisect.bisect_right(bases, addr) - 1
+        if i < 0:
+            return None
+
+        seg    = segs[i]
+        offset = addr - bases[i]
+        if offset + size > seg[4]:
+            return None
+        return self._segment_data(seg, offset, size)
 
     def read_p_addr(self, p_addr, size):
         return self._read(p_addr, size, 0)
@@ -0,0 +1,230 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import bisect
+import os
+
+import psdb.util.cache
+
+
+# Bump this whenever the format of the cached index changes.
+INDEX_VERSION = 1
+
+# Cached indexes are stored in this subdirectory of the psdb cache directory,
+# named by the SHA-256 of the ELF file.  Only the most recently used
+# MAX_CACHED_INDEXES are kept.
+CACHE_SUBDIR       = 'elf'
+MAX_CACHED_INDEXES = 32
+
+# Symbol types that occupy an address range and can be found by address.
+ADDR_TYPES = ('STT_FUNC', 'STT_OBJECT')
+
+
+class Symbol:
+    '''
+    An ELF symbol table entry.  This supports the same accessors as a
+    pyelftools Symbol (sym.name, sym['st_value'], sym.entry.st_value and
+    sym['st_info']['type']) so that it can stand in for one, but is cheap to
+    construct and can be cached.
+    '''
+    __slots__ = ('name', 'st_value', 'st_size', 'type', 'bind', 'st_shndx')
+
+    def __init__(self, name, value, size, typ, bind, shndx):
+        self.name     = name
+        self.st_value = value
+        self.st_size  = size
+        self.type     = typ
+        self.bind     = bind
+        self.st_shndx = shndx
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __repr__(self):
+        return 'Symbol(%s, 0x%08X, %u)' % (self.name, self.st_value,
+                                           self.st_size)
+
+    @property
+    def entry(self):
+        return self
+
+    @property
+    def st_info(self):
+        return {'type' : self.type, 'bind' : self.bind}
+
+    @staticmethod
+    def from_elftools(s):
+        return Symbol(s.name, s['st_value'], s['st_size'],
+                      s['st_info']['type'], s['st_info']['bind'],
+                      s['st_shndx'])
+
+    def to_list(self):
+        return [self.name, self.st_value, self.st_size, self.type, self.bind,
+                self.st_shndx]
+
+
+class SymbolIndex:
+    '''
+    Index of the symbols in an ELF file's symbol table.  Symbols can be looked
+    up by name through a dict, and the function and object symbols can be
+    looked up by address through a sorted address array, so lookups don't
+    have to walk the symbol table.  Each lookup structure is built the first
+    time it is needed.
+    '''
+    def __init__(self, symbols):
+        self.symbols    = symbols
+        self.by_name    = None
+        self.funcs      = None
+        self.func_addrs = None
+        self.addr_syms  = None
+        self.sym_addrs  = None
+        self.max_ends   = None
+
+    @staticmethod
+    def from_symtab(symtab):
+        if symtab is None:
+            return SymbolIndex([])
+        return SymbolIndex([Symbol.from_elftools(s)
+                            for s in symtab.iter_symbols()])
+
+    @staticmethod
+    def load(digest, symtab):
+        '''
+        Returns the index for the ELF file with the specified SHA-256 hex
+        digest, from the cache if possible and otherwise by parsing symtab
+        and caching the result.
+        '''
+        name  = os.path.join(CACHE_SUBDIR, digest + '.json')
+        cache = psdb.util.cache.load_json(name)
+        if (isinstance(cache, dict) and
+                cache.get('version') == INDEX_VERSION):
+            try:
+                index = SymbolIndex([Symbol(*s) for s in cache['symbols']])
+            except (KeyError, TypeError):
+                index = None
+            if index is not None:
+                _touch(name)
+                return index
+
+        index = SymbolIndex.from_symtab(symtab)
+        psdb.util.cache.save_json(name, {'version' : INDEX_VERSION,
+                                         'symbols' : [s.to_list()
+                                                      for s in index.symbols],
+                                         })
+        _prune()
+        return index
+
+    def _load_by_name(self):
+        self.by_name = {}
+        for s in self.symbols:
+            self.by_name.setdefault(s.name, []).append(s)
+
+    def get_by_name(self, name):
+        if self.by_name is None:
+            self._load_by_name()
+        return list(self.by_name.get(name, ()))
+
+    def get_by_substring(self, substr):
+        if self.by_name is None:
+            self._load_by_name()
+        return [s for name, syms in self.by_name.items() if substr in name
+                for s in syms]
+
+    def _load_funcs(self):
+        '''
+        Builds a list of (addr, size, name) tuples for all function symbols,
+        sorted by address, with the Thumb bit masked off the addresses.
+        '''
+        funcs = set()
+        for s in self.symbols:
+            if s.type == 'STT_FUNC' and s.name:
+                funcs.add((s.st_value & ~1, s.st_size, s.name))
+        self.funcs      = sorted(funcs)
+        self.func_addrs = [f[0] for f in self.funcs]
+
+    def lookup_func(self, addr):
+        '''
+        Returns the (addr, size, name) tuple of the function containing the
+        specified address, or None if the address isn't inside any function.
+        Functions with a size of 0 are assumed to extend up to the next
+        function symbol.
+        '''
+        if self.funcs is None:
+            self._load_funcs()
+
+        i = bisect.bisect_right(self.func_addrs, addr) - 1
+        if i < 0:
+            return None
+
+        # Aliased symbols share an address; prefer one whose size covers addr.
+        j = bisect.bisect_left(self.func_addrs, self.func_addrs[i])
+        for f in self.funcs[j:i + 1]:
+            if addr < f[0] + f[1]:
+                return f
+        for f in self.funcs[j:i + 1]:
+            if f[1] == 0:
+                return f
+        return None
+
+    def _load_addr_syms(self):
+        '''
+        Builds the list of sized function and object symbols sorted by
+        address, along with a running maximum of their end addresses so that
+        lookups know when to stop searching back past symbols that overlap.
+        '''
+        syms = [s for s in self.symbols
+                if s.name and s.st_size and s.type in ADDR_TYPES]
+        syms.sort(key=self._sym_addr)
+        self.addr_syms = syms
+        self.sym_addrs = [self._sym_addr(s) for s in syms]
+        self.max_ends  = []
+        end = 0
+        for addr, s in zip(self.sym_addrs, syms):
+            end = max(end, addr + s.st_size)
+            self.max_ends.append(end)
+
+    def lookup_symbol(self, addr):
+        '''
+        Returns the function or object Symbol whose extent contains the
+        specified address, or None if there isn't one.  Where symbols
+        overlap, the one that starts closest below addr wins.
+        '''
+        if self.addr_syms is None:
+            self._load_addr_syms()
+
+        i = bisect.bisect_right(self.sym_addrs, addr) - 1
+        while i >= 0 and addr < self.max_ends[i]:
+            s = self.addr_syms[i]
+            if addr < self.sym_addrs[i] + s.st_size:
+                return s
+            i -= 1
+        return None
+
+    @staticmethod
+    def _sym_addr(s):
+        if s.type == 'STT_FUNC':
+            return s.st_value & ~1
+        return s.st_value
+
+
+def _touch(name):
+    try:
+        os.utime(psdb.util.cache.cache_path(name))
+    except (OSError, TypeError):
+        pass
+
+
+def _prune():
+    '''
+    Deletes all but the MAX_CACHED_INDEXES most recently used cached indexes.
+    '''
+    path = psdb.util.cache.cache_path(CACHE_SUBDIR)
+    if not path:
+        return
+
+    try:
+        paths = [os.path.join(path, n) for n in os.listdir(path)
+                 if n.endswith('.json')]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        for p in paths[MAX_CACHED_INDEXES:]:
+            os.unlink(p)
+    except OSError:
+        pass
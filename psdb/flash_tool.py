@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 # Copyright (c) 2018-2019 Phase Advanced Sensor Systems, Inc.
 import argparse
+import concurrent.futures
 import hashlib
+import multiprocessing
 import time
 import sys
 
@@ -10,6 +12,9 @@ import psdb.elf
 import psdb.hexfile
 
 
+# --read-flash writes Intel HEX instead of a raw binary for these extensions.
+HEX_EXTENSIONS = ('.hex', '.ihex')
+
 IMAGE_PARSERS = [psdb.elf.ELFBinary.from_path,
                  psdb.hexfile.HEXFile,
                  ]
@@ -25,12 +30,135 @@ def parse_image(path):
     raise Exception('Unrecognized file type.')
 
 
+class GangResult:
+    def __init__(self, serial_num, usb_path):
+        self.serial_num = serial_num
+        self.usb_path   = usb_path
+        self.target     = None
+        self.error      = None
+        self.verifier   = None
+        self.elapsed    = 0
+
+    def __repr__(self):
+        status = 'FAILED: %s' % self.error if self.error else 'OK'
+        if self.verifier:
+            status += ' (verified by %s)' % self.verifier
+        return '%s %s [%s] %.2fs %s' % (self.serial_num, self.usb_path,
+                                        self.target, self.elapsed, status)
+
+
+def gang_burn_one(result, rv, dv, raw_data):
+    '''
+    Gang-programming worker.  This runs in its own process with its own libusb
+    context, so it opens the probe by serial number rather than receiving it
+    from the parent.  Any failure is recorded in the returned GangResult so
+    that the other boards in the gang keep going.
+    '''
+    t0 = time.time()
+    try:
+        probe = psdb.probes.make_one(serial_num=result.serial_num,
+                                     max_tck_freq=rv.max_tck_freq)
+        if rv.srst:
+            probe.srst_target()
+
+        probe.set_tck_freq(rv.probe_freq)
+        target = probe.probe(connect_under_reset=rv.connect_under_reset)
+        result.target = str(target)
+        probe.set_max_target_tck_freq()
+        if rv.no_loader:
+            target.flash.loader = None
+
+        if rv.erase:
+            target.flash.erase_all(verbose=False)
+            target.reset_halt()
+        if dv:
+            target.flash.burn_dv(target.flash.prune_dv(dv), verbose=False,
+                                 bank_swap=rv.flash_inactive, diff=rv.diff)
+        if raw_data:
+            target.flash.burn_dv([(target.flash.mem_base, raw_data)],
+                                 verbose=False, bank_swap=rv.flash_inactive,
+                                 diff=rv.diff)
+        if dv or raw_data:
+            result.verifier = target.flash.get_verifier().NAME
+
+        target.reset_halt()
+        if not rv.halt:
+            target.resume()
+    except Exception as e:
+        result.error = '%s' % (e or type(e).__name__)
+
+    result.elapsed = time.time() - t0
+    return result
+
+
+def gang_main(rv):
+    '''
+    Programs every attached probe matching the --usb-path/--serial-num filters
+    concurrently, one worker process per board, and prints a per-board
+    report.  Returns the number of boards that failed.
+    '''
+    if (rv.read_flash or rv.mem_dump or rv.option or rv.erase_region or
+            rv.get_options or rv.swap_banks):
+        raise psdb.ProbeException('Gang mode only supports erasing, flashing '
+                                  'and resetting.')
+
+    keys = {k : v for k, v in vars(rv).items()
+            if k in ('serial_num', 'usb_path') and v is not None}
+    enumerations = psdb.probes.find(**keys)
+    if not enumerations:
+        raise psdb.ProbeException('No probe found.')
+
+    dv = []
+    for path in rv.flash or []:
+        with open(path, 'rb') as f:
+            md5 = hashlib.md5(f.read())
+        print('Image "%s" MD5: %s' % (path, md5.hexdigest()))
+        dv = psdb.elf.dv.merge_dvs(dv, parse_image(path).flash_dv)
+
+    raw_data = None
+    if rv.write_raw_binary:
+        with open(rv.write_raw_binary, 'rb') as f:
+            raw_data = f.read()
+
+    print('Gang programming %u boards...' % len(enumerations))
+    t0      = time.time()
+    results = [GangResult(e.serial_num, e.usb_path) for e in enumerations]
+    ctx     = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(max_workers=len(results),
+                                                mp_context=ctx) as pool:
+        futures = [pool.submit(gang_burn_one, r, rv, dv, raw_data)
+                   for r in results]
+
+        # A worker that dies (for instance, BrokenProcessPool) only fails its
+        # own board.
+        for i, f in enumerate(futures):
+            try:
+                results[i] = f.result()
+            except Exception as e:
+                results[i].error = '%s' % (e or type(e).__name__)
+
+    nfailed = 0
+    for r in results:
+        print(r)
+        if r.error:
+            nfailed += 1
+    print('Programmed %u of %u boards in %.2f seconds.'
+          % (len(results) - nfailed, len(results), time.time() - t0))
+    return nfailed
+
+
 def main(rv):  # noqa: C901
     # Dump all debuggers if requested.
     if rv.dump_debuggers:
         psdb.probes.dump_probes()
         return
 
+    # Program all attached probes in parallel if requested.
+    if rv.gang:
+        if gang_main(rv):
+            sys.exit(1)
+        return
+
     # Probe the specified serial number (or find the default if no serial number
     # was specified.
     probe = psdb.probes.make_one_ns(rv)
@@ -57,8 +185,12 @@ def main(rv):  # noqa: C901
         t0 = time.time()
         data = target.flash.read_all()
         dt = time.time() - t0
-        with open(rv.read_flash, 'wb') as f:
-            f.write(data)
+        if rv.read_flash.lower().endswith(HEX_EXTENSIONS):
+            with open(rv.read_flash, 'w', encoding='utf8') as f:
+                psdb.hexfile.write_hex(f, [(target.flash.mem_base, data)])
+        else:
+            with open(rv.read_flash, 'wb') as f:
+                f.write(data)
         md5 = hashlib.md5(data)
         print('Read %u bytes in %.2f seconds (%.2f K/s).'
               % (len(data), dt, len(data) / (1024*dt)))
@@ -82,6 +214,10 @@ def main(rv):  # noqa: C901
                 print('Warning: option "%s" is %u not %u.'
                       % (k, final_opts[k], v))
 
+    # Write flash directly over SWD instead of via the loader if requested.
+    if rv.no_loader:
+        target.flash.loader = None
+
     # Erase the flash if requested.
     if rv.erase:
         target.flash.erase_all()
@@ -106,7 +242,8 @@ def main(rv):  # noqa: C901
             img = parse_image(path)
             pdv = target.flash.prune_dv(img.flash_dv)
             dv  = psdb.elf.dv.merge_dvs(dv, pdv)
-        target.flash.burn_dv(dv, verbose=True, bank_swap=rv.flash_inactive)
+        target.flash.burn_dv(dv, verbose=True, bank_swap=rv.flash_inactive,
+                             diff=rv.diff)
         print('Flash completed successfully.')
         target.reset_halt()
 
@@ -116,7 +253,8 @@ def main(rv):  # noqa: C901
         with open(rv.write_raw_binary, 'rb') as f:
             data = f.read()
         target.flash.burn_dv([(target.flash.mem_base, data)],
-                             verbose=True, bank_swap=rv.flash_inactive)
+                             verbose=True, bank_swap=rv.flash_inactive,
+                             diff=rv.diff)
         print('Flash completed successfully.')
         target.reset_halt()
 
@@ -160,6 +298,8 @@ def _main():
     parser.add_argument('--flash', action='append')
     parser.add_argument('--write-raw-binary')
     parser.add_argument('--flash-inactive', action='store_true')
+    parser.add_argument('--diff', action='store_true')
+    parser.add_argument('--no-loader', action='store_true')
     parser.add_argument('--erase', action='store_true')
     parser.add_argument('--erase-region', action='append')
     parser.add_argument('--mem-dump', '-m')
@@ -169,6 +309,7 @@ def _main():
     parser.add_argument('--swap-banks', action='store_true')
     parser.add_argument('--get-options', action='store_true')
     parser.add_argument('--option', '-o', nargs=2, action='append')
+    parser.add_argument('--gang', action='store_true')
     rv = parser.parse_args()
 
     try:
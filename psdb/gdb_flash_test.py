@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+'''
+Drives a flash burn through gdb_tool's vFlashErase/vFlashWrite/vFlashDone
+packets and checks the result with an m packet.  gdb_tool is started in a
+fresh interpreter so that nothing has been imported before the server handles
+the packets, the same as when gdb connects to it.  By default the simulated
+probe is used:
+
+    python3 -m psdb.gdb_flash_test
+
+Use --sim '' to run against real hardware instead; this overwrites the last
+flash sector of the target.
+'''
+import argparse
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+
+from psdb.gdb_tool import checksum, escape
+
+
+CONNECT_TIMEOUT = 30
+
+FLASH_RE = re.compile(rb'<memory type="flash" start="0x([0-9A-F]+)" '
+                      rb'length="0x([0-9A-F]+)">\s*'
+                      rb'<property name="blocksize">0x([0-9A-F]+)<')
+
+
+class GDBClient:
+    def __init__(self, port):
+        deadline = time.time() + CONNECT_TIMEOUT
+        while True:
+            try:
+                self.sock = socket.create_connection(('localhost', port))
+                break
+            except ConnectionRefusedError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.1)
+        self.data = b''
+
+    def close(self):
+        self.sock.close()
+
+    def _recv_byte(self):
+        if not self.data:
+            self.data = self.sock.recv(4096)
+            assert self.data, 'Connection closed'
+        b, self.data = self.data[0:1], self.data[1:]
+        return b
+
+    def transact(self, data):
+        '''
+        Sends a packet and returns the server's response packet.
+        '''
+        self.sock.sendall(b'$%s#%02x' % (data, checksum(data)))
+        assert self._recv_byte() == b'+'
+        while self._recv_byte() != b'$':
+            pass
+        rsp = b''
+        while True:
+            b = self._recv_byte()
+            if b == b'#':
+                break
+            rsp += b
+        csum = int(self._recv_byte() + self._recv_byte(), 16)
+        assert csum == checksum(rsp)
+        self.sock.sendall(b'+')
+        return rsp
+
+
+def main(rv):
+    env = dict(os.environ)
+    if rv.sim:
+        env['PSDB_SIM'] = rv.sim
+        env.setdefault('PSDB_SIM_LATENCY', '0')
+    cmd = [sys.executable, '-m', 'psdb.gdb_tool', '--halt',
+           '--port', str(rv.port)]
+    if rv.serial_num:
+        cmd += ['--serial-num', rv.serial_num]
+    server = subprocess.Popen(cmd, env=env)
+    try:
+        gc = GDBClient(rv.port)
+        mm = gc.transact(b'qXfer:memory-map:read::0,%x' % 0x4000)
+        assert mm.startswith(b'l')
+
+        m = FLASH_RE.search(mm)
+        assert m
+        start, size, sector_size = (int(v, 16) for v in m.groups())
+        addr  = start + size - sector_size
+        data  = random.randbytes(sector_size)
+        print('Burning 0x%08X...' % addr)
+
+        assert gc.transact(b'vFlashErase:%x,%x' % (addr, len(data))) == b'OK'
+        for i in range(0, len(data), 0x200):
+            pkt = b'vFlashWrite:%x:' % (addr + i) + escape(data[i:i + 0x200])
+            assert gc.transact(pkt) == b'OK'
+        assert gc.transact(b'vFlashDone') == b'OK'
+
+        rsp = gc.transact(b'm%x,%x' % (addr, len(data)))
+        assert bytes.fromhex(rsp.decode()) == data
+        gc.close()
+        print('Success.')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def _main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sim', default='stm32g431')
+    parser.add_argument('--serial-num')
+    parser.add_argument('--port', type=int, default=3433)
+    main(parser.parse_args())
+
+
+if __name__ == '__main__':
+    _main()
@@ -1,12 +1,31 @@
 #!/usr/bin/env python3
 # Copyright (c) 2018-2019 Phase Advanced Sensor Systems, Inc.
-import socket
 import argparse
-import threading
-import time
-from builtins import range, bytes
+import asyncio
+import concurrent.futures
+import re
+from builtins import bytes
 
 import psdb.probes
+import psdb.devices
+
+
+# Maximum packet size we advertise to gdb.  Large packets let gdb transfer
+# memory in big chunks instead of hundreds of tiny requests.
+PACKET_SIZE = 0x4000
+
+# Default interval in seconds at which a running CPU is checked for halting.
+POLL_INTERVAL = 0.05
+
+# Characters that must be escaped in binary data, and the escape sequence.
+ESCAPE_RE   = re.compile(b'[#$}*]')
+UNESCAPE_RE = re.compile(b'}(.)', re.DOTALL)
+
+MEMORY_MAP_HEADER = (
+    b'<?xml version="1.0"?>\n'
+    b'<!DOCTYPE memory-map PUBLIC "+//IDN gnu.org//DTD GDB Memory Map V1.0//EN"'
+    b' "http://sourceware.org/gdb/gdb-memory-map.dtd">\n'
+    b'<memory-map>\n')
 
 REG_MAP = [
     'r0', 'r1', 'r2', 'r3', 'r4', 'r5', 'r6', 'r7', 'r8', 'r9', 'r10', 'r11',
@@ -34,69 +53,80 @@ REG_REV_MAP = {
     }
 
 
+def checksum(data):
+    '''Computes the checksum of a packet's data.'''
+    return sum(data) & 0xFF
+
+
+def escape(data):
+    '''Escapes binary data for transmission to gdb.'''
+    return ESCAPE_RE.sub(lambda m: bytes((0x7D, m.group()[0] ^ 0x20)), data)
+
+
+def unescape(data):
+    '''Undoes the escaping of binary data received from gdb.'''
+    if b'}' not in data:
+        return data
+    return UNESCAPE_RE.sub(lambda m: bytes((m.group(1)[0] ^ 0x20,)), data)
+
+
 class ConnectionClosedException(Exception):
     def __init__(self):
         super().__init__('Connection closed')
 
 
 class GDBConnection:
+    '''
+    Packet framing for a single gdb client connected through asyncio streams.
+    '''
     WAIT_DOLLAR = 1
     WAIT_SHARP  = 2
     WAIT_CHECK0 = 3
     WAIT_CHECK1 = 4
 
-    def __init__(self, server, sock, verbose):
-        self.server  = server
-        self.sock    = sock
+    def __init__(self, reader, writer, verbose):
+        self.reader  = reader
+        self.writer  = writer
         self.verbose = verbose
         self.data    = b''
 
-    def sendall(self, data):
+    async def sendall(self, data):
         if self.verbose:
             print("Sending: '%s'" % data)
-        self.sock.sendall(data)
-
-    def recv(self, n, timeout=None):
-        self.sock.settimeout(timeout)
+        self.writer.write(data)
+        await self.writer.drain()
 
-        try:
-            data = self.sock.recv(n)
-        except socket.timeout:
-            return None
-        finally:
-            self.sock.settimeout(None)
+    async def recv(self, n):
+        data = await self.reader.read(n)
+        if not data:
+            raise ConnectionClosedException()
 
         if self.verbose:
             print("Received: '%s'" % data)
         return data
 
-    def send_ack(self):
-        self.sendall(b'+')
+    async def send_ack(self):
+        await self.sendall(b'+')
 
-    def send_nack(self):
-        self.sendall(b'-')
+    async def send_nack(self):
+        await self.sendall(b'-')
 
-    def send_packet(self, data):
-        csum   = (sum(ord(bytes([c])) for c in data) & 0xFF)
-        packet = b'$%s#%02x' % (data, csum)
-        self.sendall(packet)
+    async def send_packet(self, data):
+        packet = b'$%s#%02x' % (data, checksum(data))
+        await self.sendall(packet)
         while True:
-            char = self.recv(1)
-            if not char:
-                raise ConnectionClosedException()
+            char = await self.recv(1)
             if char == b'-':
-                self.sendall(packet)
+                await self.sendall(packet)
             elif char == b'+':
                 return
 
-    def recv_packet(self):
+    async def recv_packet(self):
         pkt   = b''
         state = GDBConnection.WAIT_DOLLAR
         while True:
             if not self.data:
-                self.data = self.recv(1024)
-                if not self.data:
-                    raise ConnectionClosedException()
+                self.data = await self.recv(PACKET_SIZE)
 
             if state == GDBConnection.WAIT_DOLLAR:
                 if self.data[0:1] == b'\x03':
@@ -111,52 +141,71 @@ class GDBConnection:
                 if delim:
                     state = GDBConnection.WAIT_CHECK0
             elif state == GDBConnection.WAIT_CHECK0:
-                checksum   = (int(self.data[0:1], 16) << 4)
-                self.data  = self.data[1:]
-                state = GDBConnection.WAIT_CHECK1
+                expected_csum  = (int(self.data[0:1], 16) << 4)
+                self.data      = self.data[1:]
+                state          = GDBConnection.WAIT_CHECK1
             elif state == GDBConnection.WAIT_CHECK1:
-                checksum  |= (int(self.data[0:1], 16) << 0)
-                self.data  = self.data[1:]
-                state = GDBConnection.WAIT_DOLLAR
+                expected_csum |= (int(self.data[0:1], 16) << 0)
+                self.data      = self.data[1:]
+                state          = GDBConnection.WAIT_DOLLAR
 
                 while b'$' in pkt:
                     _, _, pkt = pkt.partition(b'$')
 
-                csum = (sum(ord(bytes([c])) for c in pkt) & 0xFF)
-                if csum == checksum:
-                    self.send_ack()
+                csum = checksum(pkt)
+                if csum == expected_csum:
+                    await self.send_ack()
                     return pkt
 
-                self.send_nack()
+                await self.send_nack()
                 if self.verbose:
                     print("Discarding (expected %02X): '%s'" % (csum, pkt))
-                pkt = ''
+                pkt = b''
 
-    def poll_break(self, timeout):
+    async def poll_break(self, timeout):
+        '''
+        Waits up to timeout seconds for gdb to send a BREAK request.  Returns
+        True if one arrived or False if the timeout expired.
+        '''
         assert not self.data
-        t0 = time.time()
-        data = self.recv(1, timeout=timeout)
-        if data is None:
-            print('Receive timed out after %.3f seconds' % (time.time() - t0))
+        try:
+            data = await asyncio.wait_for(self.recv(1), timeout)
+        except asyncio.TimeoutError:
             return False
-        if data == b'':
-            raise ConnectionClosedException()
 
         assert data == b'\x03'
         return True
 
 
 class GDBServer:
+    '''
+    A gdb server for a single CPU, listening on its own TCP port.  All
+    servers run on one asyncio event loop.  Probe operations are blocking, so
+    they are executed on the probe's executor, which must have a single
+    worker thread so that operations on the probe are serialized; servers for
+    different CPUs behind the same probe share the same executor, while
+    servers behind different probes can run concurrently.
+
+    While the CPU is running, the server checks whether it has halted every
+    poll_interval seconds while waiting for a BREAK request from gdb.  Only
+    one gdb client is served at a time; other clients wait for it to
+    disconnect.
+    '''
     STATE_HALTED  = 1
     STATE_RUNNING = 2
 
-    def __init__(self, target, port, verbose, halted, cpu):
+    def __init__(self, target, port, verbose, halted, cpu, executor,
+                 poll_interval=POLL_INTERVAL):
         self.handlers = {
                 b'g'    : self._handle_read_registers,
                 b'?'    : self._handle_question,
                 b'G'    : self._handle_write_registers,
                 b'm'    : self._handle_read_memory,
                 b'M'    : self._handle_write_memory,
+                b'x'    : self._handle_read_memory_binary,
+                b'X'    : self._handle_write_memory_binary,
+                b'q'    : self._handle_query,
+                b'v'    : self._handle_v,
                 b'c'    : self._handle_continue,
                 b's'    : self._handle_step_instruction,
                 b'Z'    : self._handle_insert_breakpoint,
@@ -166,34 +215,44 @@ class GDBServer:
         self.port          = port
         self.verbose       = verbose
         self.cpu           = cpu
+        self.executor      = executor
+        self.poll_interval = poll_interval
         self.state         = self.STATE_HALTED if halted else self.STATE_RUNNING
-        self.thread        = threading.Thread(target=self._workloop)
-        self.thread.daemon = True
-        self.thread.start()
+        self.memory_map    = None
+        self.flash_dv      = []
+        self.lock          = asyncio.Lock()
+        self.server        = None
 
-    def _workloop(self):
-        listener = socket.socket()
-        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        listener.bind(('', self.port))
-        listener.listen(5)
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_client,
+                                                 port=self.port,
+                                                 reuse_address=True)
 
-        while True:
-            sock, remote = listener.accept()
-            print('Accepted connection from %s' % (remote,))
+    async def _call(self, f, *args):
+        '''
+        Invokes a blocking function on the probe's executor.
+        '''
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, f, *args)
+
+    async def _handle_client(self, reader, writer):
+        async with self.lock:
+            remote = writer.get_extra_info('peername')
+            print('Accepted connection from %s on port %u'
+                  % (remote, self.port))
             try:
-                self._process_connection(sock)
+                await self._process_connection(reader, writer)
             except ConnectionClosedException:
                 print('Connection closed.')
-            except psdb.probes.xds110.XDS110CommandException as e:
-                print('XDS110 Exception: %s' % e)
-                sock.shutdown(socket.SHUT_RDWR)
+            except psdb.ProbeException as e:
+                print('Probe Exception: %s' % e)
             finally:
-                sock.close()
+                writer.close()
 
     def _halt(self):
         assert self.state == self.STATE_RUNNING
 
-        self.target.halt()
+        self.target.halt(cpus=[self.cpu])
         print('CPU halted. PC: 0x%08X' % self.cpu.read_core_register('pc'))
         self.state = self.STATE_HALTED
 
@@ -201,7 +260,7 @@ class GDBServer:
         assert self.state == self.STATE_HALTED
 
         print('CPU started.')
-        self.target.resume()
+        self.target.resume(cpus=[self.cpu])
         self.state = self.STATE_RUNNING
 
     def _single_step(self):
@@ -211,38 +270,52 @@ class GDBServer:
         self.cpu.single_step()
         print('CPU halted. PC: 0x%08X' % self.cpu.read_core_register('pc'))
 
-    def _process_connection(self, sock):
+    def _check_halted(self):
+        '''
+        Returns True if the CPU has halted itself, for instance by hitting a
+        breakpoint.
+        '''
+        if not self.cpu.is_halted():
+            return False
+
+        print('CPU halted itself. PC: 0x%08X'
+              % self.cpu.read_core_register('pc'))
+        self.state = self.STATE_HALTED
+        return True
+
+    async def _process_connection(self, reader, writer):
         if self.state == self.STATE_RUNNING:
-            self._halt()
+            await self._call(self._halt)
 
-        gc = GDBConnection(self, sock, self.verbose)
+        self.flash_dv = []
+        gc = GDBConnection(reader, writer, self.verbose)
         while True:
             if self.state == self.STATE_HALTED:
-                self._process_connection_halted(gc)
+                await self._process_connection_halted(gc)
             elif self.state == self.STATE_RUNNING:
-                self._process_connection_running(gc)
+                await self._process_connection_running(gc)
             else:
                 raise Exception('Weird state %u' % self.state)
 
-    def _process_connection_halted(self, gc):
-        pkt = gc.recv_packet()
-        rsp = self.handlers.get(pkt[0:1], self._handle_unimplemented)(pkt)
+    async def _process_connection_halted(self, gc):
+        pkt     = await gc.recv_packet()
+        handler = self.handlers.get(pkt[0:1], self._handle_unimplemented)
+        try:
+            rsp = await self._call(handler, pkt)
+        except Exception as e:
+            print("Exception handling '%s': %r" % (pkt[:32], e))
+            rsp = b'E01'
         if rsp is not None:
-            gc.send_packet(rsp)
+            await gc.send_packet(rsp)
 
-    def _process_connection_running(self, gc):
-        if gc.poll_break(timeout=0.1):
+    async def _process_connection_running(self, gc):
+        if await gc.poll_break(timeout=self.poll_interval):
             print('Received BREAK request from gdb.')
-            self._halt()
-        elif not self.cpu.is_halted():
-            time.sleep(0.01)
+            await self._call(self._halt)
+        elif not await self._call(self._check_halted):
             return
-        else:
-            print('CPU halted itself. PC: 0x%08X'
-                  % self.cpu.read_core_register('pc'))
-            self.state = self.STATE_HALTED
 
-        gc.send_packet(b'S05')
+        await gc.send_packet(b'S05')
 
     def _handle_unimplemented(self, _pkt):
         return b''
@@ -270,9 +343,69 @@ class GDBServer:
     def _handle_write_registers(self, _pkt):
         return b''
 
-    def _handle_read_memory(self, pkt):
+    def _handle_query(self, pkt):
+        if pkt.startswith(b'qSupported'):
+            return (b'PacketSize=%x;qXfer:memory-map:read+;binary-upload+' %
+                    PACKET_SIZE)
+        if pkt.startswith(b'qXfer:memory-map:read::'):
+            return self._handle_read_memory_map(pkt)
+        return b''
+
+    def _make_memory_map(self):
         '''
-        Reads a block of memory.
+        Builds the memory map XML from the target's flash and RAM devices.
+        gdb treats addresses outside the memory map as inaccessible, so the
+        gaps between the flash regions are filled with RAM regions in order
+        to still allow access to peripherals and other memory.
+        '''
+        regions = []
+        for d in self.target.devs.values():
+            if isinstance(d, psdb.devices.Flash):
+                regions.append((d.mem_base, d.flash_size, d.sector_size))
+        for d in self.target.ram_devs.values():
+            if not any(a < d.dev_base + d.size and d.dev_base < a + n
+                       for a, n, _ in regions):
+                regions.append((d.dev_base, d.size, None))
+
+        xml  = MEMORY_MAP_HEADER
+        addr = 0
+        for base, size, sector_size in sorted(regions):
+            if addr < base:
+                xml += (b'  <memory type="ram" start="0x%X" length="0x%X"/>\n'
+                        % (addr, base - addr))
+            if sector_size is None:
+                xml += (b'  <memory type="ram" start="0x%X" length="0x%X"/>\n'
+                        % (base, size))
+            else:
+                xml += (b'  <memory type="flash" start="0x%X" length="0x%X">\n'
+                        b'    <property name="blocksize">0x%X</property>\n'
+                        b'  </memory>\n' % (base, size, sector_size))
+            addr = base + size
+        if addr < 0x100000000:
+            xml += (b'  <memory type="ram" start="0x%X" length="0x%X"/>\n'
+                    % (addr, 0x100000000 - addr))
+        return xml + b'</memory-map>\n'
+
+    def _handle_read_memory_map(self, pkt):
+        '''
+        Returns a chunk of the memory map XML:
+
+            qXfer:memory-map:read::offset,length
+        '''
+        if self.memory_map is None:
+            self.memory_map = self._make_memory_map()
+
+        args   = pkt[23:].split(b',')
+        offset = int(args[0], 16)
+        length = int(args[1], 16)
+        chunk  = self.memory_map[offset:offset + length]
+        more   = offset + length < len(self.memory_map)
+        return (b'm' if more else b'l') + escape(chunk)
+
+    def _read_memory(self, pkt):
+        '''
+        Parses an m or x packet and reads the requested memory, returning None
+        on failure.
         '''
         args = pkt[1:].split(b',')
         addr = int(args[0], 16)
@@ -280,19 +413,44 @@ class GDBServer:
 
         if (addr & 0xEFFFFF00) == 0xEFFFFF00:
             print('Failing evil read to 0x%08X' % addr)
-            return b''
+            return None
 
         print('Reading %u bytes from 0x%08X' % (n, addr))
         try:
-            mem = self.cpu.read_bulk(addr, n)
-            return b''.join(b'%02x' % ord(bytes([b])) for b in mem)
+            return self.cpu.read_bulk(addr, n)
         except Exception as e:
             print('Read threw exception. %s' % e)
+            return None
+
+    def _handle_read_memory(self, pkt):
+        '''
+        Reads a block of memory, returning it hex-encoded.
+        '''
+        mem = self._read_memory(pkt)
+        if mem is None:
             return b''
+        return bytes(mem).hex().encode()
+
+    def _handle_read_memory_binary(self, pkt):
+        '''
+        Reads a block of memory, returning it as escaped binary data.
+        '''
+        mem = self._read_memory(pkt)
+        if mem is None:
+            return b'E01'
+        return b'b' + escape(bytes(mem))
+
+    def _write_memory(self, addr, data):
+        try:
+            self.cpu.write_bulk(data, addr)
+            return b'OK'
+        except Exception:
+            print('Write threw exception.')
+        return b'E01'
 
     def _handle_write_memory(self, pkt):
         '''
-        Writes a block of memory.
+        Writes a block of hex-encoded memory.
         '''
         args  = pkt[1:].split(b',')
         addr  = int(args[0], 16)
@@ -300,17 +458,69 @@ class GDBServer:
         size  = int(args[0], 16)
         chars = args[1]
         assert len(chars) == size*2
-        data = b''
-        for i in range(size):
-            v = int(chars[2*i:2*i+2], 16)
-            data += bytes([v])
+        return self._write_memory(addr, bytes.fromhex(chars.decode()))
 
-        try:
-            self.cpu.write_bulk(data, addr)
+    def _handle_write_memory_binary(self, pkt):
+        '''
+        Writes a block of escaped binary memory.  gdb probes for support by
+        sending an X packet with a length of 0.
+        '''
+        hdr, _, data = pkt[1:].partition(b':')
+        args = hdr.split(b',')
+        addr = int(args[0], 16)
+        size = int(args[1], 16)
+        data = unescape(data)
+        if len(data) != size:
+            return b'E01'
+        if not size:
             return b'OK'
-        except Exception:
-            print('Write threw exception.')
-        return b'E01'
+        return self._write_memory(addr, data)
+
+    def _handle_v(self, pkt):
+        if pkt.startswith(b'vFlashErase:'):
+            return self._handle_flash_erase(pkt)
+        if pkt.startswith(b'vFlashWrite:'):
+            return self._handle_flash_write(pkt)
+        if pkt.startswith(b'vFlashDone'):
+            return self._handle_flash_done(pkt)
+        return b''
+
+    def _handle_flash_erase(self, pkt):
+        '''
+        Records a region that gdb wants erased.  Nothing happens until
+        vFlashDone; the region is filled with 0xFF in the data vector so that
+        any part of it not covered by a vFlashWrite ends up erased.
+        '''
+        args   = pkt[12:].split(b',')
+        addr   = int(args[0], 16)
+        length = int(args[1], 16)
+        print('Flash erase request for 0x%08X, %u bytes' % (addr, length))
+        self.flash_dv.append((addr, b'\xff'*length))
+        return b'OK'
+
+    def _handle_flash_write(self, pkt):
+        '''
+        Accumulates escaped binary data that gdb wants written to flash.
+        '''
+        addr, _, data = pkt[12:].partition(b':')
+        self.flash_dv.append((int(addr, 16), unescape(data)))
+        return b'OK'
+
+    def _handle_flash_done(self, _pkt):
+        '''
+        Burns the accumulated data vector to flash, skipping sectors that
+        already hold the right contents, and then resets the target.
+        '''
+        dv, self.flash_dv = self.flash_dv, []
+        try:
+            dv = self.target.flash.prune_dv(dv)
+            self.target.flash.burn_dv(dv, verbose=True, diff=True)
+        except Exception as e:
+            print('Flash burn threw exception. %s' % e)
+            return b'E01'
+        self.target.reset_halt()
+        print('Flash completed successfully.')
+        return b'OK'
 
     def _handle_continue(self, _pkt):
         '''
@@ -391,37 +601,84 @@ class GDBServer:
         return b'OK'
 
 
-def main(rv):
-    if rv.dump:
-        psdb.probes.dump_probes()
-        return
-
-    probe = psdb.probes.make_one_ns(rv)
+def open_probes(rv):
+    '''
+    Returns the list of probes to serve: every probe matching the filters if
+    --all-probes was specified, otherwise the single matching probe.
+    '''
+    if not rv.all_probes:
+        return [psdb.probes.make_one_ns(rv)]
+
+    keys = {k : v for k, v in vars(rv).items()
+            if k in ('serial_num', 'usb_path') and v is not None}
+    enumerations = psdb.probes.find(**keys)
+    if not enumerations:
+        raise psdb.ProbeException('No probe found.')
+
+    probes = []
+    for e in enumerations:
+        p = e.make_probe()
+        p.max_tck_freq = rv.max_tck_freq
+        probes.append(p)
+    return probes
+
+
+def make_servers(rv, probe, port):
+    '''
+    Probes the target behind the probe and returns a GDBServer for each of
+    the requested CPUs, on consecutive ports starting at the specified one.
+    '''
     probe.set_tck_freq(rv.probe_freq)
 
     if rv.srst:
         probe.srst_target()
 
-    print('Starting server on port %s for %s' % (rv.port, probe))
     target = probe.probe(verbose=rv.verbose,
                          connect_under_reset=rv.connect_under_reset)
     probe.set_max_target_tck_freq()
 
-    c = target.cpus[rv.cpu]
-    if c.bpu is not None:
-        c.bpu.reset()
-        print('CPU%u: %s' % (rv.cpu, c.bpu))
-    if 'DWT' in c.devs:
-        print('CPU%u: %s' % (rv.cpu, c.devs['DWT']))
+    indices = range(len(target.cpus)) if rv.cpu is None else [rv.cpu]
+    cpus    = [target.cpus[i] for i in indices]
+    for i, c in zip(indices, cpus):
+        if c.bpu is not None:
+            c.bpu.reset()
+            print('CPU%u: %s' % (i, c.bpu))
+        if 'DWT' in c.devs:
+            print('CPU%u: %s' % (i, c.devs['DWT']))
 
     if not rv.halt:
-        target.resume()
+        target.resume(cpus=cpus)
     else:
-        print('CPU halted. PC: 0x%08X' % c.read_core_register('pc'))
-    GDBServer(target, rv.port, rv.verbose, rv.halt, c)
+        for i, c in zip(indices, cpus):
+            print('CPU%u halted. PC: 0x%08X' % (i, c.read_core_register('pc')))
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    servers  = []
+    for i, c in zip(indices, cpus):
+        print('Starting server on port %u for %s CPU%u on %s'
+              % (port, target, i, probe))
+        servers.append(GDBServer(target, port, rv.verbose, rv.halt, c,
+                                 executor, poll_interval=rv.poll_interval))
+        port += 1
+    return servers
+
+
+async def serve(servers):
+    for s in servers:
+        await s.start()
+    await asyncio.gather(*[s.server.serve_forever() for s in servers])
+
+
+def main(rv):
+    if rv.dump:
+        psdb.probes.dump_probes()
+        return
+
+    servers = []
+    for probe in open_probes(rv):
+        servers += make_servers(rv, probe, rv.port + len(servers))
 
-    while True:
-        time.sleep(1)
+    asyncio.run(serve(servers))
 
 
 def _main():
@@ -436,7 +693,9 @@ def _main():
     parser.add_argument('--connect-under-reset', action='store_true')
     parser.add_argument('--srst', action='store_true')
     parser.add_argument('--halt', action='store_true')
-    parser.add_argument('--cpu', type=int, default=0)
+    parser.add_argument('--cpu', type=int)
+    parser.add_argument('--all-probes', action='store_true')
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL)
     main(parser.parse_args())
 
 
@@ -1,6 +1,7 @@
 # Copyright (c) 2020 Phase Advanced Sensor Systems, Inc.
-from .hexfile import HEXFile
+from .hexfile import HEXFile, write_hex
 
 
 __all__ = ['HEXFile',
+           'write_hex',
            ]
@@ -9,64 +9,130 @@ class InvalidFormatException(HEXFileException):
     pass
 
 
+# Maximum number of data bytes in a record written by write_hex().
+RECORD_SIZE = 16
+
+
 class HEXFile:
+    '''
+    Parses an Intel HEX file, given either a path or an open text file
+    object.  The file is processed a line at a time, so large images are
+    never held in memory as text, and runs of data records that follow each
+    other in both the file and the address space are merged into a single
+    contiguous entry in flash_dv as they are parsed.
+    '''
     def __init__(self, path):
-        self.path     = path
         self.flash_dv = []
 
-        with open(self.path, 'r', encoding='utf8') as f:
-            self._parse(f)
+        if hasattr(path, 'read'):
+            self.path = getattr(path, 'name', '<stream>')
+            self._parse(path)
+        else:
+            self.path = path
+            with open(self.path, 'r', encoding='utf8') as f:
+                self._parse(f)
 
     def _raise_inval_format(self, i, err):
         raise InvalidFormatException('%s:%u: %s' % (self.path, i, err))
 
-    def _parse(self, f):
-        base_address = 0
+    def _parse_records(self, f):
+        '''
+        Generates (line_number, record_type, offset, data) tuples for every
+        record in the file, validating the framing and checksum.
+        '''
+        i = 0
         try:
-            lines = f.readlines()
+            for i, l in enumerate(f, start=1):
+                l = l.strip()
+                if not l:
+                    continue
+                if l[0] != ':':
+                    self._raise_inval_format(i, 'Expected ":".')
+                if len(l) < 11:
+                    self._raise_inval_format(i, 'Line too short.')
+                if len(l) % 2 == 0:
+                    self._raise_inval_format(i, 'Odd record length.')
+                try:
+                    record = bytes.fromhex(l[1:])
+                except ValueError:
+                    self._raise_inval_format(i, 'Invalid hex digits.')
+                if sum(record) & 0xFF:
+                    self._raise_inval_format(i, 'Invalid checksum.')
+                if record[0] != len(record) - 5:
+                    self._raise_inval_format(i, 'Invalid byte count.')
+
+                yield (i, record[3], (record[1] << 8) | record[2],
+                       record[4:-1])
         except UnicodeDecodeError:
-            self._raise_inval_format(0, 'Non-UTF8 characters.')
-        for i, l in enumerate(lines):
-            l = l.strip()
-            if l[0] != ':':
-                self._raise_inval_format(i, 'Expected ":".')
-            if len(l) < 11:
-                self._raise_inval_format(i, 'Line too short.')
-            l = l[1:]
-            if len(l) % 2:
-                self._raise_inval_format(i, 'Odd record length.')
-            record_hex  = [int(l[i:i+2], 16) for i in range(0, len(l), 2)]
-            byte_count  = record_hex[0]
-            offset      = (record_hex[1] << 8) | record_hex[2]
-            record_type = record_hex[3]
-            data        = bytes(record_hex[4:-1])
-            if sum(record_hex) & 0xFF:
-                self._raise_inval_format(i, 'Invalid checksum.')
+            self._raise_inval_format(i + 1, 'Non-UTF8 characters.')
 
+    def _parse(self, f):
+        base_address = 0
+        seg_addr     = None
+        seg_data     = bytearray()
+        for i, record_type, offset, data in self._parse_records(f):
             if record_type == 0x00:
-                self.flash_dv.append((base_address + offset, data))
+                addr = base_address + offset
+                if seg_addr is not None and addr == seg_addr + len(seg_data):
+                    seg_data += data
+                    continue
+                if seg_data:
+                    self.flash_dv.append((seg_addr, bytes(seg_data)))
+                seg_addr = addr
+                seg_data = bytearray(data)
             elif record_type == 0x01:
                 break
             elif record_type == 0x02:
-                if byte_count != 2:
+                if len(data) != 2:
                     self._raise_inval_format(i, 'Invalid type 2 record.')
                 base_address = ((data[0] << 8) | data[1])*16
             elif record_type == 0x03:
-                if byte_count != 4:
+                if len(data) != 4:
                     self._raise_inval_format(i, 'Invalid type 3 record.')
                 self.ss_cs = ((data[0] << 8) | data[1])
                 self.ss_ip = ((data[2] << 8) | data[3])
             elif record_type == 0x04:
-                if byte_count != 2:
+                if len(data) != 2:
                     self._raise_inval_format(i, 'Invalid type 4 record.')
                 base_address = ((data[0] << 24) | (data[1] << 16))
             elif record_type == 0x05:
-                if byte_count != 4:
+                if len(data) != 4:
                     self._raise_inval_format(i, 'Invalid type 5 record.')
-                self.sla_eip = ((data[0] << 24) |
-                                (data[1] << 16) |
-                                (data[2] <<  8) |
-                                (data[3] <<  0))
+                self.sla_eip = int.from_bytes(data, 'big')
             else:
                 self._raise_inval_format(i, 'Unrecognied type %u record.'
                                          % record_type)
+
+        if seg_data:
+            self.flash_dv.append((seg_addr, bytes(seg_data)))
+
+
+def _record(record_type, offset, data):
+    record = bytes((len(data), offset >> 8, offset & 0xFF, record_type)) + data
+    return ':%s%02X\n' % (record.hex().upper(), -sum(record) & 0xFF)
+
+
+def write_hex(f, dv, sla_eip=None, record_size=RECORD_SIZE):
+    '''
+    Writes a list of (address, data) tuples to a text file object in Intel
+    HEX format using 32-bit linear addressing.  If sla_eip is specified, a
+    start linear address record is included.
+    '''
+    upper = 0
+    for addr, data in dv:
+        data = memoryview(data)
+        pos  = 0
+        while pos < len(data):
+            a = addr + pos
+            if (a >> 16) != upper:
+                upper = a >> 16
+                f.write(_record(0x04, 0, upper.to_bytes(2, 'big')))
+
+            # Records may not cross a 64K boundary.
+            n = min(record_size, len(data) - pos, 0x10000 - (a & 0xFFFF))
+            f.write(_record(0x00, a & 0xFFFF, bytes(data[pos:pos + n])))
+            pos += n
+
+    if sla_eip is not None:
+        f.write(_record(0x05, 0, sla_eip.to_bytes(4, 'big')))
+    f.write(_record(0x01, 0, b''))
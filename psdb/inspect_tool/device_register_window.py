@@ -60,20 +60,14 @@ class DeviceRegisterWindow:
         self.decode_win.window.hide()
 
     def update_reg_vals(self):
-        cmd_list = []
-        for i, r in enumerate(self.dev.regs):
-            if i == self.selection and self.edit_val is not None:
-                continue
-            if r.flags & Reg.READABLE and not r.flags & Reg.SIDE_EFFECTS:
-                cmd_list.append(r.read_cmd(self.dev))
-
-        read_vals = self.dev.ap.db.exec_cmd_list(cmd_list)
-
+        snap = self.inspect_tool.target.snapshot_registers([self.dev])
         for i, r in enumerate(self.dev.regs):
             if i == self.selection and self.edit_val is not None:
                 self.reg_vals[i] = self.edit_val
             elif r.flags & Reg.READABLE and not r.flags & Reg.SIDE_EFFECTS:
-                self.reg_vals[i] = read_vals.pop(0)
+                # None (shown as -SideFx-) if the register aliases one with
+                # read side effects and so wasn't captured.
+                self.reg_vals[i] = snap.get(self.dev.name, r.name)
 
     def draw_item(self, i):
         rows = self.window.content.height
@@ -2,6 +2,7 @@
 from . import xds110
 from . import stlink
 from . import xtswd
+from . import sim
 from .probe import Enumeration, Probe
 
 
@@ -9,6 +10,7 @@ PROBE_CLASSES = [
     stlink,
     xds110,
     xtswd,
+    sim,
 ]
 
 PROBE_KEYS = [
@@ -1,10 +1,23 @@
 # Copyright (c) 2018-2019 Phase Advanced Sensor Systems, Inc.
+import atexit
+import json
+import os
+import sys
 import time
 from builtins import range
 from struct import pack, unpack
 
 import psdb
 import psdb.targets
+from psdb.component import topology
+from . import tck_calibration
+from . import xact_stats
+
+
+# AP IDRs are read in batches of this many APs, and the AP scan stops once
+# this many consecutive APs have turned out to be empty.
+AP_SCAN_BATCH     = 8
+AP_SCAN_MAX_EMPTY = 8
 
 
 class Enumeration:
@@ -46,6 +59,10 @@ class Probe:
         self.cpus         = []
         self.target       = None
         self.max_tck_freq = None
+        self.tck_cal      = None
+        self.xact_stats   = xact_stats.from_env()
+        if self.xact_stats is not None:
+            atexit.register(self._dump_xact_stats_at_exit)
 
     @staticmethod
     def find():
@@ -79,11 +96,64 @@ class Probe:
     def deassert_srst(self):
         raise NotImplementedError
 
+    def get_fw_version(self):
+        '''
+        Returns a string identifying the probe firmware version, or None if
+        the probe doesn't have one.
+        '''
+        return None
+
+    def get_tck_freqs(self):
+        '''
+        Returns the list of TCK frequencies, in Hz, that calibration should
+        try.  Probes that can only generate specific frequencies should
+        override this to list them.
+        '''
+        return tck_calibration.DEFAULT_FREQS
+
+    def get_tck_calibration(self):
+        '''
+        Returns the calibration recorded by psdb_calibrate_tool for this probe
+        and the target it has probed, or None if there isn't one.  See
+        tck_calibration.load().
+        '''
+        if self.target is None:
+            return None
+        if self.tck_cal is None or self.tck_cal[0] is not self.target:
+            self.tck_cal = (self.target, tck_calibration.load(self))
+        return self.tck_cal[1]
+
+    def forget_tck_calibration(self):
+        '''
+        Discards the in-memory copy of the calibration so that it is reloaded
+        from the cache the next time it is needed.
+        '''
+        self.tck_cal = None
+
     def set_max_target_tck_freq(self):
+        '''
+        Sets the fastest TCK frequency for general use with the target: the
+        calibrated frequency if the board has been calibrated, otherwise the
+        target's maximum.
+        '''
+        cal = self.get_tck_calibration()
+        if cal:
+            return self.set_tck_freq(cal['read_freq'])
         return self.set_tck_freq(self.target.max_tck_freq)
 
-    def set_max_burn_tck_freq(self, _flash):
-        return self.set_max_target_tck_freq()
+    def set_max_burn_tck_freq(self, flash):
+        '''
+        Sets the fastest TCK frequency for writing to flash directly over SWD:
+        the calibrated burn frequency if the board has been calibrated with
+        flash programming, otherwise the probe's default for the flash.
+        '''
+        cal = self.get_tck_calibration()
+        if cal and cal.get('burn_freq'):
+            return self.set_tck_freq(cal['burn_freq'])
+        return self._set_default_burn_tck_freq(flash)
+
+    def _set_default_burn_tck_freq(self, _flash):
+        return self.set_tck_freq(self.target.max_tck_freq)
 
     def set_tck_freq(self, freq_hz):
         if self.max_tck_freq is not None:
@@ -96,8 +166,53 @@ class Probe:
     def get_stats(self):
         '''
         Return accumulated stats since the last time get_stats was invoked.
+        If transaction instrumentation is enabled, these are the host-side
+        transaction statistics.
+        '''
+        return self._take_xact_stats() or Stats()
+
+    def enable_xact_stats(self, attribute=True):
+        '''
+        Starts recording host-side transaction statistics, discarding any
+        that were already being recorded.  See xact_stats.XactStats.
+        '''
+        self.xact_stats = xact_stats.XactStats(attribute=attribute)
+
+    def disable_xact_stats(self):
+        '''
+        Stops recording transaction statistics and returns the XactStats
+        object that was recording them, or None if they weren't enabled.
+        '''
+        stats, self.xact_stats = self.xact_stats, None
+        return stats
+
+    def _take_xact_stats(self):
+        '''
+        Returns the transaction statistics recorded so far, if enabled, and
+        starts recording afresh.
         '''
-        return Stats()
+        stats = self.xact_stats
+        if stats is not None:
+            self.xact_stats = xact_stats.XactStats(attribute=stats.attribute)
+        return stats
+
+    def _dump_xact_stats_at_exit(self):
+        '''
+        Reports the statistics enabled through the PSDB_XACT_STATS
+        environment variable: to stderr, or as JSON if the variable names a
+        .json file.
+        '''
+        stats = self.xact_stats
+        if stats is None:
+            return
+
+        path = os.environ.get('PSDB_XACT_STATS', '')
+        if path.endswith('.json'):
+            with open(path, 'w') as f:
+                json.dump(stats.to_dict(), f, indent=1)
+        else:
+            print('%s transaction statistics:' % self, file=sys.stderr)
+            stats.dump(f=sys.stderr)
 
     def open_ap(self, ap_num):
         raise NotImplementedError
@@ -138,41 +253,82 @@ class Probe:
     def write_8(self, v, addr, ap_num=0):
         self._bulk_write_8(pack('<B', v), addr, ap_num=ap_num)
 
-    def read_bulk(self, addr, size, ap_num=0):
+    @staticmethod
+    def _bulk_spans(addr, size):
         '''
-        Do a bulk read operation from the specified address.  If the start or
-        end addresses are not word-aligned then multiple transactions will take
-        place.  If the address range crosses a 1K page boundary, multiple
-        transactions will take place to handle the TAR auto-increment issue.
+        Splits the specified address range into a list of transfers that can
+        each be performed with a single _bulk_read/_bulk_write operation.  The
+        unaligned head and tail of the range are transferred as bytes and the
+        aligned middle is transferred as 32-bit words in chunks that don't
+        cross a 1K page boundary, to handle the TAR auto-increment issue.
+        Each transfer is returned as a tuple of the form:
 
-        Note: this helper relies on the probe implementing _bulk_read_8() and
-        _bulk_read_32() methods.  The probe should override this method if it
-        needs to do a different type of offload.
-        '''
-        # Handle empty transfers.
-        if not size:
-            return bytes(b'')
+            (addr, offset, n, word_size)
 
-        mem = bytearray()
+        where offset is the position of the transfer relative to the start of
+        the range and n is the number of words of size word_size.
+        '''
+        spans  = []
+        offset = 0
 
         # Align us to a 32-bit boundary.
         count = min(size, -addr & 3)
         if count:
-            mem  += self._bulk_read_8(addr, count, ap_num)
-            addr += count
-            size -= count
+            spans.append((addr, offset, count, 1))
+            addr   += count
+            offset += count
+            size   -= count
 
         # Do 32-bit aligned transfers that don't cross TAR boundaries.
         while size >= 4:
             count = min(size, 0x400 - (addr & 0x3FF)) // 4
-            mem  += self._bulk_read_32(addr, count, ap_num)
-            addr += count * 4
-            size -= count * 4
+            spans.append((addr, offset, count, 4))
+            addr   += count * 4
+            offset += count * 4
+            size   -= count * 4
 
         # Do any remaining bytes.
         if size:
-            mem += self._bulk_read_8(addr, size, ap_num)
+            spans.append((addr, offset, size, 1))
+
+        return spans
+
+    def read_bulk_into(self, addr, buf, ap_num=0):
+        '''
+        Do a bulk read operation from the specified address, filling the
+        caller-supplied writable buffer (for instance a bytearray or a
+        memoryview slice of one) in place.  The number of bytes read is the
+        length of the buffer.  The same transaction-splitting rules as
+        read_bulk() apply.
 
+        Note: this helper relies on the probe implementing _bulk_read_8() and
+        _bulk_read_32() methods.  The probe should override this method if it
+        can place transfer results directly into the buffer.
+        '''
+        mv = memoryview(buf).cast('B')
+        for span_addr, offset, n, word_size in self._bulk_spans(addr, len(mv)):
+            if word_size == 4:
+                data = self._bulk_read_32(span_addr, n, ap_num)
+            else:
+                data = self._bulk_read_8(span_addr, n, ap_num)
+            mv[offset:offset + n*word_size] = data
+
+    def read_bulk(self, addr, size, ap_num=0):
+        '''
+        Do a bulk read operation from the specified address.  If the start or
+        end addresses are not word-aligned then multiple transactions will take
+        place.  If the address range crosses a 1K page boundary, multiple
+        transactions will take place to handle the TAR auto-increment issue.
+
+        This allocates a new bytearray and fills it using read_bulk_into(),
+        so probes only need to override the latter.
+        '''
+        # Handle empty transfers.
+        if not size:
+            return bytes(b'')
+
+        mem = bytearray(size)
+        self.read_bulk_into(addr, mem, ap_num)
         return mem
 
     def write_bulk(self, data, addr, ap_num=0):
@@ -186,24 +342,12 @@ class Probe:
             return
 
         mv = memoryview(data)
-
-        # Align us to a 32-bit boundary.
-        count = min(len(mv), -addr & 3)
-        if count:
-            self._bulk_write_8(mv[:count], addr, ap_num)
-            addr += count
-            mv    = mv[count:]
-
-        # Do 32-bit aligned transfers that don't cross TAR boundaries.
-        while len(mv) >= 4:
-            count = min(len(mv), 0x400 - (addr & 0x3FF)) // 4
-            self._bulk_write_32(mv[:count * 4], addr, ap_num)
-            addr += count * 4
-            mv    = mv[count * 4:]
-
-        # Do any remaining bytes.
-        if mv:
-            self._bulk_write_8(mv, addr, ap_num)
+        for span_addr, offset, n, word_size in self._bulk_spans(addr, len(mv)):
+            chunk = mv[offset:offset + n * word_size]
+            if word_size == 4:
+                self._bulk_write_32(chunk, span_addr, ap_num)
+            else:
+                self._bulk_write_8(chunk, span_addr, ap_num)
 
     def exec_cmd_list(self, cmd_list):
         read_vals = []
@@ -226,24 +370,101 @@ class Probe:
         for c in self.cpus:
             c.halt()
 
-    def _probe_dp_v1(self, verbose=False):
-        '''Probe all 256 APs for a non-zero IDR.'''
-        self.aps = {}
-        for ap_num in range(256):
+    def read_targetid(self):
+        '''
+        Reads the DPv2 TARGETID register, returning None if it can't be read.
+        This must be invoked before any AP accesses since it clobbers SELECT.
+        Probes that can access banked DP registers directly should override
+        this.
+        '''
+        try:
+            self.write_dp_reg(0x08, 0x00000002)
+            targetid = self.read_dp_reg(0x04)
+            self.write_dp_reg(0x08, 0x00000000)
+        except Exception:
+            return None
+        return targetid
+
+    def read_ap_idrs(self, ap_nums):
+        '''
+        Returns a list of the IDR values for each of the specified APs, with
+        None for any AP that couldn't be opened or read.  Probes that can
+        batch AP register reads into fewer USB round-trips should override
+        this.
+        '''
+        idrs = []
+        for ap_num in ap_nums:
             try:
                 self.open_ap(ap_num)
+                idrs.append(self.read_ap_reg(ap_num, 0xFC))
             except Exception:
-                continue
+                idrs.append(None)
+        return idrs
 
-            ap = psdb.access_port.probe_ap(self, ap_num, verbose=verbose)
-            if ap:
-                self.aps[ap_num] = ap
+    def _scan_aps(self, ap_nums, verbose=False, max_empty=AP_SCAN_MAX_EMPTY):
+        '''
+        Reads the IDRs of the specified APs in batches of AP_SCAN_BATCH and
+        instantiates the ones that are present.  If max_empty is not None, the
+        scan stops once that many consecutive APs have turned out to be empty;
+        APs are populated from APSEL 0 upwards in practice, so there is no
+        point in reading the IDRs of all 256 of them.
+        '''
+        self.aps = {}
+        ap_nums  = list(ap_nums)
+        nempty   = 0
+        for pos in range(0, len(ap_nums), AP_SCAN_BATCH):
+            batch = ap_nums[pos:pos + AP_SCAN_BATCH]
+            for ap_num, idr in zip(batch, self.read_ap_idrs(batch)):
+                if not idr:
+                    nempty += 1
+                    continue
+
+                nempty = 0
+                ap     = psdb.access_port.probe_ap(self, ap_num,
+                                                   verbose=verbose, idr=idr)
+                if ap:
+                    self.aps[ap_num] = ap
+
+            if max_empty is not None and nempty >= max_empty:
+                break
+
+    def _probe_dp_v1(self, verbose=False):
+        '''Scan APs upwards from 0 until we hit a run of empty ones.'''
+        self._scan_aps(range(256), verbose=verbose)
 
     def _probe_dp_v2(self, verbose=False):
-        '''Just probe as though it were a v1 DP for now.'''
-        self._probe_dp_v1(verbose=verbose)
+        '''
+        A v2 DP has a TARGETID register identifying the part; if a known target
+        declares that TARGETID then only the APs it declares are probed.
+        Otherwise, fall back to scanning as though it were a v1 DP.
+        '''
+        targetid = self.read_targetid()
+        ap_nums  = None
+        if targetid is not None:
+            ap_nums = psdb.targets.known_ap_nums(targetid)
+            if verbose:
+                print('  TARGETID 0x%08X' % targetid)
+        if ap_nums:
+            self._scan_aps(sorted(ap_nums), verbose=verbose, max_empty=None)
+        else:
+            self._probe_dp_v1(verbose=verbose)
+
+    def _probe_aps(self, dpidr, verbose=False, ap_nums=None):
+        if ap_nums is not None:
+            self._scan_aps(sorted(ap_nums), verbose=verbose, max_empty=None)
+            return
+
+        dpver = ((dpidr & 0x0000F000) >> 12)
+        if dpver == 1:
+            self._probe_dp_v1(verbose=verbose)
+        elif dpver == 2:
+            self._probe_dp_v2(verbose=verbose)
+        else:
+            raise psdb.ProbeException('Unsupported DP version %u (0x%08X)' % (
+                                      dpver, dpidr))
 
-    def probe(self, verbose=False, connect_under_reset=False):
+    def probe(self, verbose=False, connect_under_reset=False, use_cache=True,
+              ap_nums=None):
         '''
         First discovers which APs are attached to the debug probe and then
         performs component topology detection on each AP.  Finally, we attempt
@@ -259,6 +480,16 @@ class Probe:
         configured, SRST will be released and the MCU will then end up halted
         right in the reset vector and we return.
 
+        If use_cache is True, the AP scan and component topology walk are
+        skipped if a topology previously recorded for this DP is still valid;
+        see psdb.component.topology.  The cache is stored in the directory
+        named by psdb.util.cache.cache_dir().
+
+        If ap_nums is not None, only the APs it lists are probed instead of
+        scanning for them, and the topology cache is neither used nor
+        updated; this is useful if the caller already knows what target is
+        attached.
+
         If connect_under_reset is False, the SRST line will be deasserted (in
         case it had been previously asserted - we assume that the MCU does not
         support probing under SRST) and then component probing will take place
@@ -272,21 +503,43 @@ class Probe:
 
         dpidr = self.connect()
 
-        dpver = ((dpidr & 0x0000F000) >> 12)
-        if dpver == 1:
-            self._probe_dp_v1(verbose=verbose)
-        elif dpver == 2:
-            self._probe_dp_v2(verbose=verbose)
+        # Only consider cached topologies recorded with the same set of APs as
+        # the most recent one; if its APs don't match then do a full scan.  An
+        # explicit list of APs bypasses the cache entirely.
+        topo       = None
+        candidates = []
+        if use_cache and ap_nums is None:
+            candidates = topology.load(dpidr)
+        if candidates and candidates[0].open_aps(self, verbose=verbose):
+            candidates = [t for t in candidates if t.aps == candidates[0].aps]
         else:
-            raise psdb.ProbeException('Unsupported DP version %u (0x%08X)' % (
-                                      dpver, dpidr))
+            candidates = []
+            self._probe_aps(dpidr, verbose=verbose, ap_nums=ap_nums)
 
         psdb.targets.pre_probe(self, verbose)
 
+        if candidates:
+            fingerprint = topology.read_fingerprint(self)
+            for t in candidates:
+                if t.fingerprint == fingerprint:
+                    topo = t
+                    break
+
+            # The APs matched but the components behind them didn't; only
+            # the cached APs have been opened, so do a full scan.
+            if not topo:
+                self._probe_aps(dpidr, verbose=verbose)
+                psdb.targets.pre_probe(self, verbose)
+
         self.cpus = []
-        for _, ap in self.aps.items():
-            if hasattr(ap, 'probe_components'):
-                ap.base_component = ap.probe_components(verbose=verbose)
+        if topo:
+            if verbose:
+                print('  Using cached topology for %s' % topo.target)
+            topo.replay(self, verbose=verbose)
+        else:
+            for _, ap in self.aps.items():
+                if hasattr(ap, 'probe_components'):
+                    ap.base_component = ap.probe_components(verbose=verbose)
 
         if connect_under_reset:
             for c in self.cpus:
@@ -305,7 +558,18 @@ class Probe:
             self.halt()
 
         self.target = psdb.targets.probe(self)
+        if topo and repr(self.target) != topo.target:
+            # The cached topology matched the fingerprint but didn't produce
+            # the same target; throw it away and do it the slow way.
+            topology.discard(topo)
+            self.probe(verbose=verbose,
+                       connect_under_reset=connect_under_reset,
+                       use_cache=False, ap_nums=ap_nums)
+            topology.save(topology.Topology.record(self, dpidr))
+            return self.target
         assert self.target
+        if use_cache and ap_nums is None and not topo:
+            topology.save(topology.Topology.record(self, dpidr))
 
         if verbose:
             print('  Identified target %s' % self.target)
@@ -0,0 +1,21 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import psdb
+from .model import SimException, SimFaultException
+from .sim import SimProbe
+
+
+__all__ = ['SimException',
+           'SimFaultException',
+           ]
+
+
+def find(**kwargs):
+    return psdb.probes.find(cls=SimProbe, **kwargs)
+
+
+def make_one(**kwargs):
+    return psdb.probes.make_one(cls=SimProbe, **kwargs)
+
+
+def make_one_ns(ns):
+    return psdb.probes.make_one_ns(ns, cls=SimProbe)
@@ -0,0 +1,619 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import bisect
+import time
+
+import psdb
+from psdb.devices import flash_loader
+from psdb.devices.stm32 import crc
+from psdb.util import crc32_stm32
+
+
+MASKS = {1 : 0x000000FF,
+         2 : 0x0000FFFF,
+         4 : 0xFFFFFFFF,
+         }
+
+# DHCSR bits.
+C_DEBUGEN   = (1 << 0)
+C_HALT      = (1 << 1)
+C_STEP      = (1 << 2)
+C_MASKINTS  = (1 << 3)
+S_REGRDY    = (1 << 16)
+S_HALT      = (1 << 17)
+S_RETIRE_ST = (1 << 24)
+S_RESET_ST  = (1 << 25)
+DHCSR_KEY   = 0xA05F
+
+# DFSR bits.
+DFSR_HALTED = (1 << 0)
+DFSR_BKPT   = (1 << 1)
+DFSR_VCATCH = (1 << 3)
+
+# DEMCR bits.
+VC_CORERESET = (1 << 0)
+
+# AIRCR fields.
+AIRCR_VECTKEY     = 0x05FA
+AIRCR_VECTRESET   = (1 << 0)
+AIRCR_SYSRESETREQ = (1 << 2)
+
+# Core register selectors.
+REG_R0   = 0
+REG_SP   = 13
+REG_PC   = 15
+REG_XPSR = 16
+
+# DWT_PCSR reads as this when the core is halted.
+PCSR_INVALID = 0xFFFFFFFF
+
+
+class SimException(psdb.ProbeException):
+    pass
+
+
+class SimFaultException(SimException):
+    '''
+    Raised when a simulated access hits an address that nothing responds to,
+    which a real probe reports as an SWD FAULT.
+    '''
+    def __init__(self, addr):
+        super().__init__('Simulated bus fault at 0x%08X' % addr)
+        self.addr = addr
+
+
+class Region:
+    '''
+    Base class for a range of the simulated address space.  Accesses are
+    single transfers of 1, 2 or 4 bytes; read_block() and write_block() move
+    a run of n transfers of the same size and may be overridden by regions
+    that can do so more efficiently than one transfer at a time.
+    '''
+    def __init__(self, base, size):
+        self.base = base
+        self.size = size
+
+    def read(self, addr, size):
+        raise SimFaultException(addr)
+
+    def write(self, addr, v, size):
+        raise SimFaultException(addr)
+
+    def read_block(self, addr, n, size):
+        return b''.join(self.read(addr + i*size, size).to_bytes(size, 'little')
+                        for i in range(n))
+
+    def write_block(self, addr, data, size):
+        for i in range(0, len(data), size):
+            self.write(addr + i, int.from_bytes(data[i:i + size], 'little'),
+                       size)
+
+    def reset(self):
+        pass
+
+
+class RAM(Region):
+    '''
+    Byte-addressable memory.  A buffer can be passed in so that aliased
+    regions share their storage.
+    '''
+    def __init__(self, base, size, buf=None):
+        super().__init__(base, size)
+        self.buf = memoryview(buf if buf is not None else bytearray(size))
+        assert len(self.buf) == size
+
+    def read(self, addr, size):
+        o = addr - self.base
+        return int.from_bytes(self.buf[o:o + size], 'little')
+
+    def write(self, addr, v, size):
+        o = addr - self.base
+        self.buf[o:o + size] = v.to_bytes(size, 'little')
+
+    def read_block(self, addr, n, size):
+        o = addr - self.base
+        return bytes(self.buf[o:o + n*size])
+
+    def write_block(self, addr, data, size):
+        o = addr - self.base
+        self.buf[o:o + len(data)] = data
+
+
+class ROM(RAM):
+    '''
+    Read-only memory; writes are silently ignored.
+    '''
+    def write(self, addr, v, size):
+        pass
+
+    def write_block(self, addr, data, size):
+        pass
+
+
+class Registers(Region):
+    '''
+    A block of 32-bit registers.  Registers that have never been written read
+    as their reset value, or 0.  Narrow accesses read or update the addressed
+    byte lanes of the containing register.  If cidr and pidr are given, the
+    CoreSight component ID registers at the top of the 4K block are
+    populated accordingly; they and any offsets listed in readonly ignore
+    writes.  Subclasses model side effects by overriding read_reg() and
+    write_reg().
+    '''
+    def __init__(self, base, size, reset_values=None, readonly=(), cidr=None,
+                 pidr=None):
+        super().__init__(base, size)
+        self.reset_values = dict(reset_values or {})
+        self.readonly     = set(readonly)
+        if cidr is not None:
+            for i in range(4):
+                self.reset_values[0xFD0 + 4*i] = (pidr >> (32 + 8*i)) & 0xFF
+                self.reset_values[0xFE0 + 4*i] = (pidr >> 8*i) & 0xFF
+                self.reset_values[0xFF0 + 4*i] = (cidr >> 8*i) & 0xFF
+            self.readonly.update(range(0xFD0, 0x1000, 4))
+        self.regs = dict(self.reset_values)
+
+    def reset(self):
+        self.regs = dict(self.reset_values)
+
+    def read_reg(self, offset):
+        return self.regs.get(offset, 0)
+
+    def write_reg(self, offset, v):
+        if offset not in self.readonly:
+            self.regs[offset] = v
+
+    def read(self, addr, size):
+        offset = addr - self.base
+        shift  = (offset & 3) * 8
+        return (self.read_reg(offset & ~3) >> shift) & MASKS[size]
+
+    def write(self, addr, v, size):
+        offset = addr - self.base
+        if size != 4:
+            shift = (offset & 3) * 8
+            mask  = MASKS[size] << shift
+            v     = ((self.regs.get(offset & ~3, 0) & ~mask) |
+                     ((v << shift) & mask))
+        self.write_reg(offset & ~3, v)
+
+
+class ROMTable(Registers):
+    '''
+    A CoreSight ROM table listing the specified entries.
+    '''
+    def __init__(self, base, entries, cidr, pidr):
+        values = {4*i : e for i, e in enumerate(entries)}
+        super().__init__(base, 0x1000, values, values.keys(), cidr, pidr)
+
+
+class Bus:
+    '''
+    The address space seen through a MEM-AP: a sorted list of
+    non-overlapping regions.  Accesses that don't fall entirely within a
+    region fault.
+    '''
+    def __init__(self):
+        self.bases   = []
+        self.regions = []
+
+    def add(self, region):
+        i = bisect.bisect(self.bases, region.base)
+        prev = self.regions[i - 1] if i else None
+        assert prev is None or prev.base + prev.size <= region.base
+        assert (i == len(self.bases) or
+                region.base + region.size <= self.bases[i])
+        self.bases.insert(i, region.base)
+        self.regions.insert(i, region)
+        return region
+
+    def find(self, addr, size):
+        i = bisect.bisect(self.bases, addr) - 1
+        if i >= 0:
+            r = self.regions[i]
+            if addr + size <= r.base + r.size:
+                return r
+        raise SimFaultException(addr)
+
+    def read(self, addr, size):
+        return self.find(addr, size).read(addr, size)
+
+    def write(self, addr, v, size):
+        self.find(addr, size).write(addr, v, size)
+
+    def read_block(self, addr, n, size):
+        data = bytearray()
+        while n:
+            r      = self.find(addr, size)
+            count  = min(n, (r.base + r.size - addr) // size)
+            data  += r.read_block(addr, count, size)
+            addr  += count * size
+            n     -= count
+        return data
+
+    def write_block(self, addr, data, size):
+        mv = memoryview(data)
+        while len(mv):
+            r     = self.find(addr, size)
+            count = min(len(mv) // size, (r.base + r.size - addr) // size)
+            r.write_block(addr, mv[:count * size], size)
+            addr += count * size
+            mv    = mv[count * size:]
+
+
+class MemAP:
+    '''
+    A MEM-AP in front of a Bus.  CSW supports 8-, 16- and 32-bit transfers
+    with or without single auto-increment.  As on real hardware, TAR only
+    auto-increments within a 1K page: a run of DRW transfers that reaches
+    the end of a page wraps around to the start of the same page.
+    '''
+    CSW_WRITEABLE = 0xFF00FF37
+
+    def __init__(self, ap_num, idr, base, csw_reset, bus):
+        self.ap_num    = ap_num
+        self.idr       = idr
+        self.base      = base
+        self.csw_reset = csw_reset
+        self.bus       = bus
+        self.csw       = csw_reset
+        self.tar       = 0
+
+    def _size(self):
+        return 1 << (self.csw & 0x7)
+
+    def _increment(self, nbytes):
+        if self.csw & 0x30:
+            self.tar = (self.tar & ~0x3FF) | ((self.tar + nbytes) & 0x3FF)
+
+    def read_reg(self, addr):
+        if addr == 0x00:
+            return self.csw
+        if addr == 0x04:
+            return self.tar
+        if addr == 0x0C:
+            size  = self._size()
+            v     = self.bus.read(self.tar, size)
+            shift = (self.tar & 3) * 8
+            self._increment(size)
+            return v << shift
+        if 0x10 <= addr <= 0x1C:
+            return self.bus.read((self.tar & ~0xF) | (addr & 0xC), 4)
+        if addr == 0xF8:
+            return self.base
+        if addr == 0xFC:
+            return self.idr
+        return 0
+
+    def write_reg(self, addr, v):
+        if addr == 0x00:
+            csw = (self.csw & ~self.CSW_WRITEABLE) | (v & self.CSW_WRITEABLE)
+            if (csw & 0x7) > 2:
+                csw = (csw & ~0x7) | (self.csw & 0x7)
+            self.csw = csw
+        elif addr == 0x04:
+            self.tar = v
+        elif addr == 0x0C:
+            size  = self._size()
+            shift = (self.tar & 3) * 8
+            self.bus.write(self.tar, (v >> shift) & MASKS[size], size)
+            self._increment(size)
+        elif 0x10 <= addr <= 0x1C:
+            self.bus.write((self.tar & ~0xF) | (addr & 0xC), v, 4)
+
+    def _runs(self, addr, nbytes):
+        '''
+        Splits a run of auto-incrementing transfers into the contiguous
+        address ranges it actually touches.
+        '''
+        page = addr & ~0x3FF
+        while nbytes:
+            count   = min(nbytes, page + 0x400 - addr)
+            yield addr, count
+            nbytes -= count
+            addr    = page
+
+    def read_block(self, addr, n, size):
+        '''
+        Performs n auto-incrementing DRW reads of the specified size starting
+        at addr, as a probe's bulk read command does.
+        '''
+        self.csw = (self.csw & ~0x37) | {1 : 0, 2 : 1, 4 : 2}[size] | 0x10
+        data     = bytearray()
+        for a, count in self._runs(addr, n * size):
+            data += self.bus.read_block(a, count // size, size)
+        self.tar = addr
+        self._increment(n * size)
+        return data
+
+    def write_block(self, addr, data, size):
+        '''
+        Performs auto-incrementing DRW writes of the data starting at addr.
+        '''
+        self.csw = (self.csw & ~0x37) | {1 : 0, 2 : 1, 4 : 2}[size] | 0x10
+        mv       = memoryview(data)
+        pos      = 0
+        for a, count in self._runs(addr, len(mv)):
+            self.bus.write_block(a, mv[pos:pos + count], size)
+            pos += count
+        self.tar = addr
+        self._increment(len(mv))
+
+
+class LoaderStub:
+    '''
+    Behavioral stand-in for psdb.devices.flash_loader.STUB.  It follows the
+    same descriptor protocol, programs each buffer through the bus one
+    programming unit at a time and, like the real stub, only hands a buffer
+    back once the flash controller's status register no longer reports busy.
+    '''
+    def __init__(self, cpu, ctrl):
+        self.cpu        = cpu
+        self.ctrl       = ctrl
+        self.desc       = 0
+        self.programmed = False
+
+    def step(self):
+        bus = self.cpu.bus
+        sr_addr, busy_mask, error_mask, unit = (
+            bus.read(self.ctrl + 4*i, 4) for i in range(4))
+        while True:
+            desc_addr = self.ctrl + flash_loader.DESC_OFFSETS[self.desc]
+            if self.programmed:
+                sr = bus.read(sr_addr, 4)
+                if sr & busy_mask:
+                    return
+                if sr & error_mask:
+                    self._fail(sr)
+                    return
+                bus.write(desc_addr, 0, 4)
+                self.programmed = False
+                self.desc      ^= 1
+                continue
+
+            n = bus.read(desc_addr, 4)
+            if n == 0:
+                return
+            if n == flash_loader.EXIT_MARKER:
+                self.cpu.breakpoint()
+                return
+
+            faddr = bus.read(desc_addr + 4, 4)
+            raddr = bus.read(desc_addr + 8, 4)
+            for pos in range(0, n, unit):
+                bus.write_block(faddr + pos,
+                                bus.read_block(raddr + pos, unit // 4, 4), 4)
+                sr = bus.read(sr_addr, 4)
+                if sr & error_mask:
+                    self._fail(sr)
+                    return
+            self.programmed = True
+
+    def _fail(self, sr):
+        self.cpu.bus.write(self.ctrl + flash_loader.MAILBOX_OFFSET, sr, 4)
+        self.cpu.breakpoint()
+
+
+class CRCStub:
+    '''
+    Behavioral stand-in for psdb.devices.stm32.crc.STUB, which feeds a region
+    of memory through the CRC peripheral and posts the result.
+    '''
+    def __init__(self, cpu, ctrl):
+        self.cpu  = cpu
+        self.ctrl = ctrl
+
+    def step(self):
+        bus    = self.cpu.bus
+        addr   = bus.read(self.ctrl + 4, 4)
+        length = bus.read(self.ctrl + 8, 4)
+        bus.write(self.ctrl + 12,
+                  crc32_stm32(bus.read_block(addr, length // 4, 4)), 4)
+        self.cpu.breakpoint()
+
+
+# Code the simulated CPU knows how to run, keyed by the bytes found at the PC
+# when it is resumed.  Anything else is treated as firmware that runs until
+# the debugger halts it.
+STUBS = [(flash_loader.STUB, LoaderStub),
+         (crc.STUB,          CRCStub),
+         ]
+
+
+class CortexM(Registers):
+    '''
+    The System Control Space of a Cortex-M CPU and the state of the core it
+    controls.  The debug registers behave as the v7-M architecture requires:
+    DHCSR writes need the debug key, halting and core register transfers
+    complete immediately, vector catch on reset is honored and AIRCR can
+    request a system reset.  The core doesn't execute instructions; when it
+    is resumed at one of the known stubs, a behavioral model of that stub
+    runs instead, and otherwise the core is considered to be running
+    firmware until it is halted again.
+    '''
+    def __init__(self, soc, bus, base, cpuid, cidr, pidr, vtor):
+        super().__init__(base, 0x1000, {0xD00 : cpuid, 0xD0C : 0xFA050000},
+                         (0xD00,), cidr, pidr)
+        self.soc       = soc
+        self.bus       = bus
+        self.vtor      = vtor
+        self.core_regs = {}
+        self.halted    = False
+        self.in_reset  = False
+        self.reset_st  = True
+        self.program   = None
+        self.dhcsr     = 0
+
+    def reset(self):
+        '''
+        Resets the core, which fetches its initial SP and PC from the vector
+        table and halts immediately if vector catch is enabled.  The debug
+        registers are not affected.
+        '''
+        debug          = {o : self.regs[o] for o in (0xDF8, 0xDFC)
+                          if o in self.regs}
+        super().reset()
+        self.regs.update(debug)
+        self.core_regs = {REG_SP   : self.bus.read(self.vtor, 4),
+                          REG_PC   : self.bus.read(self.vtor + 4, 4) & ~1,
+                          REG_XPSR : 0x01000000,
+                          }
+        self.reset_st  = True
+        self.program   = None
+        self.halted    = False
+        if self.regs.get(0xDFC, 0) & VC_CORERESET:
+            self._halt(DFSR_VCATCH)
+        elif (self.dhcsr & (C_DEBUGEN | C_HALT)) == (C_DEBUGEN | C_HALT):
+            self._halt(DFSR_HALTED)
+
+    def _halt(self, reason):
+        self.halted       = True
+        self.program      = None
+        self.dhcsr       |= C_HALT
+        self.regs[0xD30]  = self.regs.get(0xD30, 0) | reason
+
+    def breakpoint(self):
+        '''
+        Invoked by a stub model when it executes its BKPT instruction.
+        '''
+        self._halt(DFSR_BKPT)
+
+    def _run(self):
+        self.halted  = False
+        self.program = None
+        pc           = self.core_regs.get(REG_PC, 0) & ~1
+        for code, cls in STUBS:
+            try:
+                if self.bus.read_block(pc, len(code), 1) == code:
+                    self.program = cls(self, self.core_regs.get(REG_R0, 0))
+                    break
+            except SimFaultException:
+                break
+
+    def tick(self):
+        '''
+        Lets a running stub make progress; invoked before every probe
+        transaction.
+        '''
+        if self.program and not self.halted and not self.in_reset:
+            self.program.step()
+
+    def pc_sample(self):
+        if self.halted or self.in_reset:
+            return PCSR_INVALID
+        return self.core_regs.get(REG_PC, 0)
+
+    def read_reg(self, offset):
+        if offset == 0xDF0:
+            v = self.dhcsr | S_REGRDY
+            if self.halted:
+                v |= S_HALT
+            elif not self.in_reset:
+                v |= S_RETIRE_ST
+            if self.reset_st:
+                v |= S_RESET_ST
+                self.reset_st = False
+            return v
+        return super().read_reg(offset)
+
+    def write_reg(self, offset, v):
+        if offset == 0xDF0:
+            if (v >> 16) == DHCSR_KEY:
+                self._write_dhcsr(v & (C_DEBUGEN | C_HALT | C_STEP |
+                                       C_MASKINTS))
+        elif offset == 0xDF4:
+            sel = v & 0x7F
+            if v & (1 << 16):
+                self.core_regs[sel] = self.regs.get(0xDF8, 0)
+            else:
+                self.regs[0xDF8] = self.core_regs.get(sel, 0)
+        elif offset == 0xD0C:
+            if (v >> 16) == AIRCR_VECTKEY:
+                self.regs[0xD0C] = 0xFA050000 | (v & 0x00008700)
+                if v & AIRCR_SYSRESETREQ:
+                    self.soc.system_reset()
+                elif v & AIRCR_VECTRESET:
+                    self.reset()
+        elif offset == 0xD30:
+            self.regs[0xD30] = self.regs.get(0xD30, 0) & ~v
+        else:
+            super().write_reg(offset, v)
+
+    def _write_dhcsr(self, ctrl):
+        self.dhcsr = ctrl
+        if not ctrl & C_DEBUGEN or self.in_reset:
+            return
+        if ctrl & C_HALT:
+            if not self.halted:
+                self._halt(DFSR_HALTED)
+        elif self.halted and not ctrl & C_STEP:
+            self._run()
+
+
+class DWT(Registers):
+    '''
+    Data Watchpoint and Trace unit whose PCSR samples the CPU's PC.
+    '''
+    def __init__(self, base, cpu, ctrl, cidr, pidr):
+        super().__init__(base, 0x1000, {0x000 : ctrl}, (0x01C,), cidr, pidr)
+        self.cpu = cpu
+
+    def read_reg(self, offset):
+        if offset == 0x01C:
+            return self.cpu.pc_sample()
+        return super().read_reg(offset)
+
+
+class SoC:
+    '''
+    Base class for a simulated target.  Subclasses populate the DP
+    identification, the MEM-APs and the buses behind them, the CPU and any
+    peripheral models, and list the regions that a system reset restores.
+    Device timings are multiplied by time_scale, so 0 makes every operation
+    complete instantly while 1 reproduces the data sheet timings.
+    '''
+    DPIDR = None
+
+    def __init__(self, time_scale=1):
+        self.time_scale   = time_scale
+        self.aps          = {}
+        self.cpus         = []
+        self.resettable   = []
+        self.srst         = False
+        self.disconnected = False
+
+    def delay(self, t):
+        '''
+        Returns the time at which an operation starting now and taking t
+        seconds of target time completes.
+        '''
+        return time.monotonic() + t * self.time_scale
+
+    def tick(self):
+        for c in self.cpus:
+            c.tick()
+
+    def system_reset(self):
+        for r in self.resettable:
+            r.reset()
+        for c in self.cpus:
+            c.reset()
+
+    def set_srst(self, asserted):
+        if asserted == self.srst:
+            return
+        self.srst = asserted
+        for c in self.cpus:
+            c.in_reset = asserted
+        if not asserted:
+            self.system_reset()
+
+    def power_on_reset(self):
+        '''
+        Resets everything, including the debug logic, and drops the debug
+        connection, as happens on an option byte reload.
+        '''
+        for c in self.cpus:
+            c.dhcsr = 0
+            c.regs.pop(0xDFC, None)
+        self.system_reset()
+        self.disconnected = True
@@ -0,0 +1,300 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import os
+import time
+
+import psdb
+from .. import probe
+from . import model
+from . import stm32g4
+
+
+# Simulated targets, selected by name.
+MODELS = {'stm32g431' : stm32g4.STM32G431,
+          }
+
+# Round-trip time charged for every probe transaction, in seconds.  The
+# default is one USB 2.0 high-speed microframe.
+DEFAULT_LATENCY = 125e-6
+
+# Default and maximum SWD clock frequencies.
+DEFAULT_TCK_FREQ = 1000000
+MAX_TCK_FREQ     = 24000000
+
+# SWCLK cycles per 32-bit SWD transfer: 8 request bits, turnaround, 3 ACK
+# bits, 32 data bits, parity, turnaround and a couple of idle cycles.
+SWD_CLOCKS_PER_XFER = 48
+
+# Delays shorter than this are busy-waited since sleep() is too coarse.
+SPIN_THRESHOLD = 0.002
+
+# Bytes counted in the transaction statistics for every command sent to the
+# probe and every response received from it, on top of the data payload:
+# the opcode and address arguments going out and a status word coming back.
+# Each scatter/gather read also sends its own address argument.
+CMD_SIZE    = 12
+RSP_SIZE    = 4
+SG_ARG_SIZE = 8
+
+
+class Stats(probe.Stats):
+    def __init__(self, ntransactions, nxfers, elapsed, xact_stats=None):
+        self.ntransactions = ntransactions
+        self.nxfers        = nxfers
+        self.elapsed       = elapsed
+        self.xact_stats    = xact_stats
+
+    def dump(self):
+        print('ntransactions: %u' % self.ntransactions)
+        print('       nxfers: %u' % self.nxfers)
+        print('      elapsed: %.6f' % self.elapsed)
+        if self.xact_stats is not None:
+            self.xact_stats.dump()
+
+
+class Enumeration(probe.Enumeration):
+    def __init__(self, cls, model_name, **kwargs):
+        super().__init__(cls, model_name, **kwargs)
+        self.serial_num = 'SIM-' + model_name.upper()
+        self.usb_path   = 'sim'
+
+    def __repr__(self):
+        return self.cls.NAME + ' ' + self.usb_path + ' ' + self.serial_num
+
+    def _match_kwargs(self, **kwargs):
+        kwargs = super()._match_kwargs(**kwargs)
+        if kwargs.get('serial_num') == self.serial_num:
+            del kwargs['serial_num']
+        if kwargs.get('usb_path') == self.usb_path:
+            del kwargs['usb_path']
+        return kwargs
+
+
+class SimProbe(probe.Probe):
+    '''
+    A debug probe connected to a simulated target instead of USB hardware.
+    The DP, the target's MEM-APs and everything behind them are modelled in
+    software (see psdb.probes.sim.model), so the whole probe, component
+    matching, target and flash driver stack runs unchanged against it.
+
+    Each probe transaction (a DP or AP register access, a bulk transfer or,
+    if max_sg_ops is set, a scatter/gather batch of up to that many reads)
+    costs latency seconds of round-trip time plus the time the SWD transfers
+    themselves take at the current SWCLK frequency, so the relative cost of
+    different access patterns matches a real probe.  Use latency=0 and
+    time_scale=0 for functional tests that should run as fast as possible.
+
+    If max_good_freq is set, every transaction made with SWCLK faster than it
+    fails and drops the connection, as though the wiring to the target
+    couldn't carry the signal; this is useful for exercising TCK calibration.
+
+    The simulator only enumerates when the PSDB_SIM environment variable names
+    a model; PSDB_SIM_LATENCY, PSDB_SIM_SG_OPS and PSDB_SIM_MAX_GOOD_FREQ
+    override the latency, scatter/gather batch size and max_good_freq.
+    '''
+    NAME = 'SIM'
+
+    def __init__(self, model_name, latency=DEFAULT_LATENCY, max_sg_ops=None,
+                 time_scale=1, max_good_freq=None):
+        super().__init__()
+        if model_name not in MODELS:
+            raise psdb.ProbeException('Unknown simulator model "%s".'
+                                      % model_name)
+
+        self.model_name = model_name
+        self.serial_num = 'SIM-' + model_name.upper()
+        self.latency    = latency
+        self.max_sg_ops = max_sg_ops
+        self.max_good   = max_good_freq
+        self.soc        = MODELS[model_name](time_scale=time_scale)
+        self.tck_freq   = DEFAULT_TCK_FREQ
+        self.connected  = False
+        self.select     = 0
+        self.ctrl_stat  = 0
+        self.rdbuff     = 0
+
+        self.ntransactions = 0
+        self.nxfers        = 0
+        self.elapsed       = 0
+
+    def __str__(self):
+        return '%s Debug Probe (%s)' % (self.NAME, self.model_name)
+
+    def _transaction(self, op, nxfers, data_out=0, data_in=0):
+        '''
+        Accounts for one probe transaction of type op made up of the specified
+        number of SWD transfers and carrying data_out bytes of payload to the
+        probe and data_in bytes back, waits for the time it would take on a
+        real probe and lets the target make progress.
+        '''
+        if self.xact_stats is not None:
+            self.xact_stats.call(op, CMD_SIZE + data_out, RSP_SIZE + data_in,
+                                 self._do_transaction, nxfers)
+        else:
+            self._do_transaction(nxfers)
+
+    def _do_transaction(self, nxfers):
+        if not self.connected or self.soc.disconnected:
+            self.connected = False
+            raise model.SimException('Simulated target not connected.')
+        if self.max_good is not None and self.tck_freq > self.max_good:
+            self.connected = False
+            raise model.SimException('Simulated SWD error at %u Hz.'
+                                     % self.tck_freq)
+
+        t = self.latency + nxfers * SWD_CLOCKS_PER_XFER / self.tck_freq
+        self.ntransactions += 1
+        self.nxfers        += nxfers
+        self.elapsed       += t
+        if t >= SPIN_THRESHOLD:
+            time.sleep(t)
+        elif t:
+            deadline = time.perf_counter() + t
+            while time.perf_counter() < deadline:
+                pass
+
+        self.soc.tick()
+
+    def _get_ap(self, ap_num):
+        ap = self.soc.aps.get(ap_num)
+        if ap is None:
+            raise model.SimException('No MEM-AP %u.' % ap_num)
+        return ap
+
+    def connect(self):
+        self.connected         = True
+        self.soc.disconnected  = False
+        self._transaction('CONNECT', 1, data_in=4)
+        self.select    = 0
+        self.ctrl_stat = 0
+        return self.soc.DPIDR
+
+    def assert_srst(self):
+        self.soc.set_srst(True)
+
+    def deassert_srst(self):
+        self.soc.set_srst(False)
+
+    def _set_tck_freq(self, freq_hz):
+        self.tck_freq = min(freq_hz, MAX_TCK_FREQ)
+        return self.tck_freq
+
+    def get_stats(self):
+        stats = Stats(self.ntransactions, self.nxfers, self.elapsed,
+                      xact_stats=self._take_xact_stats())
+        self.ntransactions = 0
+        self.nxfers        = 0
+        self.elapsed       = 0
+        return stats
+
+    def open_ap(self, ap_num):
+        pass
+
+    def read_dp_reg(self, addr):
+        self._transaction('READ_DP', 1, data_in=4)
+        if addr == 0x00:
+            return self.soc.DPIDR
+        if addr == 0x04:
+            # CTRL/STAT: the power-up requests are acknowledged immediately.
+            return self.ctrl_stat | ((self.ctrl_stat & 0x50000000) << 1)
+        if addr == 0x0C:
+            return self.rdbuff
+        return 0
+
+    def write_dp_reg(self, addr, value):
+        self._transaction('WRITE_DP', 1, data_out=4)
+        if addr == 0x04:
+            self.ctrl_stat = value & 0x50000F00
+        elif addr == 0x08:
+            self.select = value
+
+    def read_ap_reg(self, ap_num, addr):
+        self._transaction('READ_AP', 2, data_in=4)
+        ap = self.soc.aps.get(ap_num)
+        self.rdbuff = ap.read_reg(addr) if ap else 0
+        return self.rdbuff
+
+    def write_ap_reg(self, ap_num, addr, value):
+        self._transaction('WRITE_AP', 1, data_out=4)
+        ap = self.soc.aps.get(ap_num)
+        if ap:
+            ap.write_reg(addr, value)
+
+    def _bulk_read(self, addr, n, size, ap_num):
+        self._transaction('BULK_READ', n + 3, data_in=n * size)
+        return self._get_ap(ap_num).read_block(addr, n, size)
+
+    def _bulk_write(self, data, addr, size, ap_num):
+        self._transaction('BULK_WRITE', len(data) // size + 2,
+                          data_out=len(data))
+        self._get_ap(ap_num).write_block(addr, data, size)
+
+    def _bulk_read_8(self, addr, n, ap_num=0):
+        return self._bulk_read(addr, n, 1, ap_num)
+
+    def _bulk_read_16(self, addr, n, ap_num=0):
+        return self._bulk_read(addr, n, 2, ap_num)
+
+    def _bulk_read_32(self, addr, n, ap_num=0):
+        return self._bulk_read(addr, n, 4, ap_num)
+
+    def _bulk_write_8(self, data, addr, ap_num=0):
+        self._bulk_write(data, addr, 1, ap_num)
+
+    def _bulk_write_16(self, data, addr, ap_num=0):
+        self._bulk_write(data, addr, 2, ap_num)
+
+    def _bulk_write_32(self, data, addr, ap_num=0):
+        self._bulk_write(data, addr, 4, ap_num)
+
+    def exec_cmd_list(self, cmd_list):
+        '''
+        If max_sg_ops is set, executes the reads in batches of up to that many
+        per transaction as a scatter/gather-capable probe would; otherwise
+        each read is a separate transaction.
+        '''
+        if not self.max_sg_ops:
+            return super().exec_cmd_list(cmd_list)
+
+        read_vals = []
+        for pos in range(0, len(cmd_list), self.max_sg_ops):
+            batch = cmd_list[pos:pos + self.max_sg_ops]
+            self._transaction('SG_READ', 3 * len(batch),
+                              data_out=SG_ARG_SIZE * len(batch),
+                              data_in=4 * len(batch))
+            for cmd in batch:
+                if not isinstance(cmd, psdb.devices.ReadCommand):
+                    raise Exception('Unrecognized command: %s' % cmd)
+                if cmd.size not in (1, 2, 4):
+                    raise Exception('Illegal size %u in cmd list.' % cmd.size)
+                assert cmd.ap.db == self
+                ap = self._get_ap(cmd.ap.ap_num)
+                read_vals.append(int.from_bytes(ap.read_block(cmd.addr, 1,
+                                                              cmd.size),
+                                                'little'))
+        return read_vals
+
+    @staticmethod
+    def find():
+        model_name = os.environ.get('PSDB_SIM')
+        if not model_name:
+            return []
+
+        kwargs = {}
+        if os.environ.get('PSDB_SIM_LATENCY'):
+            kwargs['latency'] = float(os.environ['PSDB_SIM_LATENCY'])
+        if os.environ.get('PSDB_SIM_SG_OPS'):
+            kwargs['max_sg_ops'] = int(os.environ['PSDB_SIM_SG_OPS'])
+        if os.environ.get('PSDB_SIM_MAX_GOOD_FREQ'):
+            kwargs['max_good_freq'] = int(
+                os.environ['PSDB_SIM_MAX_GOOD_FREQ'])
+        return [Enumeration(SimProbe, model_name, **kwargs)]
+
+    @classmethod
+    def show_info(cls, model_name, **kwargs):
+        print('============= %s %s =============' % (cls.NAME, model_name))
+        print('Serial Number: SIM-%s' % model_name.upper())
+        print('      Latency: %.6f' % kwargs.get('latency', DEFAULT_LATENCY))
+
+    def show_detailed_info(self):
+        self.show_info(self.model_name, latency=self.latency)
+        print('  SG Ops: %s' % self.max_sg_ops)
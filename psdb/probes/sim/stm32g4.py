@@ -0,0 +1,324 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import time
+
+from . import model
+
+
+FLASH_REGS_BASE = 0x40022000
+FLASH_MEM_BASE  = 0x08000000
+OTP_BASE        = 0x1FFF7000
+OTP_LEN         = 1024
+
+# Flash key sequences.
+KEY1    = 0x45670123
+KEY2    = 0xCDEF89AB
+OPTKEY1 = 0x08192A3B
+OPTKEY2 = 0x4C5D6E7F
+
+# FLASH_SR bits.
+SR_EOP     = (1 << 0)
+SR_PROGERR = (1 << 3)
+SR_PGAERR  = (1 << 5)
+SR_SIZERR  = (1 << 6)
+SR_PGSERR  = (1 << 7)
+SR_ERRORS  = 0x0000C3FA
+SR_BSY     = (1 << 16)
+
+# FLASH_CR bits.
+CR_PG         = (1 << 0)
+CR_PER        = (1 << 1)
+CR_MER1       = (1 << 2)
+CR_STRT       = (1 << 16)
+CR_OPTSTRT    = (1 << 17)
+CR_EOPIE      = (1 << 24)
+CR_OBL_LAUNCH = (1 << 27)
+CR_OPTLOCK    = (1 << 30)
+CR_LOCK       = (1 << 31)
+
+# Typical programming times from the STM32G431 data sheet, in seconds.
+T_PROG_DW     = 82e-6
+T_PAGE_ERASE  = 22e-3
+T_MASS_ERASE  = 22e-3
+T_OPT_PROGRAM = 22e-3
+
+# ARM CoreSight identification of the Cortex-M4 components.
+CIDR_ROM   = 0xB105100D
+CIDR_SCS   = 0xB105E00D
+CIDR_TPIU  = 0xB105900D
+PIDR_SCS   = 0x00000004000BB00C
+PIDR_DWT   = 0x00000004003BB002
+PIDR_FPB   = 0x00000004002BB003
+PIDR_ITM   = 0x00000004003BB001
+PIDR_TPIU  = 0x00000004000BB9A1
+
+
+class FlashMemory(model.Region):
+    '''
+    Main flash or OTP area.  Reads come straight from the array; writes are
+    handed to the flash controller, which enforces the programming rules.
+    '''
+    def __init__(self, base, size, ctrl):
+        super().__init__(base, size)
+        self.ctrl = ctrl
+        self.buf  = bytearray(b'\xFF'*size)
+
+    def read(self, addr, size):
+        o = addr - self.base
+        return int.from_bytes(self.buf[o:o + size], 'little')
+
+    def read_block(self, addr, n, size):
+        o = addr - self.base
+        return bytes(self.buf[o:o + n*size])
+
+    def write(self, addr, v, size):
+        self.ctrl.program(self, addr, v, size)
+
+
+class FlashController(model.Registers):
+    '''
+    Behavioral model of the STM32G4 category 2 flash controller as used by
+    psdb.devices.stm32g4.FLASH_2.  CR and OPTR are protected by the key
+    sequences, page and mass erases are started with STRT, and programming
+    takes pairs of 32-bit writes making up an aligned double-word while PG is
+    set.  Every operation keeps SR.BSY set for the data sheet time, during
+    which further programming writes queue up behind it, and sets SR.EOP on
+    completion if CR.EOPIE is set.  Programming errors set the same SR bits
+    as the hardware does and are sticky until cleared by writing 1 to them.
+    '''
+    def __init__(self, soc, base, mem_base, mem_size, page_size, optr):
+        super().__init__(base, 0x400, {0x000 : 0x00000600,
+                                       0x014 : CR_LOCK | CR_OPTLOCK,
+                                       0x020 : optr,
+                                       0x024 : 0x00007FFF,
+                                       0x02C : 0x000000FF,
+                                       0x030 : 0x000000FF,
+                                       })
+        self.soc        = soc
+        self.page_size  = page_size
+        self.mem        = FlashMemory(mem_base, mem_size, self)
+        self.otp        = FlashMemory(OTP_BASE, OTP_LEN, self)
+        self.optr_store = optr
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self.regs[0x020]  = self.optr_store
+        self.key_stage    = 0
+        self.optkey_stage = 0
+        self.locked_out   = False
+        self.busy_until   = 0
+        self.eop_pending  = False
+        self.latch        = None
+
+    def _busy(self):
+        return time.monotonic() < self.busy_until
+
+    def _start(self, t):
+        self.busy_until  = max(time.monotonic(), self.busy_until)
+        self.busy_until += t * self.soc.time_scale
+        self.eop_pending = True
+
+    def _error(self, bits):
+        self.regs[0x010] = self.regs.get(0x010, 0) | bits
+        self.latch       = None
+
+    def read_reg(self, offset):
+        if offset == 0x010:
+            sr = self.regs.get(0x010, 0)
+            if self._busy():
+                return sr | SR_BSY
+            if self.eop_pending:
+                self.eop_pending = False
+                if self.regs[0x014] & CR_EOPIE:
+                    sr = self.regs[0x010] = sr | SR_EOP
+            return sr
+        if offset in (0x008, 0x00C):
+            return 0
+        return super().read_reg(offset)
+
+    def write_reg(self, offset, v):
+        cr = self.regs[0x014]
+        if offset == 0x008:
+            self._write_key(v)
+        elif offset == 0x00C:
+            self._write_optkey(v)
+        elif offset == 0x010:
+            clear            = v & (SR_ERRORS | SR_EOP)
+            self.regs[0x010] = self.regs.get(0x010, 0) & ~clear
+        elif offset == 0x014:
+            if not cr & CR_LOCK:
+                self._write_cr(v)
+        elif offset == 0x020:
+            if not cr & CR_OPTLOCK:
+                self.regs[0x020] = v
+        else:
+            super().write_reg(offset, v)
+
+    def _write_key(self, v):
+        if self.locked_out or not self.regs[0x014] & CR_LOCK:
+            raise model.SimFaultException(self.base + 0x008)
+        if self.key_stage == 0 and v == KEY1:
+            self.key_stage = 1
+        elif self.key_stage == 1 and v == KEY2:
+            self.key_stage = 0
+            self.regs[0x014] &= ~CR_LOCK
+        else:
+            # A wrong key locks the controller until the next reset.
+            self.locked_out = True
+            raise model.SimFaultException(self.base + 0x008)
+
+    def _write_optkey(self, v):
+        cr = self.regs[0x014]
+        if cr & CR_LOCK or not cr & CR_OPTLOCK:
+            raise model.SimFaultException(self.base + 0x00C)
+        if self.optkey_stage == 0 and v == OPTKEY1:
+            self.optkey_stage = 1
+        elif self.optkey_stage == 1 and v == OPTKEY2:
+            self.optkey_stage = 0
+            self.regs[0x014] &= ~CR_OPTLOCK
+        else:
+            self.optkey_stage = 0
+            raise model.SimFaultException(self.base + 0x00C)
+
+    def _write_cr(self, v):
+        # OPTLOCK can only be cleared with the key sequence and the start bits
+        # always read as 0.
+        cr = v | (self.regs[0x014] & CR_OPTLOCK)
+        self.regs[0x014] = cr & ~(CR_STRT | CR_OPTSTRT)
+        if not cr & CR_PG:
+            self.latch = None
+
+        if cr & CR_STRT and not self._busy():
+            if self.regs.get(0x010, 0) & SR_ERRORS:
+                self._error(SR_PGSERR)
+            elif cr & CR_MER1:
+                self.mem.buf[:] = b'\xFF'*len(self.mem.buf)
+                self._start(T_MASS_ERASE)
+            elif cr & CR_PER:
+                page = (cr >> 3) & 0x7F
+                if page * self.page_size >= len(self.mem.buf):
+                    self._error(SR_PGSERR)
+                else:
+                    o = page * self.page_size
+                    self.mem.buf[o:o + self.page_size] = (b'\xFF' *
+                                                          self.page_size)
+                    self._start(T_PAGE_ERASE)
+            else:
+                self._error(SR_PGSERR)
+
+        if cr & CR_OPTSTRT and not cr & CR_OPTLOCK:
+            self.optr_store = self.regs[0x020]
+            self._start(T_OPT_PROGRAM)
+
+        if cr & CR_OBL_LAUNCH and not cr & CR_OPTLOCK:
+            self.soc.power_on_reset()
+
+    def program(self, mem, addr, v, size):
+        '''
+        Handles a write to the flash array.
+        '''
+        cr = self.regs[0x014]
+        if cr & CR_LOCK or not cr & CR_PG:
+            self._error(SR_PGSERR)
+            return
+        if size != 4:
+            self._error(SR_SIZERR | SR_PGSERR)
+            return
+        if self.regs.get(0x010, 0) & SR_ERRORS:
+            self._error(SR_PGSERR)
+            return
+
+        if self.latch is None:
+            if addr % 8:
+                self._error(SR_PGAERR)
+                return
+            self.latch = (mem, addr, v)
+            return
+
+        latch_mem, latch_addr, latch_v = self.latch
+        self.latch = None
+        if latch_mem is not mem or addr != latch_addr + 4:
+            self._error(SR_PGAERR)
+            return
+
+        data = (latch_v | (v << 32)).to_bytes(8, 'little')
+        o    = latch_addr - mem.base
+        if mem.buf[o:o + 8] != b'\xFF'*8 and data != b'\x00'*8:
+            self._error(SR_PROGERR)
+            return
+        mem.buf[o:o + 8] = data
+        self._start(T_PROG_DW)
+
+
+class STM32G431(model.SoC):
+    '''
+    An STM32G431 with 128K of flash (category 2, DEV_ID 0x468) booting from
+    flash.  Its debug topology matches the real part: a single AHB-AP in
+    front of the ST ROM table at 0xE00FF000, which lists the Cortex-M4 SCS,
+    DWT, FPB, ITM and TPIU.  Peripherals other than the flash controller,
+    the SCS and DWT are plain registers without side effects.
+    '''
+    DPIDR      = 0x2BA01477
+    AP_IDR     = 0x24770011
+    MCU_IDCODE = 0x10016468
+    FLASH_SIZE = 128 * 1024
+    OPTR       = 0xFFEFF8AA
+
+    def __init__(self, time_scale=1):
+        super().__init__(time_scale=time_scale)
+        bus = model.Bus()
+        self.aps[0] = model.MemAP(0, self.AP_IDR, 0xE00FF003, 0x03000040, bus)
+
+        # Memories.  The last 10K of SRAM is the CCM SRAM, which is also
+        # mapped at 0x10000000.
+        sram = bytearray(0x8000)
+        bus.add(model.RAM(0x20000000, len(sram), sram))
+        bus.add(model.RAM(0x10000000, 0x2800, memoryview(sram)[0x5800:]))
+        bus.add(model.ROM(0x1FFF0000, 0x7000))
+        info = bytearray(b'\xFF'*0x100)
+        info[0x00:0x04] = (0x00000004).to_bytes(4, 'little')
+        info[0x90:0x9C] = bytes(range(0x30, 0x3C))
+        info[0xE0:0xE4] = (self.FLASH_SIZE // 1024).to_bytes(4, 'little')
+        bus.add(model.ROM(0x1FFF7500, len(info), info))
+
+        # Flash.
+        self.flash = FlashController(self, FLASH_REGS_BASE, FLASH_MEM_BASE,
+                                     self.FLASH_SIZE, 2048, self.OPTR)
+        bus.add(self.flash)
+        bus.add(self.flash.mem)
+        bus.add(self.flash.otp)
+
+        # Peripherals.
+        for base, end in ((0x40000000, 0x40022000),
+                          (0x40022400, 0x40024400),
+                          (0x48000000, 0x48001C00),
+                          (0x50000000, 0x50001800),
+                          (0xA0001000, 0xA0001400)):
+            self.resettable.append(bus.add(model.Registers(base,
+                                                           end - base)))
+        self.resettable.append(self.flash)
+        bus.add(model.Registers(0xE0042000, 0x400, {0x000 : self.MCU_IDCODE},
+                                (0x000,)))
+
+        # Cortex-M4 debug components.
+        cpu = model.CortexM(self, bus, 0xE000E000, 0x410FC241, CIDR_SCS,
+                            PIDR_SCS, FLASH_MEM_BASE)
+        self.cpus.append(cpu)
+        bus.add(cpu)
+        bus.add(model.DWT(0xE0001000, cpu, 0x40000000, CIDR_SCS, PIDR_DWT))
+        bus.add(model.Registers(0xE0002000, 0x1000, {0x000 : 0x00000260},
+                                (), CIDR_SCS, PIDR_FPB))
+        bus.add(model.Registers(0xE0000000, 0x1000, None, (), CIDR_SCS,
+                                PIDR_ITM))
+        bus.add(model.Registers(0xE0040000, 0x1000, {0x000 : 0x0000000B,
+                                                     0x004 : 0x00000001},
+                                (), CIDR_TPIU, PIDR_TPIU))
+        bus.add(model.ROMTable(0xE00FF000,
+                               [0xFFF0F003, 0xFFF02003, 0xFFF03003,
+                                0xFFF01003, 0xFFF41003, 0xFFF42002],
+                               CIDR_ROM, 0x00000000000A0000 |
+                               (self.MCU_IDCODE & 0xFFF)))
+
+        # Start out running whatever is in flash.
+        cpu.reset()
+        cpu.reset_st = False
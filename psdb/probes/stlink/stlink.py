@@ -80,8 +80,23 @@ class STLink(usb_probe.Probe):
     def _exec_cdb(self, cmd, timeout=1000):
         '''
         Executes a CDB by writing it to the TX_EP and then driving the various
-        phases according to the CDB flags.
+        phases according to the CDB flags.  If transaction statistics are
+        enabled, the CDB is recorded under its command class name; its
+        latency includes that of the status-phase CDB, which is also recorded
+        separately.
         '''
+        if self.xact_stats is None:
+            return self._do_exec_cdb(cmd, timeout)
+
+        bytes_out = len(cmd.cdb)
+        if cmd.CMD_FLAGS & cdb.HAS_DATA_OUT_PHASE:
+            bytes_out += len(cmd.data_out)
+        bytes_in = (cmd.RSP_LEN if cmd.CMD_FLAGS & cdb.HAS_DATA_IN_PHASE
+                    else 0)
+        return self.xact_stats.call(type(cmd).__name__, bytes_out, bytes_in,
+                                    self._do_exec_cdb, cmd, timeout)
+
+    def _do_exec_cdb(self, cmd, timeout):
         assert len(cmd.cdb) == 16
         assert self.usb_dev.write(TX_EP, cmd.cdb) == len(cmd.cdb)
 
@@ -103,6 +118,30 @@ class STLink(usb_probe.Probe):
 
         return retval
 
+    def _exec_cdb_into(self, cmd, dst, timeout=1000):
+        '''
+        Executes a bulk-read CDB, copying the data phase directly into the
+        dst buffer rather than decoding it.
+        '''
+        if self.xact_stats is None:
+            return self._do_exec_cdb_into(cmd, dst, timeout)
+
+        return self.xact_stats.call(type(cmd).__name__, len(cmd.cdb),
+                                    cmd.RSP_LEN, self._do_exec_cdb_into, cmd,
+                                    dst, timeout)
+
+    def _do_exec_cdb_into(self, cmd, dst, timeout):
+        assert cmd.CMD_FLAGS & cdb.HAS_DATA_IN_PHASE
+        assert not cmd.CMD_FLAGS & cdb.HAS_EMBEDDED_STATUS
+        assert self.usb_dev.write(TX_EP, cmd.cdb) == len(cmd.cdb)
+
+        rsp = self.usb_dev.read(RX_EP, cmd.RSP_LEN, timeout=timeout)
+        assert len(rsp) == cmd.RSP_LEN
+        dst[:] = memoryview(rsp)[:len(dst)]
+
+        if cmd.CMD_FLAGS & cdb.HAS_STATUS_PHASE:
+            self._check_xfer_status()
+
     def _cmd_allow_retry(self, cmd, retries=10, delay=0.1):
         '''
         Executes the CDB, retrying it if necessary based on the status code.
@@ -115,6 +154,8 @@ class STLink(usb_probe.Probe):
             except errors.STLinkCmdException as e:
                 if e.err not in (errors.SWD_AP_WAIT, errors.SWD_DP_WAIT):
                     raise
+            if self.xact_stats is not None:
+                self.xact_stats.retry(type(cmd).__name__)
             time.sleep(delay)
         raise psdb.ProbeException('Max retries exceeded!')
 
@@ -187,6 +228,26 @@ class STLink(usb_probe.Probe):
         assert n > 0
         return self._exec_cdb(cdb.BulkRead32(addr, n, ap_num))
 
+    def read_bulk_into(self, addr, buf, ap_num=0):
+        '''
+        Bulk read that copies each USB data phase directly into its slice of
+        the buffer.
+        '''
+        mv = memoryview(buf).cast('B')
+        for span_addr, offset, n, word_size in self._bulk_spans(addr, len(mv)):
+            if word_size == 4:
+                self._exec_cdb_into(cdb.BulkRead32(span_addr, n, ap_num),
+                                    mv[offset:offset + n*4])
+                continue
+
+            while n:
+                size = min(n, self.max_rw8)
+                self._exec_cdb_into(cdb.BulkRead8(span_addr, size, ap_num),
+                                    mv[offset:offset + size])
+                span_addr += size
+                offset    += size
+                n         -= size
+
     def _bulk_write_8(self, data, addr, ap_num=0):
         '''
         Writes a consecutive number of bytes to the specified address.
@@ -244,6 +305,18 @@ class STLink(usb_probe.Probe):
         '''Write a 32-bit register in the DP address space. '''
         return self.write_ap_reg(0xFFFF, addr, value)
 
+    def read_targetid(self):
+        '''
+        The firmware handles DPBANKSEL itself, so we don't need to touch
+        SELECT to read TARGETID.
+        '''
+        if not self.features & FEATURE_AP:
+            return None
+        try:
+            return self.read_dp_reg(0x24)
+        except psdb.ProbeException:
+            return None
+
     def read_ap_reg(self, ap_num, addr):
         '''Read a 32-bit register from the AP address space.'''
         assert self.features & FEATURE_AP
@@ -280,6 +353,72 @@ class STLink(usb_probe.Probe):
         self._cmd_allow_retry(cdb.ScatterGatherOut(ops))
         return self._cmd_allow_retry(cdb.ScatterGatherIn(ops))
 
+    def _exec_sg_reads(self, ops, cmds):
+        '''
+        Executes a scatter/gather ops list containing a CMD_READ for each of
+        the ReadCommands in cmds and returns the list of read values.
+        '''
+        read_vals = []
+        for op, err, v in self.scatter_gather(ops):
+            if op != cdb.CMD_READ:
+                continue
+
+            cmd = cmds[len(read_vals)]
+            cdb.check_xfer_status(err, cmd.addr)
+            read_vals.append(v)
+
+        return read_vals
+
+    def exec_cmd_list(self, cmd_list):
+        '''
+        Executes the command list as a series of scatter/gather operations of
+        up to max_sg_ops ops each, if the probe supports them.  Scatter/gather
+        only supports 32-bit reads, so 8- and 16-bit reads are performed
+        individually with accesses of the requested width; the batch pending
+        before each of them is executed first so that the bus accesses happen
+        in command list order.
+        '''
+        if not self.features & FEATURE_SCATTERGATHER or self.max_sg_ops < 2:
+            return super().exec_cmd_list(cmd_list)
+
+        read_vals = []
+        ops       = []
+        cmds      = []
+        ap_num    = None
+        for cmd in cmd_list:
+            if not isinstance(cmd, psdb.devices.ReadCommand):
+                raise Exception('Unrecognized command: %s' % cmd)
+            if cmd.size not in (1, 2, 4):
+                raise Exception('Illegal size %u in cmd list.' % cmd.size)
+            assert cmd.ap.db == self
+            assert cmd.addr % cmd.size == 0
+
+            nops = 1 if cmd.ap.ap_num == ap_num else 2
+            if cmd.size != 4 or len(ops) + nops > self.max_sg_ops:
+                if ops:
+                    read_vals += self._exec_sg_reads(ops, cmds)
+                ops    = []
+                cmds   = []
+                ap_num = None
+
+            if cmd.size == 2:
+                read_vals.append(self.read_16(cmd.addr, cmd.ap.ap_num))
+                continue
+            if cmd.size == 1:
+                read_vals.append(self.read_8(cmd.addr, cmd.ap.ap_num))
+                continue
+
+            if cmd.ap.ap_num != ap_num:
+                ap_num = cmd.ap.ap_num
+                ops.append((cdb.CMD_APNUM, ap_num))
+            ops.append((cdb.CMD_READ, cmd.addr))
+            cmds.append(cmd)
+
+        if ops:
+            read_vals += self._exec_sg_reads(ops, cmds)
+
+        return read_vals
+
     def trace_enable(self, swo_freq_hz, trace_size=4096):
         return self._cmd_allow_retry(cdb.TraceEnable(swo_freq_hz, trace_size))
 
@@ -10,6 +10,20 @@ V2_1_PIDS = [0x374B,
              0x3752,
              ]
 
+# Supported SWD frequencies in Hz and the SWDCLK divisors that select them.
+FREQ_MAP = [(4000000,   0),
+            (1800000,   1),
+            (1200000,   2),
+            ( 950000,   3),
+            ( 480000,   7),
+            ( 240000,  15),
+            ( 125000,  31),
+            ( 100000,  40),
+            (  50000,  79),
+            (  25000, 158),
+            (  15000, 265),
+            (   5000, 798)]
+
 
 class STLinkV2_1(stlink.STLink):
     '''
@@ -67,9 +81,15 @@ class STLinkV2_1(stlink.STLink):
         assert self.ver_jtag >= 22
         self._cmd_allow_retry(cdb.SetSWDCLKDivisor(divisor))
 
-    def set_max_burn_tck_freq(self, flash):
+    def _set_default_burn_tck_freq(self, flash):
         return self.set_tck_freq(flash.max_nowait_write_freq)
 
+    def get_fw_version(self):
+        return 'V%uJ%uS%u' % (self.ver_stlink, self.ver_jtag, self.ver_swim)
+
+    def get_tck_freqs(self):
+        return [f for f, _ in FREQ_MAP]
+
     def _set_tck_freq(self, freq_hz):
         '''
         Sets the TCK to the nearest frequency that doesn't exceed the
@@ -77,19 +97,7 @@ class STLinkV2_1(stlink.STLink):
         '''
         assert self.features & stlink.FEATURE_SWD_SET_FREQ
 
-        freq_map = [(4000000,   0),
-                    (1800000,   1),
-                    (1200000,   2),
-                    ( 950000,   3),
-                    ( 480000,   7),
-                    ( 240000,  15),
-                    ( 125000,  31),
-                    ( 100000,  40),
-                    (  50000,  79),
-                    (  25000, 158),
-                    (  15000, 265),
-                    (   5000, 798)]
-        for f, d in freq_map:
+        for f, d in FREQ_MAP:
             if freq_hz >= f:
                 self._set_swdclk_divisor(d)
                 return f
@@ -105,5 +113,4 @@ class STLinkV2_1(stlink.STLink):
 
     def show_detailed_info(self):
         super().show_info(self.usb_dev)
-        print(' Firmware Ver: V%uJ%uS%u' % (self.ver_stlink, self.ver_jtag,
-                                            self.ver_swim))
+        print(' Firmware Ver: %s' % self.get_fw_version())
@@ -122,7 +122,7 @@ class STLinkV3(stlink.STLink):
                                   'minimum is %u kHz.'
                                   % (freq_khz, self._swd_freqs_khz[-1]))
 
-    def set_max_burn_tck_freq(self, flash):
+    def _set_default_burn_tck_freq(self, flash):
         # We really have to hack it here.  Before J10, the U5 errors out if you
         # try to write faster than 3.3 MHz.  With J10, then U5 errors out if
         # you try to write faster than 8 MHz.  On all the other platforms I've
@@ -132,7 +132,15 @@ class STLinkV3(stlink.STLink):
             return self.set_tck_freq(flash.max_nowait_write_freq)
         if isinstance(self.target, STM32U5):
             return self.set_tck_freq(8000000)
-        return self.set_max_target_tck_freq()
+        return self.set_tck_freq(self.target.max_tck_freq)
+
+    def get_fw_version(self):
+        return 'V%uJ%uM%uB%uS%u' % (self.ver_stlink, self.ver_jtag,
+                                    self.ver_msd, self.ver_bridge,
+                                    self.ver_swim)
+
+    def get_tck_freqs(self):
+        return [f * 1000 for f in self._swd_freqs_khz]
 
     def _set_tck_freq(self, freq_hz):
         '''
@@ -152,6 +160,4 @@ class STLinkV3(stlink.STLink):
 
     def show_detailed_info(self):
         super().show_info(self.usb_dev)
-        print(' Firmware Ver: V%uJ%uM%uB%uS%u' % (
-            self.ver_stlink, self.ver_jtag, self.ver_msd, self.ver_bridge,
-            self.ver_swim))
+        print(' Firmware Ver: %s' % self.get_fw_version())
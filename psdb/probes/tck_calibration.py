@@ -0,0 +1,272 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import random
+import time
+
+import psdb
+import psdb.util.cache
+
+
+CACHE_NAME = 'tck_calibration.json'
+
+# Frequencies tried by probes that don't list the frequencies they support;
+# the probe rounds each one down to one it can generate.
+DEFAULT_FREQS = [1000000, 2000000, 4000000, 6000000, 8000000, 12000000,
+                 16000000, 24000000, 32000000, 48000000]
+
+# Size of the SRAM pattern test and the patterns written.  The random pattern
+# is regenerated for every round.
+PATTERN_SIZE = 4096
+PATTERNS     = [b'\x55\xAA', b'\xFF\x00', b'\x01\x02\x04\x08\x10\x20\x40\x80',
+                b'\xFE\xFD\xFB\xF7\xEF\xDF\xBF\x7F']
+
+EXCLUDE_SRAMS = ['Backup SRAM']
+
+# Granularity in which erased bytes are trimmed from the end of the burn test
+# sector before it is restored; this is a multiple of the programming unit of
+# every supported flash and divides every sector size.
+RESTORE_TRIM = 64
+
+
+class CalibrationException(psdb.ProbeException):
+    pass
+
+
+def target_uid(target):
+    '''
+    Returns a string identifying the individual target chip, or the target
+    type if it doesn't have a unique ID.
+    '''
+    uuid = getattr(target, 'uuid', None)
+    if uuid is not None:
+        return bytes(uuid).hex()
+    return repr(target)
+
+
+def cache_key(db):
+    '''
+    Calibrations are specific to the probe, its firmware and the board it is
+    attached to, since that is what determines signal integrity.
+    '''
+    return '%s:%s:%s:%s' % (db.NAME, getattr(db, 'serial_num', None),
+                            db.get_fw_version(), target_uid(db.target))
+
+
+def load(db):
+    '''
+    Returns the calibration stored for the probe and its current target as a
+    dict with 'read_freq' and (if the burn test was run) 'burn_freq' keys, or
+    None if it hasn't been calibrated.
+    '''
+    cal = psdb.util.cache.load_json(CACHE_NAME)
+    if not isinstance(cal, dict):
+        return None
+    entry = cal.get(cache_key(db))
+    if not isinstance(entry, dict) or not entry.get('read_freq'):
+        return None
+    return entry
+
+
+def save(db, entry):
+    cal = psdb.util.cache.load_json(CACHE_NAME)
+    if not isinstance(cal, dict):
+        cal = {}
+    cal[cache_key(db)] = entry
+    psdb.util.cache.save_json(CACHE_NAME, cal)
+
+
+def forget(db):
+    '''
+    Discards the calibration for the probe and its current target.  Returns
+    True if there was one.
+    '''
+    cal = psdb.util.cache.load_json(CACHE_NAME)
+    if not isinstance(cal, dict) or cal.pop(cache_key(db), None) is None:
+        return False
+    psdb.util.cache.save_json(CACHE_NAME, cal)
+    return True
+
+
+def find_test_ram(target):
+    rds = [rd for rd in target.ram_devs.values()
+           if rd.name not in EXCLUDE_SRAMS]
+    if not rds:
+        raise CalibrationException('No SRAM to test with.')
+    return max(rds, key=lambda rd: rd.size)
+
+
+def check_read_write(db, rd, rng, rounds):
+    '''
+    Performs rounds of pattern writes and read-backs on an SRAM device, plus
+    unaligned 8- and 16-bit transfers and DP register reads, at the current
+    frequency.  Raises an exception if anything fails or reads back wrong.
+    '''
+    dpidr  = db.read_dp_reg(0x00)
+    ap     = rd.ap
+    addr   = rd.dev_base
+    size   = min(PATTERN_SIZE, rd.size)
+    ap_num = ap.ap_num
+    for _ in range(rounds):
+        for p in PATTERNS + [rng.randbytes(8)]:
+            data = (p * (size // len(p) + 1))[:size]
+            ap.write_bulk(data, addr)
+            if ap.read_bulk(addr, size) != data:
+                raise CalibrationException('Pattern mismatch.')
+
+        data = rng.randbytes(62)
+        db._bulk_write_8(data[:31], addr + 1, ap_num=ap_num)
+        db._bulk_write_16(data[32:], addr + 34, ap_num=ap_num)
+        if (db._bulk_read_8(addr + 1, 31, ap_num=ap_num) != data[:31] or
+                db._bulk_read_16(addr + 34, 15, ap_num=ap_num) != data[32:]):
+            raise CalibrationException('Narrow transfer mismatch.')
+
+        if db.read_dp_reg(0x00) != dpidr:
+            raise CalibrationException('DPIDR mismatch.')
+
+
+class BurnTest:
+    '''
+    Programs the last sector of flash directly over SWD, without the flash
+    loader, to find how fast the flash controller can be driven.  The
+    sector's original contents are saved at the safe frequency first and
+    restored by restore().
+    '''
+    def __init__(self, db, safe_freq, rng):
+        self.db        = db
+        self.flash     = db.target.flash
+        self.safe_freq = safe_freq
+        self.rng       = rng
+        self.addr      = (self.flash.mem_base + self.flash.flash_size -
+                          self.flash.sector_size)
+        self.size      = self.flash.sector_size
+        db._set_tck_freq(safe_freq)
+        self.saved     = self.flash.read(self.addr, self.size)
+
+    def _write(self, data):
+        loader, self.flash.loader = self.flash.loader, None
+        try:
+            self.flash.write(self.addr, data, verbose=False)
+        finally:
+            self.flash.loader = loader
+
+    def check(self, freq):
+        data = self.rng.randbytes(self.size)
+        self.db._set_tck_freq(self.safe_freq)
+        self.flash.erase(self.addr, self.size, verbose=False)
+        self.db._set_tck_freq(freq)
+        self._write(data)
+        self.db._set_tck_freq(self.safe_freq)
+        if self.flash.read(self.addr, self.size) != data:
+            raise CalibrationException('Flash verify failed.')
+
+    def restore(self):
+        '''
+        Writes the saved contents back.  Trailing erased bytes are trimmed in
+        RESTORE_TRIM steps so that the data stays a multiple of every flash's
+        programming unit and the erased tail of the sector stays erased.  The
+        data is checked before the sector is erased.
+        '''
+        data = bytes(self.saved)
+        while data.endswith(b'\xff'*RESTORE_TRIM):
+            data = data[:-RESTORE_TRIM]
+        assert len(data) % RESTORE_TRIM == 0 and len(data) <= self.size
+
+        self.db._set_tck_freq(self.safe_freq)
+        self.flash.erase(self.addr, self.size, verbose=False)
+        if data:
+            self._write(data)
+
+
+def _recover(db, safe_freq):
+    '''
+    Drops back to the safe frequency and reconnects after a failed step.
+    '''
+    db._set_tck_freq(safe_freq)
+    try:
+        db.connect()
+        db.halt()
+    except Exception:
+        pass
+
+
+def _sweep(db, freqs, check, safe_freq, verbose):
+    '''
+    Tries each frequency in ascending order until one fails and returns the
+    list of frequencies that passed.
+    '''
+    passed = []
+    for f in freqs:
+        try:
+            check(f)
+        except Exception as e:
+            if verbose:
+                print('  %10.3f MHz: FAILED (%s)' % (f / 1e6, e))
+            _recover(db, safe_freq)
+            break
+        if verbose:
+            print('  %10.3f MHz: ok' % (f / 1e6))
+        passed.append(f)
+    return passed
+
+
+def calibrate(db, burn=False, rounds=4, margin=1, min_freq=1000000,
+              verbose=True):
+    '''
+    Finds the fastest SWD frequencies at which the probe reliably talks to
+    the target it has probed and stores them in the calibration cache, where
+    set_max_target_tck_freq() and set_max_burn_tck_freq() will find them.
+
+    Every frequency the probe supports from min_freq up to the probe's
+    max_tck_freq limit, if it has one, is tested in turn with SRAM pattern
+    tests until one fails; this overwrites the start of the largest SRAM.  If
+    burn is True, the same is then done by programming the last flash sector
+    directly over SWD; its contents are restored afterwards, but burn testing
+    should still not be run on a board whose firmware must not be disturbed.
+    The result is the fastest frequency that passed, backed off by margin
+    steps.
+    '''
+    freqs = []
+    for f in sorted(db.get_tck_freqs()):
+        if f < min_freq:
+            continue
+        if db.max_tck_freq is not None and f > db.max_tck_freq:
+            continue
+        actual = db._set_tck_freq(f)
+        if actual not in freqs:
+            freqs.append(actual)
+    if not freqs:
+        raise CalibrationException('No frequencies to test.')
+
+    rng = random.Random()
+    rd  = find_test_ram(db.target)
+
+    def check_read(f):
+        db._set_tck_freq(f)
+        check_read_write(db, rd, rng, rounds)
+
+    if verbose:
+        print('Testing SRAM transfers...')
+    passed = _sweep(db, freqs, check_read, freqs[0], verbose)
+    if not passed:
+        raise CalibrationException('Target unreliable at %.3f MHz.'
+                                   % (freqs[0] / 1e6))
+    entry = {'read_freq'  : passed[max(len(passed) - 1 - margin, 0)],
+             'timestamp'  : time.time(),
+             }
+
+    if burn:
+        if verbose:
+            print('Testing flash programming...')
+        safe = passed[0]
+        bt   = BurnTest(db, safe, rng)
+        try:
+            burned = _sweep(db, freqs, bt.check, safe, verbose)
+        finally:
+            bt.restore()
+        if not burned:
+            raise CalibrationException('Flash programming unreliable at '
+                                       '%.3f MHz.' % (safe / 1e6))
+        entry['burn_freq'] = burned[max(len(burned) - 1 - margin, 0)]
+
+    save(db, entry)
+    db.forget_tck_calibration()
+    return entry
@@ -0,0 +1,244 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import os
+import sys
+import time
+
+import psdb
+
+
+# Latency histogram bucket i counts transactions that took less than 2**i
+# microseconds (and at least 2**(i - 1) microseconds); the last bucket also
+# counts everything slower.
+NBUCKETS = 24
+
+# Maximum number of stack frames examined when attributing a transaction to
+# its caller.
+MAX_ATTRIBUTION_DEPTH = 32
+
+# Modules whose frames are skipped when attributing a transaction to a caller
+# that isn't a Device; they are just the plumbing between the caller and the
+# probe.
+PLUMBING_MODULES = ('psdb.probes.', 'psdb.access_port')
+
+
+def _bucket(elapsed):
+    return min(int(elapsed * 1e6).bit_length(), NBUCKETS - 1)
+
+
+def _bucket_label(i):
+    if i == NBUCKETS - 1:
+        return '>=%s' % _fmt_us(1 << (i - 1))
+    return '<%s' % _fmt_us(1 << i)
+
+
+def _fmt_us(us):
+    if us >= 1000000:
+        return '%gs' % (us / 1e6)
+    if us >= 1000:
+        return '%gms' % (us / 1e3)
+    return '%uus' % us
+
+
+class OpStats:
+    '''
+    Accumulated statistics for one transaction type or one caller.
+    '''
+    def __init__(self):
+        self.count     = 0
+        self.bytes_out = 0
+        self.bytes_in  = 0
+        self.retries   = 0
+        self.errors    = 0
+        self.elapsed   = 0
+        self.max_time  = 0
+        self.hist      = [0]*NBUCKETS
+
+    def record(self, elapsed, bytes_out, bytes_in, error):
+        self.count     += 1
+        self.bytes_out += bytes_out
+        self.bytes_in  += bytes_in
+        self.elapsed   += elapsed
+        self.max_time   = max(self.max_time, elapsed)
+        self.hist[_bucket(elapsed)] += 1
+        if error:
+            self.errors += 1
+
+    def to_dict(self):
+        return {'count'     : self.count,
+                'bytes_out' : self.bytes_out,
+                'bytes_in'  : self.bytes_in,
+                'retries'   : self.retries,
+                'errors'    : self.errors,
+                'elapsed'   : self.elapsed,
+                'max_time'  : self.max_time,
+                'hist'      : {_bucket_label(i) : n
+                               for i, n in enumerate(self.hist) if n},
+                }
+
+
+class XactStats:
+    '''
+    Host-side transaction statistics for a probe.  The probe transport
+    records every USB transaction it performs, keyed by transaction type (the
+    STLINK CDB, XTSWD opcode or XDS110 command), with its byte counts, its
+    wall-clock latency, whether it failed and how many times it had to be
+    retried because the target answered WAIT.
+
+    If attribute is True, each transaction is also charged to its caller:
+    the register of the psdb Device that issued it (for instance
+    "FLASH._SR"), or otherwise the first function outside the probe and
+    access port plumbing.  Attribution walks the stack on every transaction,
+    so it is noticeably slower than recording the types alone.
+
+    Probes keep a reference to an XactStats object only while instrumentation
+    is enabled; when it is disabled the transports skip recording entirely
+    after a single None check.
+    '''
+    def __init__(self, attribute=True):
+        self.attribute = attribute
+        self.ops       = {}
+        self.sources   = {}
+        self.t0        = time.perf_counter()
+        self.reg_names = {}
+
+    def _device_source(self, dev, offset, func):
+        '''
+        Names the register at the specified offset of a Device, or the Device
+        method if the access wasn't made through a register.
+        '''
+        names = self.reg_names.get(id(dev))
+        if names is None:
+            names = {r.offset : r.name for r in dev.regs
+                     if r.offset is not None}
+            self.reg_names[id(dev)] = names
+        name = names.get(offset & ~3) if isinstance(offset, int) else None
+        if name:
+            return '%s._%s' % (dev.path, name.upper())
+        return '%s:%s' % (dev.path, func)
+
+    def source(self):
+        '''
+        Returns the caller that the transaction currently being performed
+        should be charged to, or None if attribution is disabled.
+        '''
+        if not self.attribute:
+            return None
+
+        f        = sys._getframe(2)
+        fallback = None
+        for _ in range(MAX_ATTRIBUTION_DEPTH):
+            if f is None:
+                break
+
+            obj = f.f_locals.get('self')
+            if isinstance(obj, psdb.devices.Device):
+                return self._device_source(obj, f.f_locals.get('offset'),
+                                           f.f_code.co_name)
+
+            if fallback is None:
+                module = f.f_globals.get('__name__', '')
+                if not module.startswith(PLUMBING_MODULES):
+                    name = f.f_code.co_name
+                    if obj is not None:
+                        name = '%s.%s' % (type(obj).__name__, name)
+                    fallback = '%s:%s' % (module, name)
+            f = f.f_back
+
+        return fallback or '<unknown>'
+
+    def record(self, op, elapsed, bytes_out, bytes_in, source=None,
+               error=False):
+        '''
+        Records a completed transaction of type op.
+        '''
+        s = self.ops.get(op)
+        if s is None:
+            s = self.ops[op] = OpStats()
+        s.record(elapsed, bytes_out, bytes_in, error)
+
+        if source is not None:
+            s = self.sources.get(source)
+            if s is None:
+                s = self.sources[source] = OpStats()
+            s.record(elapsed, bytes_out, bytes_in, error)
+
+    def retry(self, op):
+        '''
+        Records that a transaction of type op is being retried.
+        '''
+        s = self.ops.get(op)
+        if s is None:
+            s = self.ops[op] = OpStats()
+        s.retries += 1
+
+    def call(self, op, bytes_out, bytes_in, fn, *args):
+        '''
+        Invokes fn(*args) as a transaction of type op and records it, then
+        returns its result.  Exceptions are recorded as errors and re-raised.
+        '''
+        source = self.source()
+        t0     = time.perf_counter()
+        try:
+            rv = fn(*args)
+        except BaseException:
+            self.record(op, time.perf_counter() - t0, bytes_out, bytes_in,
+                        source=source, error=True)
+            raise
+        self.record(op, time.perf_counter() - t0, bytes_out, bytes_in,
+                    source=source)
+        return rv
+
+    def to_dict(self):
+        return {'elapsed' : time.perf_counter() - self.t0,
+                'ops'     : {k : v.to_dict() for k, v in self.ops.items()},
+                'sources' : {k : v.to_dict()
+                             for k, v in self.sources.items()},
+                }
+
+    @staticmethod
+    def _dump_table(title, stats, limit, f):
+        rows = sorted(stats.items(), key=lambda kv: kv[1].elapsed,
+                      reverse=True)
+        if limit:
+            rows = rows[:limit]
+        print('%-40s %8s %10s %10s %7s %6s %10s %10s'
+              % (title, 'Count', 'Out', 'In', 'Retries', 'Errors',
+                 'Total ms', 'Mean us'), file=f)
+        for name, s in rows:
+            print('%-40s %8u %10u %10u %7u %6u %10.3f %10.2f'
+                  % (name, s.count, s.bytes_out, s.bytes_in, s.retries,
+                     s.errors, s.elapsed * 1e3,
+                     s.elapsed * 1e6 / s.count if s.count else 0), file=f)
+
+    def dump(self, limit=20, f=None):
+        '''
+        Prints the per-type statistics with their latency histograms and the
+        callers that the most time was spent on.
+        '''
+        f = f or sys.stdout
+        print('Transactions over %.3f seconds:'
+              % (time.perf_counter() - self.t0), file=f)
+        self._dump_table('Transaction', self.ops, None, f)
+
+        print('Latency histogram:', file=f)
+        for name, s in sorted(self.ops.items()):
+            hist = ' '.join('%s:%u' % (_bucket_label(i), n)
+                            for i, n in enumerate(s.hist) if n)
+            print('  %-38s %s' % (name, hist), file=f)
+
+        if self.sources:
+            print('Top callers:', file=f)
+            self._dump_table('Caller', self.sources, limit, f)
+
+
+def from_env():
+    '''
+    Returns a new XactStats object if the PSDB_XACT_STATS environment
+    variable requests instrumentation, or None otherwise.  A value of "types"
+    records transaction types only, without caller attribution; any other
+    value also attributes transactions to their callers.
+    '''
+    mode = os.environ.get('PSDB_XACT_STATS')
+    if not mode:
+        return None
+    return XactStats(attribute=(mode != 'types'))
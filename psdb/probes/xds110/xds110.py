@@ -20,10 +20,38 @@ MAX_PACKET       = 1024
 MAX_DATA_BLOCK   = 4096
 USB_PAYLOAD_SIZE = MAX_DATA_BLOCK + 60
 
+# Limits on a single ocd_dap_request block: both the encoded requests and the
+# 32-bit results have to fit in a single data block.
+MAX_DAP_REQS    = MAX_DATA_BLOCK
+MAX_DAP_RESULTS = MAX_DATA_BLOCK // 4
+
 # Features supported by various versions of the XDS110 firmware.
 FEATURE_TCK_V2  = (1 << 0)
 FEATURE_TCK_V3  = (1 << 1)
 
+# Names of the commands we send, for transaction statistics.
+COMMAND_NAMES = {0x03 : 'XDS_VERSION',
+                 0x04 : 'XDS_SET_TCK_DELAY',
+                 0x0E : 'XDS_SET_SRST',
+                 0x0F : 'CMAPI_CONNECT',
+                 0x10 : 'CMAPI_DISCONNECT',
+                 0x11 : 'CMAPI_ACQUIRE',
+                 0x12 : 'CMAPI_RELEASE',
+                 0x15 : 'CMAPI_READ_DAP_REG',
+                 0x16 : 'CMAPI_WRITE_DAP_REG',
+                 0x17 : 'SWD_CONNECT',
+                 0x18 : 'SWD_DISCONNECT',
+                 0x3A : 'OCD_DAP_REQUEST',
+                 0x3B : 'OCD_SCAN_REQUEST',
+                 0x3C : 'OCD_PATHMOVE',
+                 }
+
+# CSW SIZE and AddrInc fields for each transfer size.
+CSW_SIZE_BITS = {1 : 0x10,
+                 2 : 0x11,
+                 4 : 0x12,
+                 }
+
 
 def version_string(v):
     return '%u.%u.%u.%u' % (((v & 0xFF000000) >> 24),
@@ -50,6 +78,138 @@ class XDS110CommandException(psdb.ProbeException):
         self.response     = response
 
 
+class DAPCompiler:
+    '''
+    Compiles a sequence of MEM-AP bulk transfers into the largest
+    ocd_dap_request blocks that the XDS110 firmware accepts.  Each block
+    selects the AP once and only rewrites CSW when the transfer size changes;
+    each chunk of a transfer then costs a TAR write plus one DRW access per
+    word.  AP reads are posted, so each read chunk also ends with an RDBUFF
+    read and the first result of the chunk is discarded.  Transfers are split
+    into new chunks wherever a block would exceed the request or result
+    limits, and each block is sent when it fills up or when flush() is
+    invoked.
+
+    Read results are written directly into the caller's destination buffer
+    once the block containing them has been executed.
+    '''
+    def __init__(self, xds, ap_num):
+        self.xds       = xds
+        self.ap_num    = ap_num
+        self.csw_base  = xds._get_csw_base(ap_num)
+        self.select    = xds._make_dp_write_request((ap_num << 24), 0x08)
+        self.tar_len   = len(xds._make_ap_write_request(0, 0x04))
+        self.rdbuff    = xds._make_dp_read_request(0x0C)
+        self.drw_read  = xds._make_ap_read_request(0x0C)
+        self.drw_write = xds._make_ap_write_request(0, 0x0C)[:1]
+        self._reset()
+
+    def _reset(self):
+        self.reqs       = bytearray(self.select)
+        self.nresults   = 0
+        self.word_size  = None
+        self.has_writes = False
+        self.reads      = []
+
+    def _avail_reqs(self):
+        '''
+        Returns the number of request bytes left in the block after reserving
+        space for a CSW write, a TAR write and the trailing SELECT write.
+        '''
+        return (MAX_DAP_REQS - len(self.reqs) - 2*self.tar_len -
+                len(self.select))
+
+    def _set_word_size(self, word_size):
+        if self.word_size != word_size:
+            self.reqs += self.xds._make_ap_write_request(
+                (self.csw_base & ~0x37) | CSW_SIZE_BITS[word_size], 0x00)
+            self.word_size = word_size
+
+    def read(self, addr, n, word_size, dst, offset):
+        '''
+        Adds a read of n words of the specified size, which must not cross a
+        1K page boundary, with the results destined for dst[offset:].
+        '''
+        while n:
+            count = min(n, MAX_DAP_RESULTS - self.nresults - 1,
+                        self._avail_reqs() - len(self.rdbuff))
+            if count <= 0:
+                self.flush()
+                continue
+
+            self._set_word_size(word_size)
+            self.reqs += self.xds._make_ap_write_request(addr, 0x04)
+            self.reqs += self.drw_read * count
+            self.reqs += self.rdbuff
+            self.reads.append((self.nresults + 1, addr, count, word_size, dst,
+                               offset))
+            self.nresults += count + 1
+            addr          += count * word_size
+            offset        += count * word_size
+            n             -= count
+
+    def write(self, data, addr, word_size):
+        '''
+        Adds a write of the data, which must be a multiple of the word size
+        and must not cross a 1K page boundary.
+        '''
+        mv = memoryview(data).cast('B')
+        while mv:
+            count = min(len(mv) // word_size, self._avail_reqs() // 5)
+            if count <= 0:
+                self.flush()
+                continue
+
+            self._set_word_size(word_size)
+            self.reqs += self.xds._make_ap_write_request(addr, 0x04)
+            self.reqs += self._encode_writes(mv[:count * word_size], addr,
+                                             word_size)
+            self.has_writes = True
+            addr += count * word_size
+            mv    = mv[count * word_size:]
+
+    def _encode_writes(self, mv, addr, word_size):
+        '''
+        Encodes one DRW write request per word, placing each byte or halfword
+        on the byte lanes selected by its address.
+        '''
+        n    = len(mv) // word_size
+        reqs = bytearray(5 * n)
+        reqs[0::5] = self.drw_write * n
+        if word_size == 4:
+            for i in range(4):
+                reqs[1 + i::5] = mv[i::4]
+        else:
+            for i in range(n):
+                lane = ((addr + i*word_size) & 3) + 5*i + 1
+                reqs[lane:lane + word_size] = mv[i*word_size:(i+1)*word_size]
+        return reqs
+
+    def flush(self):
+        '''
+        Executes the current block, if any, and scatters the read results into
+        their destination buffers.
+        '''
+        if not self.reads and not self.has_writes:
+            return
+
+        if self.has_writes:
+            self.reqs += self.select
+        rsp = self.xds._ocd_dap_request(bytes(self.reqs), self.nresults)
+        for index, addr, n, word_size, dst, offset in self.reads:
+            pos = index * 4
+            if word_size == 4:
+                dst[offset:offset + n*4] = rsp[pos:pos + n*4]
+                continue
+
+            for i in range(n):
+                lane = pos + i*4 + ((addr + i*word_size) & 3)
+                dst[offset:offset + word_size] = rsp[lane:lane + word_size]
+                offset += word_size
+
+        self._reset()
+
+
 class XDS110(usb_probe.Probe):
     NAME = 'XDS110'
 
@@ -105,6 +265,20 @@ class XDS110(usb_probe.Probe):
         assert self.write(cmd) == len(cmd)
 
     def execute(self, cmd, expected_len=None, allowed_errs=(0,)):
+        '''
+        Sends a command and returns its response payload and error code.  If
+        transaction statistics are enabled, the command is recorded under its
+        name from COMMAND_NAMES.
+        '''
+        if self.xact_stats is None:
+            return self._execute(cmd, expected_len, allowed_errs)
+
+        op = COMMAND_NAMES.get(cmd[0], 'CMD_0x%02X' % cmd[0])
+        return self.xact_stats.call(op, len(cmd) + 3, (expected_len or 0) + 7,
+                                    self._execute, cmd, expected_len,
+                                    allowed_errs)
+
+    def _execute(self, cmd, expected_len, allowed_errs):
         self.send_command(cmd)
         rsp, err = self.get_response(allowed_errs)
         if err == 0 and expected_len is not None and expected_len != len(rsp):
@@ -212,11 +386,18 @@ class XDS110(usb_probe.Probe):
     def _make_ap_write_request(self, v, reg):
         return pack('<BI', self._make_dap_cmd(((reg << 1) & 0x18) | 0x03), v)
 
-    def ocd_dap_request(self, reqs, result_count):
-        '''Handle block of DAP requests'''
+    def _ocd_dap_request(self, reqs, result_count):
+        '''
+        Handle block of DAP requests, returning the raw result bytes.
+        '''
         cmd = pack('<B', 0x3A) + reqs + b'\x00'
         rsp, _ = self.execute(cmd, result_count*4)
-        return unpack('I'*result_count, rsp)
+        return rsp
+
+    def ocd_dap_request(self, reqs, result_count):
+        '''Handle block of DAP requests'''
+        rsp = self._ocd_dap_request(reqs, result_count)
+        return unpack('<%uI' % result_count, rsp)
 
     def ocd_scan_request(self, reqs, result_size):
         '''Handle block of JTAG scan requests'''
@@ -230,121 +411,88 @@ class XDS110(usb_probe.Probe):
         self.execute(cmd, 0)
 
     def _get_csw_base(self, ap_num):
-        csw_base = self.csw_bases.get(ap_num, self.read_ap_reg(ap_num, 0x00))
-        self.csw_bases[ap_num] = csw_base
+        csw_base = self.csw_bases.get(ap_num)
+        if csw_base is None:
+            csw_base = self.read_ap_reg(ap_num, 0x00)
+            self.csw_bases[ap_num] = csw_base
         return csw_base
 
-    def _bulk_read_8(self, addr, n, ap_num=0):
+    def _bulk_read(self, addr, n, word_size, ap_num=0):
         '''
-        Bulk read n 8-bit values.  Must not cross a page boundary.
+        Bulk read n aligned values of the specified size.  Must not cross a
+        page boundary.
         '''
+        assert addr % word_size == 0
         assert n > 0
-        assert (addr & 0xFFFFFC00) == ((addr + n - 1) & 0xFFFFFC00)
-
-        csw_base = self._get_csw_base(ap_num)
-        reqs  = self._make_dp_write_request((ap_num << 24), 0x08)
-        reqs += self._make_ap_write_request((csw_base & ~0x37) | 0x10, 0x00)
-        reqs += self._make_ap_write_request(addr, 0x04)
-        reqs += self._make_ap_read_request(0x0C)*n
-        reqs += self._make_dp_read_request(0x0C)
-        results = self.ocd_dap_request(reqs, 1 + n)
-        mem = bytes(b'')
-        for v in results[1:]:
-            mem += b'%c' % ((v >> 8*(addr % 4)) & 0xFF)
-            addr += 1
-        return mem
+        assert ((addr & 0xFFFFFC00) ==
+                ((addr + n*word_size - 1) & 0xFFFFFC00))
 
-    def _bulk_read_16(self, addr, n, ap_num=0):
-        '''
-        Bulk read n aligned 16-bit values.  Must not cross a page boundary.
-        '''
-        assert addr % 2 == 0
-        assert n > 0
-        assert (addr & 0xFFFFFC00) == ((addr + n*2 - 1) & 0xFFFFFC00)
-
-        csw_base = self._get_csw_base(ap_num)
-        reqs  = self._make_dp_write_request((ap_num << 24), 0x08)
-        reqs += self._make_ap_write_request((csw_base & ~0x37) | 0x11, 0x00)
-        reqs += self._make_ap_write_request(addr, 0x04)
-        reqs += self._make_ap_read_request(0x0C)*n
-        reqs += self._make_dp_read_request(0x0C)
-        results = self.ocd_dap_request(reqs, 1 + n)
-        mem = bytes(b'')
-        for v in results[1:]:
-            mem += b'%c%c' % (((v >> (8*(addr % 4) + 0)) & 0xFF),
-                              ((v >> (8*(addr % 4) + 8)) & 0xFF))
-            addr += 2
-        return mem
+        mem = bytearray(n * word_size)
+        dc  = DAPCompiler(self, ap_num)
+        dc.read(addr, n, word_size, mem, 0)
+        dc.flush()
+        return bytes(mem)
 
-    def _bulk_read_32(self, addr, n, ap_num=0):
+    def _bulk_write(self, data, addr, word_size, ap_num=0):
         '''
-        Bulk read n aligned 32-bit values.  Must not cross a page boundary.
+        Bulk write aligned values of the specified size.  Must not cross a
+        page boundary.
         '''
-        assert addr % 4 == 0
-        assert n > 0
-        assert (addr & 0xFFFFFC00) == ((addr + n*4 - 1) & 0xFFFFFC00)
-
-        csw_base = self._get_csw_base(ap_num)
-        reqs  = self._make_dp_write_request((ap_num << 24), 0x08)
-        reqs += self._make_ap_write_request((csw_base & ~0x37) | 0x12, 0x00)
-        reqs += self._make_ap_write_request(addr, 0x04)
-        reqs += self._make_ap_read_request(0x0C)*n
-        reqs += self._make_dp_read_request(0x0C)
-        results = self.ocd_dap_request(reqs, 1 + n)
-        r = bytes(b'')
-        for v in results[1:]:
-            r += b'%c%c%c%c' % (((v >>  0) & 0xFF),
-                                ((v >>  8) & 0xFF),
-                                ((v >> 16) & 0xFF),
-                                ((v >> 24) & 0xFF))
-        return r
-
-    def _bulk_write_8(self, data, addr, ap_num=0):
+        assert addr % word_size == 0
+        assert len(data) % word_size == 0
         assert data
         assert (addr & 0xFFFFFC00) == ((addr + len(data) - 1) & 0xFFFFFC00)
 
-        csw_base = self._get_csw_base(ap_num)
-        reqs  = self._make_dp_write_request((ap_num << 24), 0x08)
-        reqs += self._make_ap_write_request((csw_base & ~0x37) | 0x10, 0x00)
-        reqs += self._make_ap_write_request(addr, 0x04)
-        for v in data:
-            reqs += self._make_ap_write_request((v << 8*(addr % 4)), 0x0C)
-            addr += 1
-        reqs += self._make_dp_write_request((ap_num << 24), 0x08)
-        self.ocd_dap_request(reqs, 0)
+        dc = DAPCompiler(self, ap_num)
+        dc.write(data, addr, word_size)
+        dc.flush()
 
-    def _bulk_write_16(self, data, addr, ap_num=0):
-        assert addr % 2 == 0
-        assert len(data) % 2 == 0
-        assert data
-        assert (addr & 0xFFFFFC00) == ((addr + len(data) - 1) & 0xFFFFFC00)
+    def _bulk_read_8(self, addr, n, ap_num=0):
+        return self._bulk_read(addr, n, 1, ap_num=ap_num)
 
-        csw_base = self._get_csw_base(ap_num)
-        reqs  = self._make_dp_write_request((ap_num << 24), 0x08)
-        reqs += self._make_ap_write_request((csw_base & ~0x37) | 0x11, 0x00)
-        reqs += self._make_ap_write_request(addr, 0x04)
-        for i in range(len(data)//2):
-            v     = unpack_from('<H', data, offset=i*2)[0]
-            reqs += self._make_ap_write_request((v << 8*(addr % 4)), 0x0C)
-            addr += 2
-        reqs += self._make_dp_write_request((ap_num << 24), 0x08)
-        self.ocd_dap_request(reqs, 0)
+    def _bulk_read_16(self, addr, n, ap_num=0):
+        return self._bulk_read(addr, n, 2, ap_num=ap_num)
+
+    def _bulk_read_32(self, addr, n, ap_num=0):
+        return self._bulk_read(addr, n, 4, ap_num=ap_num)
+
+    def _bulk_write_8(self, data, addr, ap_num=0):
+        self._bulk_write(data, addr, 1, ap_num=ap_num)
+
+    def _bulk_write_16(self, data, addr, ap_num=0):
+        self._bulk_write(data, addr, 2, ap_num=ap_num)
 
     def _bulk_write_32(self, data, addr, ap_num=0):
-        assert addr % 4 == 0
-        assert len(data) % 4 == 0
-        assert data
-        assert (addr & 0xFFFFFC00) == ((addr + len(data) - 1) & 0xFFFFFC00)
+        self._bulk_write(data, addr, 4, ap_num=ap_num)
+
+    def read_bulk_into(self, addr, buf, ap_num=0):
+        '''
+        Bulk read that compiles all of the page-sized transfers into as few
+        DAP request blocks as possible, placing the results directly into the
+        buffer.
+        '''
+        mv = memoryview(buf).cast('B')
+        if not mv:
+            return
+
+        dc = DAPCompiler(self, ap_num)
+        for span_addr, offset, n, word_size in self._bulk_spans(addr, len(mv)):
+            dc.read(span_addr, n, word_size, mv, offset)
+        dc.flush()
+
+    def write_bulk(self, data, addr, ap_num=0):
+        '''
+        Bulk write that compiles all of the page-sized transfers into as few
+        DAP request blocks as possible.
+        '''
+        if not data:
+            return
 
-        csw_base = self._get_csw_base(ap_num)
-        reqs  = self._make_dp_write_request((ap_num << 24), 0x08)
-        reqs += self._make_ap_write_request((csw_base & ~0x37) | 0x12, 0x00)
-        reqs += self._make_ap_write_request(addr, 0x04)
-        for i in range(len(data)//4):
-            v     = unpack_from('<I', data, offset=i*4)[0]
-            reqs += self._make_ap_write_request(v, 0x0C)
-        reqs += self._make_dp_write_request((ap_num << 24), 0x08)
-        self.ocd_dap_request(reqs, 0)
+        mv = memoryview(data).cast('B')
+        dc = DAPCompiler(self, ap_num)
+        for span_addr, offset, n, word_size in self._bulk_spans(addr, len(mv)):
+            dc.write(mv[offset:offset + n*word_size], span_addr, word_size)
+        dc.flush()
 
     def assert_srst(self):
         '''Holds the target in reset.'''
@@ -354,6 +502,17 @@ class XDS110(usb_probe.Probe):
         '''Releases the target from reset.'''
         self.xds_set_srst(1)
 
+    def get_fw_version(self):
+        return version_string(self.fw_version)
+
+    def get_tck_freqs(self):
+        '''
+        Returns the magic TCK delay frequencies and a spread of the computed
+        ones below them.
+        '''
+        return [1000000, 2000000, 4000000, 6000000, 8000000, 10000000,
+                12000000, 14000000]
+
     def _set_tck_freq(self, freq_hz):
         '''
         Sets TCK to the nearest frequency that doesn't exceed the requested
@@ -447,6 +606,37 @@ class XDS110(usb_probe.Probe):
         '''Write a 32-bit register in the AP address space.'''
         self.cmapi_write_dap_reg(0, ap_num, addr, value)
 
+    def read_ap_idrs(self, ap_nums):
+        '''
+        Reads the IDRs of the APs using as few DAP request blocks as possible.
+        Each AP costs a SELECT write of its IDR bank and a posted IDR read, so
+        each block ends with an RDBUFF read and the first result is discarded.
+        SELECT is restored to 0 at the end of each block.  If a block fails,
+        we fall back to reading the IDRs in that block one at a time.
+        '''
+        select = self._make_dp_write_request(0, 0x08)
+        rdbuff = self._make_dp_read_request(0x0C)
+        idr    = self._make_ap_read_request(0x0C)
+        per_ap = len(select) + len(idr)
+        n      = min(MAX_DAP_RESULTS - 1,
+                     (MAX_DAP_REQS - len(rdbuff) - len(select)) // per_ap)
+
+        ap_nums = list(ap_nums)
+        idrs    = []
+        for pos in range(0, len(ap_nums), n):
+            block = ap_nums[pos:pos + n]
+            reqs  = bytearray()
+            for ap_num in block:
+                reqs += self._make_dp_write_request((ap_num << 24) | 0xF0,
+                                                    0x08)
+                reqs += idr
+            reqs += rdbuff + select
+            try:
+                idrs += self.ocd_dap_request(bytes(reqs), len(block) + 1)[1:]
+            except XDS110CommandException:
+                idrs += super().read_ap_idrs(block)
+        return idrs
+
     def connect(self):
         # Switch to Serial-Wire debug and connect.  The cmapi_connect() call
         # fails if somebody left DPBANKSEL != 0, so nuke it if we get an error
@@ -468,4 +658,4 @@ class XDS110(usb_probe.Probe):
     def show_detailed_info(self):
         super().show_info(self.usb_dev)
         print(' Hardware Ver: 0x%04X' % self.hw_version)
-        print(' Firmware Ver: %s' % version_string(self.fw_version))
+        print(' Firmware Ver: %s' % self.get_fw_version())
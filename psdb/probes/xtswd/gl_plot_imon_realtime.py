@@ -13,6 +13,9 @@ import psdb.probes
 
 BOXCAR_N = 1
 
+# Default number of seconds of history kept on screen.
+HISTORY_SECS = 60
+
 
 class IMonWindow(glotlib.Window):
     def __init__(self, xtswd, args):
@@ -25,8 +28,11 @@ class IMonWindow(glotlib.Window):
         self.rst_line   = self.i_plot.add_vline(0, color='#80C080')
         self.pos_label  = self.add_label((0.99, 0.01), '', anchor='SE')
         self.data_lock  = threading.Lock()
-        self.new_data_x = np.array([])
-        self.new_data_y = np.array([])
+        self.ring_x     = None
+        self.ring_y     = None
+        self.ring_pos   = 0
+        self.ring_full  = False
+        self.new_data   = False
         self.paused     = False
         self.thread     = threading.Thread(target=self.workloop)
         self.running    = True
@@ -55,20 +61,39 @@ class IMonWindow(glotlib.Window):
             updated |= self.pos_label.set_text('%.10f  %.10f' %
                                                (data_x, data_y))
 
+        # The ring only ever holds the last history seconds of data, so the
+        # plot is simply replaced with its contents in time order.
         X, Y = None, None
         with self.data_lock:
-            if len(self.new_data_x):
-                X = self.new_data_x
-                Y = self.new_data_y
-                self.new_data_x = np.array([])
-                self.new_data_y = np.array([])
+            if self.new_data:
+                self.new_data = False
+                pos = self.ring_pos
+                if self.ring_full:
+                    X = np.concatenate((self.ring_x[pos:], self.ring_x[:pos]))
+                    Y = np.concatenate((self.ring_y[pos:], self.ring_y[:pos]))
+                else:
+                    X = self.ring_x[:pos].copy()
+                    Y = self.ring_y[:pos].copy()
 
         if Y is not None:
             updated = True
-            self.i_steps.append_x_y_data(X, Y)
+            self.i_steps.set_x_y_data(X, Y)
 
         return updated
 
+    def _add_data(self, X, Y):
+        with self.data_lock:
+            pos = self.ring_pos
+            n   = min(len(X), len(self.ring_x) - pos)
+            self.ring_x[pos:pos + n] = X[:n]
+            self.ring_y[pos:pos + n] = Y[:n]
+            self.ring_x[:len(X) - n] = X[n:]
+            self.ring_y[:len(Y) - n] = Y[n:]
+            self.ring_pos  = (pos + len(X)) % len(self.ring_x)
+            self.ring_full = self.ring_full or pos + len(X) >= len(self.ring_x)
+            self.new_data  = True
+        self.mark_dirty()
+
     def workloop(self):
         # Put the target in reset if requested.
         srst = self.args.srst
@@ -83,6 +108,10 @@ class IMonWindow(glotlib.Window):
         last_seq = -1
         t        = 0
         p        = 1 / imon_settings.f
+        size     = int(self.args.history * imon_settings.f / BOXCAR_N)
+        with self.data_lock:
+            self.ring_x = np.zeros(size)
+            self.ring_y = np.zeros(size)
         if srst:
             self.xtswd.assert_srst()
         while self.running:
@@ -101,14 +130,11 @@ class IMonWindow(glotlib.Window):
             if self.paused:
                 continue
 
-            Y = [np.mean(Y[i*BOXCAR_N:(i + 1)*BOXCAR_N])
-                 for i in range(len(Y)//BOXCAR_N)]
-            X = np.arange(len(Y)) * p * BOXCAR_N + t
+            n = len(Y) // BOXCAR_N
+            Y = Y[:n * BOXCAR_N].reshape(n, BOXCAR_N).mean(axis=1)
+            X = np.arange(n) * p * BOXCAR_N + t
             t = X[-1] + p * BOXCAR_N
-            with self.data_lock:
-                self.new_data_x = np.concatenate((self.new_data_x, X))
-                self.new_data_y = np.concatenate((self.new_data_y, Y))
-            self.mark_dirty()
+            self._add_data(X[-len(self.ring_x):], Y[-len(self.ring_y):])
 
 
 def main(args):
@@ -143,6 +169,7 @@ def _main():
     parser.add_argument('--srst', action='store_true')
     parser.add_argument('--calfact', type=auto_int, default='0x4C')
     parser.add_argument('--i-max', type=float, default=45)
+    parser.add_argument('--history', type=float, default=HISTORY_SECS)
     args = parser.parse_args()
 
     try:
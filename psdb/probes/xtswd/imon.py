@@ -1,50 +1,127 @@
 #!/usr/bin/env python3
 # Copyright (c) 2022 Phase Advanced Sensor Systems, Inc.
 import argparse
+import array
+import threading
 import time
 import sys
 
-import btype
-import psdb.probes
-
-
-HDR      = None
-LAST_SEQ = -1
-
-
-class Header(btype.Struct):
-    sig             = btype.uint32_t(0x4e4f4d49)
-    freq_num        = btype.uint32_t()
-    freq_denom      = btype.uint32_t()
-    oversample_log2 = btype.uint8_t()
-    rsrv            = btype.Array(btype.uint8_t(), 3)
-    _EXPECTED_SIZE  = 16
-
+import numpy as np
 
-def read_data(f, probe, timeout=None):
-    global HDR
-    global LAST_SEQ
-
-    if timeout is None:
-        timeout = 100000000000000
-
-    t0 = time.time()
-    while time.time() - t0 < timeout:
-        idata, data = probe.read_current_monitor_data()
-        if HDR is None:
-            HDR = Header(freq_num=idata.freq_num,
-                         freq_denom=idata.freq_denom,
-                         oversample_log2=idata.oversample_log2)
-            f.write(HDR.pack())
-        f.write(data)
-
-        if idata.seq - LAST_SEQ != 1:
-            print('**** Missed %u buffers ****' % (idata.seq - LAST_SEQ - 1))
-        LAST_SEQ = idata.seq
-
-        freq = idata.freq_num / idata.freq_denom
-        print('IMon %u: %ux oversample, %s Hz, %u bytes' %
-              (idata.seq, 1 << idata.oversample_log2, freq, len(data)))
+import psdb.probes
+from .xtswd import IMON_DTYPE
+from .imon_file import IMonWriter
+
+
+# Number of IMon buffers held between the USB thread and the file writer;
+# each one is 10000 samples or about 20K.
+DEFAULT_RING_SIZE = 1024
+
+
+class IMonRecorder:
+    '''
+    Records IMon buffers from an XTSWD probe.  A dedicated thread reads the
+    IMON endpoint into a preallocated ring of IMON_DTYPE records, so that USB
+    reads never wait on disk I/O, and the caller drains the ring into an
+    IMonWriter with drain().  Memory use is bounded by the ring size; if the
+    writer falls behind and the ring fills up, buffers are dropped.  Dropped
+    buffers and buffers the probe itself failed to deliver both show up as
+    gaps in the buffer sequence numbers, which are preserved in the file.
+    '''
+    def __init__(self, probe, writer, ring_size=DEFAULT_RING_SIZE):
+        self.probe     = probe
+        self.writer    = writer
+        self.ring      = np.zeros(ring_size, dtype=IMON_DTYPE)
+        self.ring_u8   = self.ring.view(np.uint8).reshape(ring_size, -1)
+        self.usb_buf   = array.array('B', bytes(IMON_DTYPE.itemsize))
+        self.usb_u8    = np.frombuffer(self.usb_buf, dtype=np.uint8)
+        self.head      = 0
+        self.count     = 0
+        self.cond      = threading.Condition()
+        self.running   = False
+        self.thread    = None
+        self.exception = None
+        self.last_seq  = None
+        self.nbufs     = 0
+        self.nmissed   = 0
+        self.ndropped  = 0
+
+    def start(self):
+        self.running = True
+        self.thread  = threading.Thread(target=self._workloop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def _workloop(self):
+        try:
+            while self.running:
+                rec = self.probe.read_current_monitor_buffer(self.usb_buf)
+                seq = int(rec.seq)
+                if self.last_seq is not None:
+                    self.nmissed += (seq - self.last_seq - 1) & 0xFFFFFFFF
+                self.last_seq = seq
+                self.nbufs   += 1
+
+                with self.cond:
+                    if self.count == len(self.ring):
+                        self.ndropped += 1
+                        continue
+                    tail = (self.head + self.count) % len(self.ring)
+                    self.ring_u8[tail] = self.usb_u8
+                    self.count += 1
+                    self.cond.notify()
+        except Exception as e:
+            # A read that times out because we are being stopped is fine.
+            if self.running:
+                self.exception = e
+        finally:
+            with self.cond:
+                self.running = False
+                self.cond.notify()
+
+    def drain(self, timeout=None):
+        '''
+        Waits for buffers to arrive and writes all buffered ones to the
+        writer.  Returns the number of buffers written.  Re-raises any
+        exception that stopped the USB thread.
+        '''
+        with self.cond:
+            if not self.count and self.running:
+                self.cond.wait(timeout)
+            if self.exception:
+                raise self.exception
+            head  = self.head
+            count = self.count
+
+        # The USB thread only writes to free slots, so the filled ones can be
+        # written out without holding the lock.
+        n = min(count, len(self.ring) - head)
+        self.writer.write(self.ring[head:head + n])
+        self.writer.write(self.ring[:count - n])
+
+        with self.cond:
+            self.head   = (head + count) % len(self.ring)
+            self.count -= count
+        return count
+
+    def record(self, timeout=None, verbose=True):
+        '''
+        Drains the ring into the writer until the timeout expires, forever if
+        no timeout is specified.
+        '''
+        t0 = time.time()
+        t1 = t0
+        while timeout is None or time.time() - t0 < timeout:
+            self.drain(timeout=0.1)
+            if verbose and time.time() - t1 >= 1:
+                t1 = time.time()
+                print('IMon: %u buffers, %u missed, %u dropped' %
+                      (self.nbufs, self.nmissed, self.ndropped))
 
 
 def main(rv):
@@ -59,7 +136,9 @@ def main(rv):
     # Find the target probe.
     probe = psdb.probes.xtswd.make_one_ns(rv)
 
-    with open(rv.dump_file, 'wb') as f:
+    writer   = IMonWriter(rv.dump_file)
+    recorder = IMonRecorder(probe, writer)
+    try:
         # Put the target in reset if requested.
         if rv.srst:
             probe.assert_srst()
@@ -71,14 +150,24 @@ def main(rv):
 
         # Start current monitoring while in reset.
         probe.start_current_monitoring()
-        read_data(f, probe, timeout=1)
+        recorder.start()
+        recorder.record(timeout=1)
 
         # Release the target from reset if requested.
         if rv.srst:
             probe.deassert_srst()
 
         # Monitor indefinitely.
-        read_data(f, probe)
+        recorder.record()
+    except KeyboardInterrupt:
+        print()
+    finally:
+        recorder.stop()
+        probe.stop_current_monitoring()
+        recorder.drain(timeout=0)
+        writer.close()
+        print('Recorded %u buffers, %u missed, %u dropped.' %
+              (recorder.nbufs, recorder.nmissed, recorder.ndropped))
 
 
 def _main():
@@ -0,0 +1,252 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import os
+
+import btype
+import numpy as np
+
+from .xtswd import IMON_DTYPE
+
+
+LEGACY_SIG = 0x4e4f4d49     # 'IMON'
+FILE_SIG   = 0x324e4d49     # 'IMN2'
+
+# Approximate number of samples summed at a time by IMonFile.mean().
+MEAN_CHUNK_SAMPLES = 1 << 20
+
+
+class Header(btype.Struct):
+    '''
+    Header of the original IMon file format, which is simply followed by the
+    raw 16-bit samples of every buffer received, with no record of any
+    buffers that were missed.
+    '''
+    sig             = btype.uint32_t(LEGACY_SIG)
+    freq_num        = btype.uint32_t()
+    freq_denom      = btype.uint32_t()
+    oversample_log2 = btype.uint8_t()
+    rsrv            = btype.Array(btype.uint8_t(), 3)
+    _EXPECTED_SIZE  = 16
+
+
+class FileHeader(btype.Struct):
+    '''
+    Header of the chunked IMon file format.  The header is followed by a
+    sequence of fixed-size chunks, each of which is an IMon buffer exactly as
+    received from the probe (an IMON_DTYPE record, including the buffer
+    sequence number), so the chunks can be memory-mapped as a NumPy array.
+
+    When the file is closed the writer appends an index holding the buffer
+    number of every chunk as a uint64, where buffer numbers count buffers
+    since the first one in the file with sequence-number wraparound removed,
+    and records its offset and the chunk count in the header.  Gaps in the
+    buffer numbers are buffers that were lost.  A file that was never closed
+    has an index_offset of 0; readers then rebuild the index from the chunk
+    sequence numbers.
+    '''
+    sig             = btype.uint32_t(FILE_SIG)
+    version         = btype.uint32_t(1)
+    hdr_size        = btype.uint32_t(64)
+    chunk_size      = btype.uint32_t(IMON_DTYPE.itemsize)
+    chunk_samples   = btype.uint32_t(IMON_DTYPE['samples'].shape[0])
+    freq_num        = btype.uint32_t()
+    freq_denom      = btype.uint32_t()
+    oversample_log2 = btype.uint8_t()
+    rsrv            = btype.Array(btype.uint8_t(), 3)
+    nchunks         = btype.uint64_t()
+    index_offset    = btype.uint64_t()
+    first_seq       = btype.uint64_t()
+    rsrv2           = btype.Array(btype.uint8_t(), 8)
+    _EXPECTED_SIZE  = 64
+
+
+def unwrap_seqs(seqs, first_seq):
+    '''
+    Converts an array of 32-bit buffer sequence numbers into buffer numbers
+    relative to first_seq, removing wraparound.
+    '''
+    deltas = np.diff(seqs.astype(np.int64), prepend=first_seq) & 0xFFFFFFFF
+    return np.cumsum(deltas, dtype=np.uint64)
+
+
+class IMonWriter:
+    '''
+    Writes IMon buffers to a chunked IMon file.  The header is written when
+    the first buffer arrives, since that is where the sample frequency comes
+    from.  The buffers passed to write() must be an IMON_DTYPE array.
+    '''
+    def __init__(self, path):
+        self.f        = open(path, 'wb')
+        self.hdr      = None
+        self.last_seq = None
+        self.index    = []
+        self.buf_num  = 0
+
+    def write(self, bufs):
+        if not len(bufs):
+            return
+
+        if self.hdr is None:
+            b0       = bufs[0]
+            self.hdr = FileHeader(freq_num=int(b0['freq_num']),
+                                  freq_denom=int(b0['freq_denom']),
+                                  oversample_log2=int(b0['oversample_log2']),
+                                  nchunks=0, index_offset=0,
+                                  first_seq=int(b0['seq']))
+            self.last_seq = int(b0['seq'])
+            self.f.write(self.hdr.pack())
+
+        buf_nums = unwrap_seqs(bufs['seq'], self.last_seq) + self.buf_num
+        self.index.append(buf_nums)
+        self.buf_num  = int(buf_nums[-1])
+        self.last_seq = int(bufs['seq'][-1])
+        self.hdr.nchunks += len(bufs)
+        self.f.write(bufs.tobytes())
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        '''
+        Appends the index, finalizes the header and closes the file.
+        '''
+        if self.hdr is not None:
+            self.hdr.index_offset = self.f.tell()
+            for buf_nums in self.index:
+                self.f.write(buf_nums.astype('<u8').tobytes())
+            self.f.seek(0)
+            self.f.write(self.hdr.pack())
+        self.f.close()
+
+
+class IMonFile:
+    '''
+    Read-only, memory-mapped view of an IMon file in either the chunked or
+    the original format.  The samples are presented as a timeline of
+    nsamples samples, in which lost buffers are gaps of missing samples.
+    Nothing is read from disk until the samples are accessed.
+    '''
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            data = f.read(FileHeader._STRUCT.size)
+        size = os.path.getsize(path)
+
+        sig, = np.frombuffer(data[:4], dtype='<u4')
+        if sig == LEGACY_SIG:
+            hdr = Header.unpack(data[:Header._STRUCT.size])
+            self.chunk_samples   = (size - Header._STRUCT.size) // 2
+            self.chunks          = None
+            self.buf_nums        = np.zeros(1, dtype=np.uint64)
+            self.segments        = [(0, np.memmap(path, dtype='<u2', mode='r',
+                                                  offset=Header._STRUCT.size,
+                                                  shape=(1,
+                                                         self.chunk_samples)))]
+            self.nsamples        = self.chunk_samples
+        elif sig == FILE_SIG:
+            hdr = FileHeader.unpack(data)
+            assert hdr.chunk_size == IMON_DTYPE.itemsize
+            self.chunk_samples = hdr.chunk_samples
+            nchunks            = hdr.nchunks
+            if not hdr.index_offset:
+                nchunks = (size - hdr.hdr_size) // hdr.chunk_size
+            self.chunks = np.memmap(path, dtype=IMON_DTYPE, mode='r',
+                                    offset=hdr.hdr_size, shape=(nchunks,))
+            if hdr.index_offset:
+                self.buf_nums = np.memmap(path, dtype='<u8', mode='r',
+                                          offset=hdr.index_offset,
+                                          shape=(nchunks,))
+            else:
+                self.buf_nums = unwrap_seqs(self.chunks['seq'], hdr.first_seq)
+            self.segments = self._find_segments()
+            self.nsamples = (int(self.buf_nums[-1]) + 1 if nchunks else
+                             0) * self.chunk_samples
+        else:
+            raise Exception('%s: not an IMon file.' % path)
+
+        self.freq_num        = hdr.freq_num
+        self.freq_denom      = hdr.freq_denom
+        self.oversample_log2 = hdr.oversample_log2
+        self.f               = hdr.freq_num / hdr.freq_denom
+
+    def _find_segments(self):
+        '''
+        Returns a list of (start_sample, samples) tuples for each run of
+        consecutive buffers, where samples is a 2-D memory-mapped view with
+        one row per buffer.
+        '''
+        if not len(self.buf_nums):
+            return []
+
+        breaks = np.flatnonzero(np.diff(self.buf_nums.astype(np.int64)) != 1)
+        starts = np.concatenate(([0], breaks + 1))
+        ends   = np.concatenate((breaks + 1, [len(self.buf_nums)]))
+        return [(int(self.buf_nums[s]) * self.chunk_samples,
+                 self.chunks['samples'][s:e])
+                for s, e in zip(starts, ends)]
+
+    @property
+    def nlost(self):
+        '''
+        Returns the number of samples lost to missed buffers.
+        '''
+        return self.nsamples - sum(s.size for _, s in self.segments)
+
+    def gaps(self):
+        '''
+        Returns a list of (start_sample, nsamples) tuples for each gap in the
+        timeline.
+        '''
+        gaps = []
+        pos  = 0
+        for start, samples in self.segments:
+            if start > pos:
+                gaps.append((pos, start - pos))
+            pos = start + samples.size
+        return gaps
+
+    def read(self, start, count, fill=np.nan):
+        '''
+        Returns count samples of the timeline starting at the specified
+        sample, scaled down by the oversampling factor, as a float64 array.
+        Samples that fall in gaps or past the end are set to fill.  Only the
+        buffers that overlap the requested range are read from disk.
+        '''
+        out = np.full(count, fill, dtype=np.float64)
+        end = start + count
+        for seg_start, samples in self.segments:
+            rows, row_len = samples.shape
+            seg_end       = seg_start + rows * row_len
+            s             = max(start, seg_start)
+            e             = min(end, seg_end)
+            if s >= e:
+                continue
+
+            r0 = (s - seg_start) // row_len
+            r1 = (e - seg_start + row_len - 1) // row_len
+            v  = samples[r0:r1].reshape(-1)
+            o  = seg_start + r0 * row_len
+            out[s - start:e - start] = v[s - o:e - o]
+
+        return out / (1 << self.oversample_log2)
+
+    def mean(self, chunk_samples=MEAN_CHUNK_SAMPLES):
+        '''
+        Returns the mean of all the samples that weren't lost, scaled down by
+        the oversampling factor, or NaN if there are none.  The samples are
+        summed about chunk_samples at a time so that the whole file never has
+        to be in memory at once.
+        '''
+        total = 0
+        n     = 0
+        for _, samples in self.segments:
+            rows, row_len = samples.shape
+            nrows         = max(1, chunk_samples // row_len)
+            ncols         = min(row_len, chunk_samples)
+            for r in range(0, rows, nrows):
+                for c in range(0, row_len, ncols):
+                    block  = samples[r:r + nrows, c:c + ncols]
+                    total += int(block.sum(dtype=np.uint64))
+                    n     += block.size
+        if not n:
+            return np.nan
+        return total / n / (1 << self.oversample_log2)
@@ -0,0 +1,191 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import os
+
+import btype
+import numpy as np
+
+
+PYRAMID_SIG = 0x52595049    # 'IPYR'
+MAX_LEVELS  = 16
+
+# Level 1 of the pyramid holds the min and max of every BASE_BLOCK samples;
+# each level above that holds the min and max of FACTOR blocks of the level
+# below it.  Levels are built until they have fewer than FACTOR blocks.
+BASE_BLOCK = 64
+FACTOR     = 8
+
+# Number of level-1 blocks computed per pass while building the pyramid,
+# which bounds the memory used to BUILD_BLOCKS * BASE_BLOCK float64 samples.
+BUILD_BLOCKS = 65536
+
+BLOCK_DTYPE = np.dtype([('min', '<f4'), ('max', '<f4')])
+
+
+class PyramidHeader(btype.Struct):
+    sig            = btype.uint32_t(PYRAMID_SIG)
+    version        = btype.uint32_t(1)
+    base_block     = btype.uint32_t(BASE_BLOCK)
+    factor         = btype.uint32_t(FACTOR)
+    src_size       = btype.uint64_t()
+    src_mtime_ns   = btype.uint64_t()
+    nsamples       = btype.uint64_t()
+    nlevels        = btype.uint32_t()
+    rsrv           = btype.uint32_t()
+    level_len      = btype.Array(btype.uint64_t(), MAX_LEVELS)
+    _EXPECTED_SIZE = 176
+
+
+def _reduce(blocks, factor):
+    '''
+    Reduces an array of BLOCK_DTYPE blocks by the specified factor, padding
+    the last partial group.  Empty blocks hold NaN and are ignored unless the
+    whole group is empty.
+    '''
+    n    = -(-len(blocks) // factor)
+    mins = np.full(n * factor, np.nan, dtype=np.float32)
+    maxs = np.full(n * factor, np.nan, dtype=np.float32)
+    mins[:len(blocks)] = blocks['min']
+    maxs[:len(blocks)] = blocks['max']
+
+    out        = np.empty(n, dtype=BLOCK_DTYPE)
+    out['min'] = np.fmin.reduce(mins.reshape(n, factor), axis=1)
+    out['max'] = np.fmax.reduce(maxs.reshape(n, factor), axis=1)
+    return out
+
+
+class IMonPyramid:
+    '''
+    Multi-resolution min/max index over the samples of an IMonFile, stored in
+    a sidecar file next to the IMon file and memory-mapped when used.  The
+    sidecar records the size and modification time of the IMon file and is
+    rebuilt automatically if they no longer match, for instance because a
+    recording was still in progress.  Building streams over the IMon file a
+    slice at a time, so memory use doesn't depend on the capture length.
+
+    fetch() returns the data for a time range at the coarsest resolution
+    that still gives at least the requested number of points, so a viewer
+    only ever touches about as many blocks as it has pixels.
+    '''
+    def __init__(self, imf, path=None, verbose=False):
+        self.imf    = imf
+        self.path   = path or imf.path + '.pyr'
+        self.levels = None
+        st          = os.stat(imf.path)
+        if not self._load(st):
+            self._build(st, verbose)
+            self._load(st)
+
+    def _load(self, st):
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read(PyramidHeader._STRUCT.size)
+        except OSError:
+            return False
+        if len(data) != PyramidHeader._STRUCT.size:
+            return False
+
+        hdr = PyramidHeader.unpack(data)
+        if (hdr.sig != PYRAMID_SIG or hdr.base_block != BASE_BLOCK or
+                hdr.factor != FACTOR or hdr.src_size != st.st_size or
+                hdr.src_mtime_ns != st.st_mtime_ns or
+                hdr.nsamples != self.imf.nsamples):
+            return False
+
+        self.levels = []
+        offset      = PyramidHeader._STRUCT.size
+        for n in hdr.level_len[:hdr.nlevels]:
+            self.levels.append(np.memmap(self.path, dtype=BLOCK_DTYPE,
+                                         mode='r', offset=offset,
+                                         shape=(n,)) if n else
+                               np.empty(0, dtype=BLOCK_DTYPE))
+            offset += n * BLOCK_DTYPE.itemsize
+        return True
+
+    def _build_level1(self, f, verbose):
+        nsamples = self.imf.nsamples
+        step     = BUILD_BLOCKS * BASE_BLOCK
+        n        = 0
+        for start in range(0, nsamples, step):
+            count = min(step, nsamples - start)
+            nb    = -(-count // BASE_BLOCK)
+            v     = np.full(nb * BASE_BLOCK, np.nan)
+            v[:count] = self.imf.read(start, count)
+            v = v.reshape(nb, BASE_BLOCK)
+
+            blocks        = np.empty(nb, dtype=BLOCK_DTYPE)
+            blocks['min'] = np.fmin.reduce(v, axis=1)
+            blocks['max'] = np.fmax.reduce(v, axis=1)
+            f.write(blocks.tobytes())
+            n += nb
+            if verbose:
+                print('Indexing %s: %.1f%%' %
+                      (self.imf.path, 100 * (start + count) / nsamples))
+        return n
+
+    def _build(self, st, verbose):
+        hdr = PyramidHeader(src_size=st.st_size,
+                            src_mtime_ns=st.st_mtime_ns,
+                            nsamples=self.imf.nsamples, nlevels=0, rsrv=0,
+                            level_len=[0]*MAX_LEVELS)
+        tmp = '%s.%u.tmp' % (self.path, os.getpid())
+        with open(tmp, 'w+b') as f:
+            f.write(hdr.pack())
+            level_len    = [self._build_level1(f, verbose)]
+            level_offset = PyramidHeader._STRUCT.size
+            while level_len[-1] >= FACTOR and len(level_len) < MAX_LEVELS:
+                # Reduce the previous level a slice at a time.
+                f.flush()
+                prev = np.memmap(f, dtype=BLOCK_DTYPE, mode='r',
+                                 offset=level_offset, shape=(level_len[-1],))
+                f.seek(0, os.SEEK_END)
+                n    = 0
+                step = BUILD_BLOCKS * FACTOR
+                for start in range(0, len(prev), step):
+                    blocks = _reduce(prev[start:start + step], FACTOR)
+                    f.write(blocks.tobytes())
+                    n += len(blocks)
+                level_offset += level_len[-1] * BLOCK_DTYPE.itemsize
+                level_len.append(n)
+                del prev
+
+            hdr.nlevels   = len(level_len)
+            hdr.level_len = level_len + [0]*(MAX_LEVELS - len(level_len))
+            f.seek(0)
+            f.write(hdr.pack())
+        os.replace(tmp, self.path)
+
+    def block_size(self, level):
+        '''
+        Returns the number of samples summarized by each block of a level;
+        level 0 is the raw samples.
+        '''
+        return BASE_BLOCK * FACTOR**(level - 1) if level else 1
+
+    def fetch(self, start, end, npoints):
+        '''
+        Returns a (level, first_sample, mins, maxs) tuple covering the
+        samples from start up to end at the coarsest level that still has at
+        least npoints blocks in that range.  At level 0 the mins and maxs are
+        both the raw samples.  Gaps in the capture are NaN.
+        '''
+        start = max(0, int(start))
+        end   = min(self.imf.nsamples, int(end))
+        if end <= start:
+            empty = np.empty(0)
+            return 0, start, empty, empty
+
+        level = 0
+        for lvl in range(len(self.levels), 0, -1):
+            if (end - start) // self.block_size(lvl) >= npoints:
+                level = lvl
+                break
+
+        if level == 0:
+            v = self.imf.read(start, end - start)
+            return 0, start, v, v
+
+        bs     = self.block_size(level)
+        b0     = start // bs
+        b1     = -(-end // bs)
+        blocks = self.levels[level - 1][b0:b1]
+        return level, b0 * bs, blocks['min'], blocks['max']
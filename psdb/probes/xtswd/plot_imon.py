@@ -2,24 +2,19 @@
 # Copyright (c) 2021-2022 by Phase Advanced Sensor Systems, Inc.
 # All rights reserved.
 import argparse
-import struct
 
 import matplotlib
 import matplotlib.pyplot as plt
+import numpy as np
 
-from .imon import Header
+from .imon_file import IMonFile
+from .imon_pyramid import IMonPyramid
 
 
 matplotlib.rcParams['lines.linewidth'] = 1
 matplotlib.rcParams['lines.markersize'] = 1
 
 
-class Point:
-    def __init__(self, t, v):
-        self.t = t
-        self.v = v
-
-
 # Approximate ADC-to-mA ratio for prototype board.
 # TODO: Get this from calibration flash.
 MA_RATIO = 11.047
@@ -31,27 +26,66 @@ def interpolate_color(begin, end, p):
             p*end[2] + (1-p)*begin[2])
 
 
-def plot_imon_data(plots, labels, i_max, t_max):
-    # Make the plot
+class IMonTrace:
+    '''
+    One IMon file displayed in a plot.  The plotted line only ever holds
+    about as many points as the axes are wide in pixels: whenever the x
+    limits change, the visible range is refetched from the file's min/max
+    pyramid at the matching resolution and drawn as an envelope that
+    alternates between each block's minimum and maximum.
+    '''
+    def __init__(self, ax, imf, pyramid, tdelta, label, color):
+        self.ax      = ax
+        self.imf     = imf
+        self.pyramid = pyramid
+        self.tdelta  = tdelta
+        self.period  = imf.freq_denom / imf.freq_num
+        self.line,   = ax.plot([], [], label=label, color=color)
+
+    def update(self, t0, t1, npoints):
+        start = (t0 - self.tdelta) / self.period
+        end   = (t1 - self.tdelta) / self.period
+        level, first, mins, maxs = self.pyramid.fetch(start - 1, end + 1,
+                                                      npoints)
+        bs = self.pyramid.block_size(level)
+        ts = (first + np.arange(len(mins)) * bs) * self.period + self.tdelta
+        if level:
+            ts   = np.repeat(ts, 2)
+            vals = np.column_stack((mins, maxs)).reshape(-1)
+        else:
+            vals = mins
+        self.line.set_data(ts, vals / MA_RATIO)
+
+
+def plot_imon_data(traces, i_max, t_max):
     fig = plt.figure(figsize=(12.5, 7))
     fig.suptitle('Current Consumption')
 
     # Do the time plot.
     ax = fig.add_subplot(111)
-    ax.set_xlim(0, t_max)
     ax.set_ylim(0, i_max)
     ax.set_ylabel('mA')
     ax.set_xlabel('Time')
     ax.format_coord = lambda x, y: 'T=%.10f, mA=%.10f' % (x, y)
 
-    # Add data points from each file.
+    # Add a line for each file.
     white_color   = (1., 1., 1.)
     newest_color  = (0, 0.25, 0.5)
-    for i, points in enumerate(plots):
-        color = interpolate_color(white_color, newest_color, (i + 1)/len(plots))
-        ts   = [p.t for p in points]
-        vals = [p.v for p in points]
-        ax.plot(ts, vals, label=labels[i], color=color)
+    lines         = []
+    for i, (imf, pyramid, tdelta, label) in enumerate(traces):
+        color = interpolate_color(white_color, newest_color,
+                                  (i + 1)/len(traces))
+        lines.append(IMonTrace(ax, imf, pyramid, tdelta, label, color))
+
+    def update(ax):
+        t0, t1  = ax.get_xlim()
+        npoints = int(ax.get_window_extent().width)
+        for t in lines:
+            t.update(t0, t1, npoints)
+        ax.figure.canvas.draw_idle()
+
+    ax.callbacks.connect('xlim_changed', update)
+    ax.set_xlim(0, t_max)
     ax.legend()
 
     # Display the plot.
@@ -59,32 +93,23 @@ def plot_imon_data(plots, labels, i_max, t_max):
 
 
 def main(rv):
-    plots = []
-    t_max = 0
+    traces = []
+    t_max  = 0
     for fname in rv.imon_files:
         fname, _, tdelta = fname.partition(':')
         if tdelta:
             tdelta = float(tdelta)
         else:
             tdelta = 0
-        with open(fname, 'rb') as f:
-            data = f.read()
-        hdr  = Header.unpack(data[:Header._STRUCT.size])
-        data = data[Header._STRUCT.size:]
-        f    = hdr.freq_num / hdr.freq_denom
-        ovr  = (1 << hdr.oversample_log2)
-
-        vals = struct.unpack('<%uH' % (len(data) // 2), data)
-        vals = [v / ovr for v in vals]
-        print('%s: Iavg ADC = %s' % (fname, sum(vals) / len(vals)))
-        vals = [v / MA_RATIO for v in vals]
-        ts   = [i * hdr.freq_denom / hdr.freq_num for i in range(len(vals))]
-        t_max = max(t_max, ts[-1])
-
-        points = [Point(t + tdelta, v) for t, v in zip(ts, vals)]
-        plots.append(points)
-
-    plot_imon_data(plots, rv.imon_files, rv.i_max, t_max)
+        imf     = IMonFile(fname)
+        pyramid = IMonPyramid(imf, verbose=True)
+        print('%s: Iavg ADC = %s, %u samples, %u lost' %
+              (fname, imf.mean(), imf.nsamples, imf.nlost))
+        t_max = max(t_max, imf.nsamples * imf.freq_denom / imf.freq_num +
+                    tdelta)
+        traces.append((imf, pyramid, tdelta, fname))
+
+    plot_imon_data(traces, rv.i_max, t_max)
 
 
 def _main():
@@ -1,6 +1,9 @@
 # Copyright (c) 2022 Phase Advanced Sensor Systems, Inc.
 from enum import IntEnum
+import array
+import collections
 import random
+import time
 import usb.util
 
 import btype
@@ -17,6 +20,10 @@ TRACE_EN   = False
 # Approximate ADC-to-mA ratio for prototype board.
 MA_RATIO = 11.047
 
+# Default number of commands that we allow to be outstanding on the probe at
+# any one time.  A depth of 1 gives fully-synchronous behavior.
+PIPELINE_DEPTH = 4
+
 
 def trace(msg):
     if TRACE_EN:
@@ -73,6 +80,14 @@ class Opcode(IntEnum):
     BAD_OPCODE  = 0xCCCC
 
 
+# Opcodes used to implement single-register reads of various widths.
+READ_OPCODES = {
+    1 : Opcode.READ8,
+    2 : Opcode.READ16,
+    4 : Opcode.READ32,
+}
+
+
 class Command(btype.Struct):
     opcode         = btype.uint16_t()
     tag            = btype.uint16_t()
@@ -107,18 +122,34 @@ class IMonData(btype.Struct):
     _EXPECTED_SIZE  = 20016
 
 
+# NumPy layout of an IMonData buffer, used to decode buffers without copying
+# them and to memory-map recorded IMon files.
+IMON_DTYPE = np.dtype([('tag',              '<u2'),
+                       ('oversample_log2',  'u1'),
+                       ('rsrv',             'u1'),
+                       ('seq',              '<u4'),
+                       ('freq_num',         '<u4'),
+                       ('freq_denom',       '<u4'),
+                       ('samples',          '<u2', (10000,)),
+                       ])
+assert IMON_DTYPE.itemsize == IMonData._EXPECTED_SIZE
+
+
 class Stats:
-    def __init__(self, rsp):
+    def __init__(self, rsp, xact_stats=None):
         self.nreads       = rsp.params[0]
         self.nread_waits  = rsp.params[1]
         self.nwrites      = rsp.params[2]
         self.nwrite_waits = rsp.params[3]
+        self.xact_stats   = xact_stats
 
     def dump(self):
         print('      nreads: %u' % self.nreads)
         print(' nread_waits: %u' % self.nread_waits)
         print('     nwrites: %u' % self.nwrites)
         print('nwrite_waits: %u' % self.nwrite_waits)
+        if self.xact_stats is not None:
+            self.xact_stats.dump()
 
 
 class XTSWDCommandException(psdb.ProbeException):
@@ -129,18 +160,74 @@ class XTSWDCommandException(psdb.ProbeException):
         self.rx_data = rx_data
 
 
+class XTSWDSyncException(psdb.ProbeException):
+    def __init__(self, rsp, transaction):
+        super().__init__(
+            'Response tag 0x%04X does not match outstanding command tag '
+            '0x%04X (%s)' % (rsp.tag, transaction.tag, rsp))
+        self.rsp         = rsp
+        self.transaction = transaction
+
+
+class Transaction:
+    '''
+    A command that has been posted to the probe.  The probe executes commands
+    in the order they were posted, so the response for a Transaction is only
+    retrieved once the responses for all earlier Transactions have been
+    retrieved.  Invoking result() will block until the response arrives and
+    then either return the (Response, rx_data) tuple or raise the exception
+    that the command generated.  If a destination buffer was supplied, the
+    received data is placed directly into it and rx_data is the buffer.
+    '''
+    def __init__(self, probe, opcode, tag, rx_len, timeout, dst=None):
+        self.probe     = probe
+        self.opcode    = opcode
+        self.tag       = tag
+        self.rx_len    = rx_len
+        self.timeout   = timeout
+        self.dst       = dst
+        self.rsp       = None
+        self.rx_data   = None
+        self.exception = None
+        self.tx_len    = 0
+        self.t0        = None
+        self.source    = None
+
+    def done(self):
+        return self.rsp is not None or self.exception is not None
+
+    def result(self):
+        while not self.done():
+            self.probe._retire_transaction()
+        if self.exception:
+            raise self.exception
+        return self.rsp, self.rx_data
+
+
 class XTSWD(usb_probe.Probe):
+    '''
+    XTSWD debug probe.  Every command sent to the probe carries a 16-bit tag
+    that is echoed back in the response, and the probe executes commands in
+    the order that they are received.  This allows us to keep several
+    commands in flight at once so that the USB round-trip latency of one
+    command overlaps the SWD execution of the next one; the responses are
+    then retired in order and matched against the outstanding commands by
+    their tags.  The pipeline_depth argument limits the number of commands
+    that may be outstanding at any one time.
+    '''
     NAME    = 'XTSWD'
     RSP_EP  = 0x81
     CMD_EP  = 0x02
     IMON_EP = 0x83
 
-    def __init__(self, usb_dev, **kwargs):
+    def __init__(self, usb_dev, pipeline_depth=PIPELINE_DEPTH, **kwargs):
         super().__init__(usb_dev, bConfigurationValue=0x30, **kwargs)
-        self.tag         = random.randint(0, 65535)
-        self.imon_tag    = None
-        self.git_sha1    = usb.util.get_string(usb_dev, 6)
-        self.njunk_bytes = self._synchronize()
+        self.tag            = random.randint(0, 65535)
+        self.imon_tag       = None
+        self.pipeline_depth = max(pipeline_depth, 1)
+        self.transactions   = collections.deque()
+        self.git_sha1       = usb.util.get_string(usb_dev, 6)
+        self.njunk_bytes    = self._synchronize()
 
         # Stop current monitoring in case it had been started previously.
         self.stop_current_monitoring()
@@ -186,41 +273,145 @@ class XTSWD(usb_probe.Probe):
         self.tag = (self.tag + 1) & 0xFFFF
         return tag
 
-    def _exec_command(self, opcode, params=None, bulk_data=b'', timeout=1000,
-                      rx_len=0):
+    def _post_command(self, opcode, params=None, bulk_data=b'', timeout=1000,
+                      rx_len=0, dst=None):
+        '''
+        Sends a command to the probe without waiting for its response and
+        returns the Transaction tracking it.  If the pipeline is already full,
+        the oldest outstanding responses are retired first.
+        '''
         if not params:
             params = [0, 0, 0, 0, 0, 0, 0]
         elif len(params) < 7:
             params = params + [0]*(7 - len(params))
 
+        while len(self.transactions) >= self.pipeline_depth:
+            self._retire_transaction()
+
         tag  = self._alloc_tag()
         cmd  = Command(opcode=opcode, tag=tag, params=params)
         data = cmd.pack()
+        t0   = time.perf_counter()
         size = self.usb_dev.write(self.CMD_EP, data + bulk_data,
                                   timeout=timeout)
         assert size == len(data) + len(bulk_data)
 
-        data = self.usb_dev.read(self.RSP_EP, Response._STRUCT.size + rx_len,
-                                 timeout=timeout)
+        t = Transaction(self, opcode, tag, rx_len, timeout, dst=dst)
+        if self.xact_stats is not None:
+            t.tx_len = size
+            t.t0     = t0
+            t.source = self.xact_stats.source()
+        self.transactions.append(t)
+        return t
+
+    def _retire_transaction(self):
+        '''
+        Reads the response for the oldest outstanding Transaction and stores
+        the result in it.  Command failures are recorded in the Transaction
+        and raised when its result is requested; a response whose tag doesn't
+        match means we have lost synchronization with the probe and is raised
+        immediately.
+
+        If transaction statistics are enabled, the command is recorded under
+        its opcode name with its latency measured from when it was posted, so
+        for pipelined commands this includes time spent queued behind the
+        commands posted before it.
+
+        If reading the response fails in any other way (a USB error or a
+        loss of synchronization), none of the outstanding responses can be
+        trusted any more: every outstanding Transaction is failed with the
+        same exception, the connection is resynchronized so that the next
+        command doesn't read a stale response, and the exception is raised.
+        '''
+        t = self.transactions.popleft()
+        try:
+            self._read_response(t)
+        except Exception as e:
+            self._abort_transactions([t] + list(self.transactions), e)
+            raise
+
+    def _abort_transactions(self, transactions, exception):
+        self.transactions.clear()
+        for t in transactions:
+            t.exception = exception
+        try:
+            self.njunk_bytes += self._synchronize()
+        except Exception:
+            pass
+
+    def _read_response(self, t):
+        data = self.usb_dev.read(self.RSP_EP, Response._STRUCT.size + t.rx_len,
+                                 timeout=t.timeout)
         assert len(data) >= Response._STRUCT.size
 
-        rsp = Response.unpack(
+        rx_len = len(data) - Response._STRUCT.size
+        rsp    = Response.unpack(
                 data[-Response._STRUCT.size:])          # pylint: disable=E1130
-        rx_data = bytes(data[:-Response._STRUCT.size])  # pylint: disable=E1130
-        assert rsp.tag == tag
-
+        if t.t0 is not None and self.xact_stats is not None:
+            self.xact_stats.record(Opcode(t.opcode).name,
+                                   time.perf_counter() - t.t0, t.tx_len,
+                                   len(data), source=t.source,
+                                   error=(rsp.tag != t.tag or
+                                          rsp.status != Status.OK))
+        if rsp.tag != t.tag:
+            raise XTSWDSyncException(rsp, t)
+
+        t.rsp = rsp
         if rsp.status != Status.OK:
-            rsp.opcode = Opcode(rsp.opcode)
-            raise XTSWDCommandException(rsp, rx_data)
+            t.rx_data   = bytes(data[:rx_len])
+            rsp.opcode  = Opcode(rsp.opcode)
+            t.exception = XTSWDCommandException(rsp, t.rx_data)
+            return
+
+        assert rx_len == t.rx_len
+        if t.dst is not None:
+            t.dst[:]  = memoryview(data)[:rx_len]
+            t.rx_data = t.dst
+        else:
+            t.rx_data = bytes(data[:rx_len])
+
+    @staticmethod
+    def _gather(transactions):
+        '''
+        Waits for every Transaction in the list to complete and returns the
+        list of (Response, rx_data) tuples.  If any of the commands failed,
+        the exception from the first failure is raised after all of them have
+        completed.
+        '''
+        results   = []
+        exception = None
+        for t in transactions:
+            try:
+                results.append(t.result())
+            except XTSWDCommandException as e:
+                exception = exception or e
+        if exception:
+            raise exception
+        return results
 
-        assert len(rx_data) == rx_len
-        return rsp, rx_data
+    def _exec_command(self, opcode, params=None, bulk_data=b'', timeout=1000,
+                      rx_len=0):
+        t = self._post_command(opcode, params=params, bulk_data=bulk_data,
+                               timeout=timeout, rx_len=rx_len)
+        return t.result()
 
-    def _bulk_read(self, addr, n, word_size, ap_num=0):
+    def _post_bulk_read(self, addr, n, word_size, ap_num=0, dst=None):
         trace('BULK READ%u: 0x%08X len %u' % (word_size, addr, n*word_size))
-        _, data = self._exec_command(Opcode.BULK_READ,
-                                     [ap_num, addr, n, word_size],
-                                     rx_len=n*word_size)
+        return self._post_command(Opcode.BULK_READ,
+                                  [ap_num, addr, n, word_size],
+                                  rx_len=n*word_size, dst=dst)
+
+    def _post_bulk_write(self, data, addr, word_size, ap_num=0):
+        trace('BULK WRITE%u: 0x%08X len %u' % (word_size, addr, len(data)))
+        assert len(data) % word_size == 0
+        n = len(data) // word_size
+        return self._post_command(Opcode.BULK_WRITE,
+                                  [ap_num, addr, n, word_size],
+                                  bulk_data=bytes(data))
+
+    def _bulk_read(self, addr, n, word_size, ap_num=0):
+        _, data = self._post_bulk_read(addr, n, word_size,
+                                       ap_num=ap_num).result()
         return data
 
     def _bulk_read_8(self, addr, n, ap_num=0):
@@ -233,11 +424,7 @@ class XTSWD(usb_probe.Probe):
         return self._bulk_read(addr, n, 4, ap_num=ap_num)
 
     def _bulk_write(self, data, addr, word_size, ap_num=0):
-        trace('BULK WRITE%u: 0x%08X len %u' % (word_size, addr, len(data)))
-        assert len(data) % word_size == 0
-        n = len(data) // word_size
-        self._exec_command(Opcode.BULK_WRITE, [ap_num, addr, n, word_size],
-                           bulk_data=data)
+        self._post_bulk_write(data, addr, word_size, ap_num=ap_num).result()
 
     def _bulk_write_8(self, data, addr, ap_num=0):
         self._bulk_write(data, addr, 1, ap_num=ap_num)
@@ -248,12 +435,61 @@ class XTSWD(usb_probe.Probe):
     def _bulk_write_32(self, data, addr, ap_num=0):
         self._bulk_write(data, addr, 4, ap_num=ap_num)
 
+    def read_bulk_into(self, addr, buf, ap_num=0):
+        '''
+        Bulk read that posts the BULK_READ command for every TAR page up front
+        so that the transfers are pipelined through the probe.  Each response
+        is copied straight into its slice of the buffer.
+        '''
+        mv = memoryview(buf).cast('B')
+        ts = [self._post_bulk_read(span_addr, n, word_size, ap_num=ap_num,
+                                   dst=mv[offset:offset + n*word_size])
+              for span_addr, offset, n, word_size
+              in self._bulk_spans(addr, len(mv))]
+        self._gather(ts)
+
+    def write_bulk(self, data, addr, ap_num=0):
+        '''
+        Bulk write that posts the BULK_WRITE command for every TAR page up
+        front so that the transfers are pipelined through the probe.
+        '''
+        if not data:
+            return
+
+        mv = memoryview(data)
+        ts = [self._post_bulk_write(mv[offset:offset + n*word_size], span_addr,
+                                    word_size, ap_num=ap_num)
+              for span_addr, offset, n, word_size
+              in self._bulk_spans(addr, len(mv))]
+        self._gather(ts)
+
+    def exec_cmd_list(self, cmd_list):
+        '''
+        Posts a read command for every ReadCommand in the list before waiting
+        for any of the responses, so that the whole list costs roughly one USB
+        round-trip per pipeline_depth commands.
+        '''
+        ts = []
+        for cmd in cmd_list:
+            if not isinstance(cmd, psdb.devices.ReadCommand):
+                raise Exception('Unrecognized command: %s' % cmd)
+            assert cmd.ap.db == self
+            opcode = READ_OPCODES.get(cmd.size)
+            if opcode is None:
+                raise Exception('Illegal size %u in cmd list.' % cmd.size)
+            trace('READ%u 0x%08X' % (cmd.size * 8, cmd.addr))
+            ts.append(self._post_command(opcode, [cmd.ap.ap_num, cmd.addr]))
+        return [rsp.params[0] for rsp, _ in self._gather(ts)]
+
     def assert_srst(self):
         self._exec_command(Opcode.SET_SRST, [1])
 
     def deassert_srst(self):
         self._exec_command(Opcode.SET_SRST, [0])
 
+    def get_fw_version(self):
+        return self.git_sha1
+
     def _set_tck_freq(self, freq_hz):
         rsp, _ = self._exec_command(Opcode.SET_FREQ, [freq_hz])
         return rsp.params[0]
@@ -272,32 +508,47 @@ class XTSWD(usb_probe.Probe):
     def stop_current_monitoring(self):
         self._exec_command(Opcode.STOP_IMON)
 
-    def read_current_monitor_raw_data(self):
+    def read_current_monitor_buffer(self, buf, timeout=1000):
+        '''
+        Reads the next IMon buffer from the current monitoring session into
+        buf, which must be an array.array of IMON_DTYPE.itemsize bytes, and
+        returns it decoded in place as an IMON_DTYPE record.  Reusing the same
+        buf avoids allocating a new buffer for every read; the returned record
+        is only valid until buf is reused.
+        '''
+        rec = np.frombuffer(buf, dtype=IMON_DTYPE).view(np.recarray)[0]
         while True:
-            data = self.usb_dev.read(self.IMON_EP, IMonData._STRUCT.size,
-                                     timeout=1000)
-            idata = IMonData.unpack(data)
-            if idata.tag == self.imon_tag:
-                return idata, data[-20000:]
+            n = self.usb_dev.read(self.IMON_EP, buf, timeout=timeout)
+            if n == IMON_DTYPE.itemsize and rec.tag == self.imon_tag:
+                return rec
+
+    def _read_current_monitor_record(self):
+        return self.read_current_monitor_buffer(
+                array.array('B', bytes(IMON_DTYPE.itemsize)))
+
+    def read_current_monitor_raw_data(self):
+        '''
+        Returns the next IMon buffer and its raw little-endian sample bytes.
+        '''
+        idata = self._read_current_monitor_record()
+        return idata, idata.samples.tobytes()
 
     def read_current_monitor_data(self):
-        idata, _ = self.read_current_monitor_raw_data()
-        ovr      = (1 << idata.oversample_log2)
-        V        = np.array(idata.samples)
-        V        = V / ovr
-        V        = (53.8206644205 + 10.6461162703 * V) / 1000
+        idata = self._read_current_monitor_record()
+        V     = idata.samples / (1 << idata.oversample_log2)
+        V     = (53.8206644205 + 10.6461162703 * V) / 1000
         return idata, V
 
     def read_current_consumption(self):
         _, V = self.read_current_monitor_data()
-        return sum(V) / len(V)
+        return np.mean(V)
 
     def set_dac_drive(self, dac):
         self._exec_command(Opcode.SET_DDRIVE, [dac])
 
     def get_stats(self):
         rsp, _ = self._exec_command(Opcode.GET_STATS)
-        return Stats(rsp)
+        return Stats(rsp, xact_stats=self._take_xact_stats())
 
     def open_ap(self, ap_num):
         pass
@@ -316,6 +567,22 @@ class XTSWD(usb_probe.Probe):
     def write_ap_reg(self, ap_num, addr, value):
         self._exec_command(Opcode.WRITE_AP, [ap_num, addr, value])
 
+    def read_ap_idrs(self, ap_nums):
+        '''
+        Posts the IDR reads for all of the APs before waiting for any of the
+        responses, so that they are pipelined through the probe.
+        '''
+        ts   = [self._post_command(Opcode.READ_AP, [ap_num, 0xFC])
+                for ap_num in ap_nums]
+        idrs = []
+        for t in ts:
+            try:
+                rsp, _ = t.result()
+                idrs.append(rsp.params[0])
+            except XTSWDCommandException:
+                idrs.append(None)
+        return idrs
+
     def read_32(self, addr, ap_num=0):
         trace('READ32 0x%08X' % addr)
         rsp, _ = self._exec_command(Opcode.READ32, [ap_num, addr])
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import argparse
+import time
+import sys
+
+import psdb.probes
+import psdb.elf
+import psdb.trace
+
+
+def profile_pcsr(cpu, profile, rv):
+    sampler = psdb.trace.PCSRSampler(cpu, batch_size=rv.batch_size,
+                                     context=rv.context)
+    rate    = sampler.run(profile, rv.duration)
+    print('Sampled DWT_PCSR at %.0f samples/s.' % rate)
+
+
+def profile_swo(target, cpu, profile, rv):
+    collector       = psdb.trace.SWOCollector(profile)
+    f_traceclk      = psdb.trace.swo.get_traceclk(target, rv.traceclk_freq)
+    reader, decoder = psdb.trace.swo.start(target, cpu, collector, f_traceclk,
+                                           ports=0, timestamps=False,
+                                           pc_sampling=True,
+                                           exceptions=rv.context)
+    try:
+        t0 = time.time()
+        while time.time() - t0 < rv.duration:
+            reader.decode(decoder, timeout=0.1)
+    finally:
+        reader.stop()
+        dwt = cpu.devs['DWT']
+        dwt._CTRL.PCSAMPLENA = 0
+        dwt._CTRL.EXCTRCENA  = 0
+    print('Received %.0f PC samples/s over SWO.' %
+          (profile.total / rv.duration))
+
+
+def main(rv):
+    # Dump all debuggers if requested.
+    if rv.dump_debuggers:
+        psdb.probes.dump_probes()
+
+    # Probe the specified serial number (or find the default if no serial number
+    # was specified.
+    probe = psdb.probes.make_one_ns(rv)
+    f     = probe.set_tck_freq(rv.probe_freq)
+    print('Probing with SWD frequency at %.3f MHz' % (f/1.e6))
+
+    # Use the probe to detect a target platform.
+    target = probe.probe(verbose=rv.verbose, connect_under_reset=False)
+    f      = probe.set_max_target_tck_freq()
+    print('Set SWD frequency to %.3f MHz' % (f/1.e6))
+    cpu    = target.cpus[rv.cpu]
+    elf    = psdb.elf.ELFBinary.from_path(rv.elf) if rv.elf else None
+
+    # Profile with the target running.
+    target.resume()
+    profile = psdb.trace.Profile()
+    if rv.swo:
+        profile_swo(target, cpu, profile, rv)
+    else:
+        profile_pcsr(cpu, profile, rv)
+
+    profile.write_flat(sys.stdout, elf=elf, limit=rv.limit)
+    if rv.collapsed:
+        with open(rv.collapsed, 'w', encoding='utf8') as f:
+            profile.write_collapsed(f, elf=elf)
+
+
+def _main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dump-debuggers', '-d', action='store_true')
+    parser.add_argument('--usb-path')
+    parser.add_argument('--serial-num')
+    parser.add_argument('--probe-freq', type=int, default=1000000)
+    parser.add_argument('--max-tck-freq', type=int)
+    parser.add_argument('--verbose', '-v', action='store_true')
+    parser.add_argument('--cpu', type=int, default=0)
+    parser.add_argument('--elf')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--batch-size', type=int,
+                        default=psdb.trace.pcsample.DEFAULT_BATCH_SIZE)
+    parser.add_argument('--context', action='store_true')
+    parser.add_argument('--swo', action='store_true')
+    parser.add_argument('--traceclk-freq', type=int)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--collapsed')
+    rv = parser.parse_args()
+
+    try:
+        main(rv)
+    except psdb.PSDBException as e:
+        print(e)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    _main()
@@ -23,8 +23,9 @@ def main(rv):
     f      = probe.set_max_target_tck_freq()
     print('Set SWD frequency to %.3f MHz' % (f/1.e6))
 
-    # Iterate over all devices to get peripheral registers.
+    # Snapshot all peripheral registers.
     print('Dumping device registers to %s...' % rv.output_path)
+    snap = target.snapshot_registers()
     with open(rv.output_path, 'w', encoding='utf8') as f:
         block = 0
         for d in target.devs.values():
@@ -38,20 +39,21 @@ def main(rv):
             for r in d.regs:
                 addr = d.dev_base + r.offset
                 f.write('0x%08X: ' % addr)
+                # Registers aliasing one with read side effects aren't in the
+                # snapshot either.
+                v = snap.get(d.name, r.name)
                 if not r.flags & r.READABLE:
                     f.write('--Wr Onl--')
-                elif r.flags & r.SIDE_EFFECTS:
+                elif r.flags & r.SIDE_EFFECTS or v is None:
                     f.write('--SideFx--')
+                elif r.size == 1:
+                    f.write('0x%02X' % v)
+                elif r.size == 2:
+                    f.write('0x%04X' % v)
+                elif r.size == 4:
+                    f.write('0x%08X' % v)
                 else:
-                    v    = r.read(d)
-                    if r.size == 1:
-                        f.write('0x%02X' % v)
-                    elif r.size == 2:
-                        f.write('0x%04X' % v)
-                    elif r.size == 4:
-                        f.write('0x%08X' % v)
-                    else:
-                        f.write('0x%X' % v)
+                    f.write('0x%X' % v)
                 f.write(' %s\n' % r.name)
 
     # Resume if halt wasn't requested.
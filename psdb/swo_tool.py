@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import argparse
+import sys
+
+import psdb.probes
+import psdb.trace
+
+
+def main(rv):
+    # Dump all debuggers if requested.
+    if rv.dump_debuggers:
+        psdb.probes.dump_probes()
+
+    # Probe the specified serial number (or find the default if no serial number
+    # was specified.
+    probe = psdb.probes.make_one_ns(rv)
+    f     = probe.set_tck_freq(rv.probe_freq)
+    print('Probing with SWD frequency at %.3f MHz' % (f/1.e6))
+
+    # Use the probe to detect a target platform.
+    target = probe.probe(verbose=rv.verbose, connect_under_reset=False)
+    f      = probe.set_max_target_tck_freq()
+    print('Set SWD frequency to %.3f MHz' % (f/1.e6))
+    cpu    = target.cpus[rv.cpu]
+
+    # Text written to the selected stimulus ports is printed line by line;
+    # all other packets go to the log file if one was specified.
+    log_file = open(rv.log, 'w', encoding='utf8') if rv.log else None
+    raw_file = open(rv.raw, 'wb') if rv.raw else None
+    other    = psdb.trace.PacketWriter(log_file) if log_file else None
+
+    def print_line(port, timestamp, text):
+        print('[%u] %12u: %s' % (port, timestamp, text))
+        if log_file:
+            log_file.write('%12u port %u: %s\n' % (timestamp, port, text))
+
+    callback = psdb.trace.StimulusText(print_line, ports=rv.text_port,
+                                       other=other)
+    ports = 0
+    for p in rv.port:
+        ports |= (1 << p)
+
+    f_traceclk      = psdb.trace.swo.get_traceclk(target, rv.traceclk_freq)
+    reader, decoder = psdb.trace.swo.start(
+            target, cpu, callback, f_traceclk, max_swo_freq=rv.max_swo_freq,
+            ports=ports, timestamps=not rv.no_timestamps,
+            pc_sampling=rv.pc_sampling, exceptions=rv.exceptions)
+    print('Tracing at %.3f MHz SWO from a %.3f MHz trace clock.' %
+          (reader.swo_freq / 1e6, f_traceclk / 1e6))
+    if not rv.halt:
+        target.resume()
+
+    try:
+        while True:
+            data, dropped = reader.read(timeout=0.1)
+            if raw_file and data:
+                raw_file.write(data)
+            if dropped:
+                print('**** Dropped %u trace bytes ****' % dropped)
+                decoder.lost(dropped)
+            decoder.feed(data)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.stop()
+        print('Received %u bytes, %u packets.' %
+              (reader.total, decoder.packets))
+        if log_file:
+            log_file.close()
+        if raw_file:
+            raw_file.close()
+
+
+def _main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dump-debuggers', '-d', action='store_true')
+    parser.add_argument('--usb-path')
+    parser.add_argument('--serial-num')
+    parser.add_argument('--halt', action='store_true')
+    parser.add_argument('--probe-freq', type=int, default=1000000)
+    parser.add_argument('--max-tck-freq', type=int)
+    parser.add_argument('--verbose', '-v', action='store_true')
+    parser.add_argument('--cpu', type=int, default=0)
+    parser.add_argument('--traceclk-freq', type=int)
+    parser.add_argument('--max-swo-freq', type=int)
+    parser.add_argument('--port', type=int, nargs='+',
+                        default=list(range(32)))
+    parser.add_argument('--text-port', type=int, nargs='+', default=[0])
+    parser.add_argument('--no-timestamps', action='store_true')
+    parser.add_argument('--pc-sampling', action='store_true')
+    parser.add_argument('--exceptions', action='store_true')
+    parser.add_argument('--log')
+    parser.add_argument('--raw')
+    rv = parser.parse_args()
+
+    try:
+        main(rv)
+    except psdb.PSDBException as e:
+        print(e)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    _main()
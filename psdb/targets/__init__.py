@@ -37,3 +37,15 @@ def probe(db):
         if device:
             return device
     return None
+
+
+def known_ap_nums(targetid):
+    '''
+    Returns the set of APs populated on any known target that declares the
+    specified DP TARGETID, or None if there are no such targets.
+    '''
+    ap_nums = set()
+    for t in TARGETS:
+        if (targetid & 0x0FFFFFFF) in t.TARGETIDS:
+            ap_nums.update(t.AP_NUMS)
+    return ap_nums or None
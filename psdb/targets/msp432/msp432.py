@@ -10,6 +10,8 @@ DEVICES = [(RAMDevice,     'SRAM',     0x20000000, 0x00010000),
 
 
 class MSP432P401(Target):
+    AP_NUMS = (0, 4)
+
     def __init__(self, db):
         # The max JTAG TCK frequency is 10 MHz.  It's unclear if this also
         # applies to SWD mode.
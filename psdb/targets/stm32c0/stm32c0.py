@@ -10,6 +10,7 @@ DEVICES = [(RAMDevice,      'SRAM',     0x20000000, 0x00003000),
            (stm32c0.RCC,    'RCC',      0x40021000),
            (stm32c0.FLASH,  'FLASH',    0x40022000, 0x08000000, 4000000,
                                         0x1FFF7000, 1024),  # noqa: E127
+           (stm32.CRC,      'CRC',      0x40023000),
            (stm32c0.PWR,    'PWR',      0x40007000),
            (stm32.GPIO,     'GPIOA',    0x50000000),
            (stm32.GPIO,     'GPIOB',    0x50000400),
@@ -20,6 +21,8 @@ DEVICES = [(RAMDevice,      'SRAM',     0x20000000, 0x00003000),
 
 
 class STM32C0(Target):
+    AP_NUMS = (0,)
+
     def __init__(self, db):
         # Max SWD speed is not specified in the data sheet.
         super().__init__(db, 24000000)
@@ -37,6 +40,8 @@ class STM32C0(Target):
             cls(self, self.ahb_ap, name, addr, *args)
 
         self.flash = self.devs['FLASH']
+        self.flash.attach_loader(self.devs['SRAM'])
+        self.flash.attach_crc(self.devs['CRC'])
         MemDevice(self, self.ahb_ap, 'FBANKS', self.flash.mem_base,
                   self.flash.flash_size)
         MemDevice(self, self.ahb_ap, 'OTP', self.flash.otp_base,
@@ -48,7 +53,7 @@ class STM32C0(Target):
     @staticmethod
     def is_mcu(db):
         # APSEL 0 should be populated.
-        if set(db.aps) != set((0,)):
+        if set(db.aps) != set(STM32C0.AP_NUMS):
             return False
 
         # APSEL 0 should be an AHB3 AP.
@@ -14,6 +14,8 @@ DEVICES = [
 
 
 class STM32G0(Target):
+    AP_NUMS = (0,)
+
     def __init__(self, db):
         # Max SWD speed is not specified in the data sheet.
         super().__init__(db, 24000000)
@@ -46,6 +48,7 @@ class STM32G0(Target):
             sram_len = 8 * 1024
 
         RAMDevice(self, self.ahb_ap, 'SRAM', 0x20000000, sram_len)
+        self.flash.attach_loader(self.devs['SRAM'])
         MemDevice(self, self.ahb_ap, 'FBANKS', self.flash.mem_base,
                   self.flash.flash_size)
         MemDevice(self, self.ahb_ap, 'OTP', self.flash.otp_base,
@@ -57,7 +60,7 @@ class STM32G0(Target):
     @staticmethod
     def is_mcu(db):
         # APSEL 0 should be populated.
-        if set(db.aps) != set((0,)):
+        if set(db.aps) != set(STM32G0.AP_NUMS):
             return False
 
         # APSEL 0 should be an AHB3 AP.
@@ -38,6 +38,7 @@ DEVICES_2 = [(RAMDevice,       'CCM SRAM ID', 0x10000000, 0x00002800),
              (stm32g4.RCC,     'RCC',         0x40021000),
              (stm32g4.FLASH_2, 'FLASH',       0x40022000, 0x08000000, 3300000,
                                               0x1FFF7000, 1024),  # noqa: E127
+             (stm32.CRC,       'CRC',         0x40023000),
              (stm32.GPIO,      'GPIOA',       0x48000000),
              (stm32.GPIO,      'GPIOB',       0x48000400),
              (stm32.GPIO,      'GPIOC',       0x48000800),
@@ -86,6 +87,7 @@ DEVICES_3 = [(RAMDevice,       'CCM SRAM ID', 0x10000000, 0x00008000),
              (stm32g4.RCC,     'RCC',         0x40021000),
              (stm32g4.FLASH_3, 'FLASH',       0x40022000, 0x08000000, 3300000,
                                               0x1FFF7000, 1024),  # noqa: E127
+             (stm32.CRC,       'CRC',         0x40023000),
              (stm32.GPIO,      'GPIOA',       0x48000000),
              (stm32.GPIO,      'GPIOB',       0x48000400),
              (stm32.GPIO,      'GPIOC',       0x48000800),
@@ -135,6 +137,7 @@ DEVICES_4 = [(RAMDevice,       'CCM SRAM ID', 0x10000000, 0x00004000),
              (stm32g4.RCC,     'RCC',         0x40021000),
              (stm32g4.FLASH_4, 'FLASH',       0x40022000, 0x08000000, 3300000,
                                               0x1FFF7000, 1024),  # noqa: E127
+             (stm32.CRC,       'CRC',         0x40023000),
              (stm32.GPIO,      'GPIOA',       0x48000000),
              (stm32.GPIO,      'GPIOB',       0x48000400),
              (stm32.GPIO,      'GPIOC',       0x48000800),
@@ -152,6 +155,8 @@ DEVICES_4 = [(RAMDevice,       'CCM SRAM ID', 0x10000000, 0x00004000),
 
 
 class STM32G4(Target):
+    AP_NUMS = (0,)
+
     def __init__(self, db):
         # Max SWD speed is not specified in the data sheet.
         super().__init__(db, 24000000)
@@ -180,6 +185,8 @@ class STM32G4(Target):
             cls(self, self.ahb_ap, name, addr, *args)
 
         self.flash = self.devs['FLASH']
+        self.flash.attach_loader(self.devs['SRAM1'])
+        self.flash.attach_crc(self.devs['CRC'])
         MemDevice(self, self.ahb_ap, 'FBANKS', self.flash.mem_base,
                   self.flash.flash_size)
         MemDevice(self, self.ahb_ap, 'OTP', self.flash.otp_base,
@@ -256,7 +263,7 @@ class STM32G4(Target):
     @staticmethod
     def is_mcu(db):
         # Only APSEL 0 should be populated.
-        if set(db.aps) != set((0,)):
+        if set(db.aps) != set(STM32G4.AP_NUMS):
             return False
 
         # APSEL 0 should be an AHB3 AP.
@@ -28,6 +28,9 @@ AP2DEVS = []
 
 
 class STM32H7(Target):
+    AP_NUMS   = (0, 1, 2)
+    TARGETIDS = (0x04500041,)
+
     def __init__(self, db):
         # Max SWD speed is:
         #   71.0 MHz for 2.70V < VDD < 3.6V
@@ -50,6 +53,7 @@ class STM32H7(Target):
                 cls(self, ap, name, addr, *args)
 
         self.flash = self.devs['FLASH']
+        self.flash.attach_loader(self.devs['M7 ITCM'])
         MemDevice(self, self.ahb_ap, 'FBANKS', self.flash.mem_base,
                   self.flash.flash_size)
 
@@ -62,7 +66,7 @@ class STM32H7(Target):
         # AP0 is the Cortex-M7 and corresponds with db.cpus[0].
         # AP1 is the D3 AHB interconnect.
         # AP2 is the System Debug Bus (APB-D)
-        if set(db.aps) != set((0, 1, 2)):
+        if set(db.aps) != set(STM32H7.AP_NUMS):
             return False
 
         # APSEL 0 should be an AHB3 AP.
@@ -80,6 +80,9 @@ AP3DEVS = [(stm32h7.ART,        'ART',          0x40024400),
 
 
 class STM32H7_DP(Target):
+    AP_NUMS   = (0, 1, 2, 3)
+    TARGETIDS = (0x04500041,)
+
     def __init__(self, db):
         # Max SWD speed is:
         #   71.0 MHz for 2.70V < VDD < 3.6V
@@ -104,6 +107,7 @@ class STM32H7_DP(Target):
                 cls(self, ap, name, addr, *args)
 
         self.flash = self.devs['FLASH']
+        self.flash.attach_loader(self.devs['M7 ITCM'])
         MemDevice(self, self.ahb_ap, 'FBANKS', self.flash.mem_base,
                   self.flash.flash_size)
 
@@ -240,7 +244,7 @@ class STM32H7_DP(Target):
         # Note that other than the existence of AP3, a single-core H7 looks
         # exactly the same as a dual-core H7.  This might imply that we
         # shouldn't be treating them separately...
-        if set(db.aps) != set((0, 1, 2, 3)):
+        if set(db.aps) != set(STM32H7_DP.AP_NUMS):
             return False
 
         # APSEL 1 should be an AHB3 AP.
@@ -14,6 +14,8 @@ DEVICES = [(RAMDevice,      'SRAM2 S', 0x10000000, 0x00002000),
 
 
 class STM32L4(Target):
+    AP_NUMS = (0,)
+
     def __init__(self, db):
         # Max SWD speed is not specified in the data sheet.
         super().__init__(db, 24000000)
@@ -31,6 +33,7 @@ class STM32L4(Target):
             cls(self, self.ahb_ap, name, addr, *args)
 
         self.flash = self.devs['FLASH']
+        self.flash.attach_loader(self.devs['SRAM1'])
         MemDevice(self, self.ahb_ap, 'FBANKS', self.flash.mem_base,
                   self.flash.flash_size)
         MemDevice(self, self.ahb_ap, 'OTP', self.flash.otp_base,
@@ -42,7 +45,7 @@ class STM32L4(Target):
     @staticmethod
     def is_mcu(db):
         # Only APSEL 0 should be populated.
-        if set(db.aps) != set((0,)):
+        if set(db.aps) != set(STM32L4.AP_NUMS):
             return False
 
         # APSEL 0 should be an AHB3 AP.
@@ -28,6 +28,7 @@ COMMON_DEVICES = [
            (stm32.CORDIC,    'CORDIC',      0x40021000),
            (stm32u5.FLASH,   'FLASH',       0x40022000, 0x08000000, 3300000,
                                             0x0BFA0000, 512),  # noqa: E127
+           (stm32.CRC,       'CRC',         0x40023000),
            (RAMDevice,       'Backup SRAM', 0x40036400, 0x00000800),
            (stm32.GPIO,      'GPIOA',       0x42020000),
            (stm32.GPIO,      'GPIOB',       0x42020400),
@@ -78,6 +79,9 @@ class STM32U5MCU(psdb.component.Component):
 
 
 class STM32U5(Target):
+    AP_NUMS   = (0,)
+    TARGETIDS = (0x04550041, 0x04820041)
+
     def __init__(self, db):
         # Max SWD speed is:
         #   66.5 MHz for 2.70V < VDD < 3.6V
@@ -101,6 +105,8 @@ class STM32U5(Target):
             cls(self, self.ahb_ap, name, addr, *args)
 
         self.flash = self.devs['FLASH']
+        self.flash.attach_loader(self.devs['SRAM1'])
+        self.flash.attach_crc(self.devs['CRC'])
         MemDevice(self, self.ahb_ap, 'FBANKS', self.flash.mem_base,
                   self.flash.flash_size)
         MemDevice(self, self.ahb_ap, 'OTP', self.flash.otp_base,
@@ -112,7 +118,7 @@ class STM32U5(Target):
     @staticmethod
     def is_mcu(db):
         # Only APSEL 0 should be populated.
-        if set(db.aps) != set((0,)):
+        if set(db.aps) != set(STM32U5.AP_NUMS):
             return False
 
         # APSEL 0 should be an AHB5 AP
@@ -2,7 +2,7 @@
 import struct
 
 import psdb
-from psdb.devices.stm32wb55.ipc import IPC
+from psdb.devices.stm32wb55.ipc import IPC, SRAM_BOOT_SIZE
 from psdb.devices import MemDevice, RAMDevice, stm32, stm32wb55
 from psdb.targets import Target
 from . import dbgmcu
@@ -16,6 +16,7 @@ DEVICES = [(RAMDevice,        'SRAM1',    0x20000000, 0x00030000),
            (stm32.DMA,        'DMA1',     0x40020000),
            (stm32.DMA,        'DMA2',     0x40020400),
            (stm32.DMAMUX,     'DMAMUX',   0x40020800, 14, 4),
+           (stm32.CRC,        'CRC',      0x40023000),
            (stm32.GPIO,       'GPIOA',    0x48000000),
            (stm32.GPIO,       'GPIOB',    0x48000400),
            (stm32.GPIO,       'GPIOC',    0x48000800),
@@ -32,6 +33,9 @@ DEVICES = [(RAMDevice,        'SRAM1',    0x20000000, 0x00030000),
 
 
 class STM32WB55(Target):
+    AP_NUMS   = (0, 1)
+    TARGETIDS = (0x04950041,)
+
     def __init__(self, db):
         # Max SWD speed is:
         #   55.0 MHz for 2.70V < VDD < 3.6V
@@ -53,6 +57,12 @@ class STM32WB55(Target):
             cls(self, self.ahb_ap, name, addr, *args)
 
         self.flash = self.devs['FLASH']
+
+        # The IPC SRAM-boot vector table and stack live at the start of SRAM1
+        # and must survive the flash burns done by the FUS client, so put the
+        # loader after them.
+        self.flash.attach_loader(self.devs['SRAM1'], offset=SRAM_BOOT_SIZE)
+        self.flash.attach_crc(self.devs['CRC'])
         MemDevice(self, self.ahb_ap, 'FBANKS', self.flash.mem_base,
                   self.flash.user_flash_size)
         MemDevice(self, self.ahb_ap, 'OTP', self.flash.otp_base,
@@ -156,7 +166,7 @@ class STM32WB55(Target):
     @staticmethod
     def is_mcu(db):
         # APSEL 0 should be populated.
-        if set(db.aps) != set((0, 1)):
+        if set(db.aps) != set(STM32WB55.AP_NUMS):
             return False
 
         # APSEL 0 and 1 should be AHB3 APs.
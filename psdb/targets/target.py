@@ -12,6 +12,12 @@ class MemRegion:
 
 
 class Target:
+    # The APs that are populated on this target and, for targets with a v2
+    # DP, the TARGETID values (with the TREVISION field masked off) that
+    # identify it.  These let the probe skip the AP scan.
+    AP_NUMS   = ()
+    TARGETIDS = ()
+
     def __init__(self, db, max_tck_freq):
         self.db           = db
         self.max_tck_freq = max_tck_freq
@@ -41,6 +47,7 @@ class Target:
         cpus = cpus or self.cpus
         for c in cpus:
             c.halt()
+        self.invalidate_shadows()
 
     def reset_halt(self):
         '''
@@ -78,12 +85,35 @@ class Target:
 
         # Disable reset vector catch.
         self.disable_reset_vector_catch()
+        self.invalidate_shadows()
 
     def resume(self, cpus=None):
+        self.invalidate_shadows()
         cpus = cpus or self.cpus
         for c in cpus:
             c.resume()
 
+    def snapshot_registers(self, devs=None):
+        '''
+        Captures the value of every readable register without read side
+        effects in the specified devices, or in all non-memory devices if devs
+        is None, and returns an immutable psdb.devices.Snapshot.  Adjacent
+        registers are read in bulk, so this is much faster than reading the
+        registers one at a time.
+        '''
+        if devs is None:
+            devs = [d for d in self.devs.values()
+                    if not isinstance(d, psdb.devices.MemDevice)]
+        return psdb.devices.snapshot.capture(devs)
+
+    def invalidate_shadows(self):
+        '''
+        Discards the register shadows of all devices, since the target may
+        have modified its registers while it was running.
+        '''
+        for d in self.devs.values():
+            d.invalidate_shadow()
+
     def enable_reset_vector_catch(self):
         for c in self.cpus:
             c.halt()
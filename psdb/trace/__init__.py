@@ -0,0 +1,21 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+from . import itm
+from . import swo
+from . import pcsample
+from .itm import ITMDecoder, StimulusText, PacketWriter
+from .swo import SWOReader, SWOException
+from .pcsample import Profile, PCSRSampler, SWOCollector
+
+
+__all__ = ['itm',
+           'swo',
+           'pcsample',
+           'ITMDecoder',
+           'StimulusText',
+           'PacketWriter',
+           'SWOReader',
+           'SWOException',
+           'Profile',
+           'PCSRSampler',
+           'SWOCollector',
+           ]
@@ -0,0 +1,302 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import collections
+
+
+# Packets emitted by the decoder.  Stimulus packets are software writes to
+# one of the 32 ITM stimulus ports; the value is zero-extended from the size
+# of the write (1, 2 or 4 bytes).  Hardware packets come from the DWT and are
+# further decoded into the more specific packet types where possible.  Local
+# timestamps carry the delta since the previous local timestamp and the
+# timing-relationship code from the TC field (0 means the timestamp is
+# synchronous with the corresponding data).  Lost packets are generated by
+# the host when trace bytes were dropped before they reached the decoder.
+Sync            = collections.namedtuple('Sync', [])
+Overflow        = collections.namedtuple('Overflow', [])
+Lost            = collections.namedtuple('Lost', ['nbytes'])
+Stimulus        = collections.namedtuple('Stimulus', ['port', 'value', 'size'])
+Hardware        = collections.namedtuple('Hardware', ['disc', 'value', 'size'])
+EventCounter    = collections.namedtuple('EventCounter', ['flags'])
+ExceptionTrace  = collections.namedtuple('ExceptionTrace',
+                                         ['exception', 'function'])
+PCSample        = collections.namedtuple('PCSample', ['pc'])
+DataTrace       = collections.namedtuple('DataTrace',
+                                         ['comparator', 'kind', 'value',
+                                          'size'])
+LocalTimestamp  = collections.namedtuple('LocalTimestamp', ['delta', 'tc'])
+GlobalTimestamp = collections.namedtuple('GlobalTimestamp', ['value'])
+Extension       = collections.namedtuple('Extension', ['ex', 'sh', 'value'])
+Reserved        = collections.namedtuple('Reserved', ['header'])
+
+# EventCounter flag bits.
+EVT_CPI   = (1 << 0)
+EVT_EXC   = (1 << 1)
+EVT_SLEEP = (1 << 2)
+EVT_LSU   = (1 << 3)
+EVT_FOLD  = (1 << 4)
+EVT_CYC   = (1 << 5)
+
+# ExceptionTrace functions.
+EXC_ENTERED  = 1
+EXC_EXITED   = 2
+EXC_RETURNED = 3
+
+# The number of zero bits that must precede the final 1 bit of a sync packet.
+SYNC_ZERO_BITS = 47
+
+# Decoder states.
+S_HEADER   = 0
+S_PAYLOAD  = 1
+S_CONTINUE = 2
+S_ZEROS    = 3
+S_UNSYNCED = 4
+
+
+def _decode_hardware(disc, value, size):
+    '''
+    Converts a DWT hardware source packet into one of the more specific packet
+    types, or returns a generic Hardware packet for unknown discriminators.
+    '''
+    if disc == 0 and size == 1:
+        return EventCounter(value)
+    if disc == 1 and size == 2:
+        return ExceptionTrace(value & 0x1FF, (value >> 12) & 0x3)
+    if disc == 2:
+        # A 1-byte PC sample packet means the processor was sleeping.
+        return PCSample(value if size == 4 else None)
+    if 8 <= disc <= 23:
+        comparator = (disc >> 1) & 0x3
+        if disc < 16:
+            kind = 'pc' if disc & 1 == 0 else 'offset'
+        else:
+            kind = 'read' if disc & 1 == 0 else 'write'
+        return DataTrace(comparator, kind, value, size)
+    return Hardware(disc, value, size)
+
+
+class ITMDecoder:
+    '''
+    Incremental decoder for the ITM/DWT packet protocol described in Appendix
+    D4 of the ARMv7-M Architecture Reference Manual.  Bytes are fed in with
+    feed() in arbitrarily-sized chunks exactly as they come out of the trace
+    port; packets may straddle chunk boundaries.  Every decoded packet is
+    passed to the callback, along with the running local timestamp, which is
+    the sum of all local timestamp deltas seen so far.
+
+    The decoder starts out unsynchronized and discards bytes until it sees a
+    sync packet, unless synced=True is passed, which is appropriate when the
+    trace port was enabled with the decoder already attached.  After lost()
+    is invoked to report dropped bytes, the decoder resynchronizes on the next
+    sync packet; the ITM should be configured to emit them periodically.
+    '''
+    def __init__(self, callback, synced=False):
+        self.callback   = callback
+        self.timestamp  = 0
+        self.gts        = 0
+        self.packets    = 0
+        self.discarded  = 0
+        self.state      = S_HEADER if synced else S_UNSYNCED
+        self.zeros      = 0
+        self.header     = 0
+        self.value      = 0
+        self.shift      = 0
+        self.remaining  = 0
+
+    def _emit(self, pkt):
+        self.packets += 1
+        self.callback(pkt, self.timestamp)
+
+    def lost(self, nbytes):
+        '''
+        Reports that the specified number of bytes was dropped from the trace
+        stream.  Any partial packet is discarded and the decoder waits for a
+        sync packet before decoding again.
+        '''
+        self._emit(Lost(nbytes))
+        self.state = S_UNSYNCED
+        self.zeros = 0
+
+    def _start_continuation(self, header, value, shift):
+        self.header = header
+        self.value  = value
+        self.shift  = shift
+        self.state  = S_CONTINUE
+
+    def _decode_header(self, b):
+        if b == 0x00:
+            self.zeros = 8
+            self.state = S_ZEROS
+        elif b == 0x70:
+            self._emit(Overflow())
+        elif b & 0x03:
+            # Source packet: bits 1:0 encode the payload size, bit 2 selects
+            # hardware (DWT) vs. software (stimulus port) and bits 7:3 hold
+            # the port number or discriminator.
+            self.header    = b
+            self.remaining = (1, 2, 4)[(b & 0x03) - 1]
+            self.value     = 0
+            self.shift     = 0
+            self.state     = S_PAYLOAD
+        elif b & 0x0F == 0x00:
+            if not b & 0x80:
+                self.timestamp += (b >> 4) & 0x7
+                self._emit(LocalTimestamp((b >> 4) & 0x7, 0))
+            elif b & 0x40:
+                self._start_continuation(b, 0, 0)
+            else:
+                self._emit(Reserved(b))
+        elif b == 0x94 or b == 0xB4:
+            self._start_continuation(b, 0, 0)
+        elif b & 0x0B == 0x08:
+            if b & 0x80:
+                self._start_continuation(b, (b >> 4) & 0x7, 3)
+            else:
+                self._emit(Extension((b >> 4) & 0x7, (b >> 2) & 1,
+                                     (b >> 4) & 0x7))
+        else:
+            self._emit(Reserved(b))
+
+    def _finish_source(self):
+        h    = self.header
+        size = (1, 2, 4)[(h & 0x03) - 1]
+        if h & 0x04:
+            self._emit(_decode_hardware(h >> 3, self.value, size))
+        else:
+            self._emit(Stimulus(h >> 3, self.value, size))
+        self.state = S_HEADER
+
+    def _finish_continuation(self):
+        h = self.header
+        if h == 0x94:
+            self.gts = (self.gts & ~0x03FFFFFF) | (self.value & 0x03FFFFFF)
+            self._emit(GlobalTimestamp(self.gts))
+        elif h == 0xB4:
+            self.gts = (self.gts & 0x03FFFFFF) | (self.value << 26)
+            self._emit(GlobalTimestamp(self.gts))
+        elif h & 0x0F == 0x00:
+            self.timestamp += self.value
+            self._emit(LocalTimestamp(self.value, (h >> 4) & 0x3))
+        else:
+            self._emit(Extension(self.value & 0x7, (h >> 2) & 1, self.value))
+        self.state = S_HEADER
+
+    def feed(self, data):
+        '''
+        Decodes a chunk of trace data.  Source packets that lie entirely
+        within the chunk are decoded directly, since they make up the bulk of
+        a typical trace stream; everything else goes through the byte-at-a-
+        time state machine.
+        '''
+        callback = self.callback
+        sizes    = (0, 1, 2, 4)
+        i        = 0
+        n        = len(data)
+        while i < n:
+            b = data[i]
+            if b & 0x03 and self.state == S_HEADER:
+                size = sizes[b & 0x03]
+                end  = i + 1 + size
+                if end <= n:
+                    v = int.from_bytes(data[i + 1:end], 'little')
+                    if b & 0x04:
+                        pkt = _decode_hardware(b >> 3, v, size)
+                    else:
+                        pkt = Stimulus(b >> 3, v, size)
+                    self.packets += 1
+                    callback(pkt, self.timestamp)
+                    i = end
+                    continue
+            self._feed_byte(b)
+            i += 1
+
+    def _feed_byte(self, b):
+        state = self.state
+        if state == S_HEADER:
+            self._decode_header(b)
+        elif state == S_PAYLOAD:
+            self.value |= (b << self.shift)
+            self.shift += 8
+            self.remaining -= 1
+            if not self.remaining:
+                self._finish_source()
+        elif state == S_CONTINUE:
+            self.value |= ((b & 0x7F) << self.shift)
+            self.shift += 7
+            if not b & 0x80:
+                self._finish_continuation()
+        elif b == 0x00:
+            self.zeros += 8
+        elif b == 0x80 and self.zeros + 7 >= SYNC_ZERO_BITS:
+            self.state = S_HEADER
+            self.zeros = 0
+            self._emit(Sync())
+        elif state == S_UNSYNCED:
+            self.discarded += 1 + self.zeros // 8
+            self.zeros      = 0
+        else:
+            # A short run of zeros isn't a sync packet; it can only have been
+            # padding, so treat this byte as a new header.
+            self.zeros = 0
+            self.state = S_HEADER
+            self._decode_header(b)
+
+
+class StimulusText:
+    '''
+    Packet callback that reassembles printf-style text written to a set of
+    stimulus ports, one byte or word at a time, and hands each complete line
+    to the line callback as (port, timestamp, text).  Packets that aren't
+    stimulus writes to one of the ports are passed on to the optional other
+    callback unchanged.
+    '''
+    def __init__(self, line_callback, ports=(0,), other=None,
+                 encoding='utf-8'):
+        self.line_callback = line_callback
+        self.other         = other
+        self.encoding      = encoding
+        self.bufs          = {p : bytearray() for p in ports}
+
+    def __call__(self, pkt, timestamp):
+        if isinstance(pkt, Stimulus) and pkt.port in self.bufs:
+            buf = self.bufs[pkt.port]
+            buf += pkt.value.to_bytes(pkt.size, 'little')
+            while True:
+                i = buf.find(b'\n')
+                if i < 0:
+                    break
+                line = bytes(buf[:i]).rstrip(b'\r\x00')
+                del buf[:i + 1]
+                self.line_callback(pkt.port, timestamp,
+                                   line.decode(self.encoding, 'replace'))
+        elif self.other is not None:
+            self.other(pkt, timestamp)
+
+
+def format_packet(pkt, timestamp):
+    '''
+    Returns a one-line textual description of a packet.
+    '''
+    name = type(pkt).__name__
+    if isinstance(pkt, Stimulus):
+        desc = 'port %u 0x%0*X' % (pkt.port, 2*pkt.size, pkt.value)
+    elif isinstance(pkt, PCSample):
+        desc = 'sleep' if pkt.pc is None else '0x%08X' % pkt.pc
+    elif isinstance(pkt, ExceptionTrace):
+        desc = '%u %s' % (pkt.exception,
+                          {EXC_ENTERED  : 'entered',
+                           EXC_EXITED   : 'exited',
+                           EXC_RETURNED : 'returned'}.get(pkt.function, '?'))
+    else:
+        desc = ' '.join('%s=%s' % (k, v) for k, v in pkt._asdict().items())
+    return '%12u %-16s %s' % (timestamp, name, desc)
+
+
+class PacketWriter:
+    '''
+    Packet callback that writes a textual description of every packet to a
+    file.
+    '''
+    def __init__(self, f):
+        self.f = f
+
+    def __call__(self, pkt, timestamp):
+        self.f.write(format_packet(pkt, timestamp) + '\n')
@@ -0,0 +1,202 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import collections
+import time
+
+import psdb
+from . import itm
+
+
+# The number of DWT_PCSR reads issued per exec_cmd_list() batch.
+DEFAULT_BATCH_SIZE = 256
+
+# DWT_PCSR reads as this when the core is halted or sampling is unavailable.
+PCSR_INVALID = 0xFFFFFFFF
+
+SCS_ICSR_OFFSET = 0xD04
+
+EXCEPTION_NAMES = {1  : 'Reset',
+                   2  : 'NMI',
+                   3  : 'HardFault',
+                   4  : 'MemManage',
+                   5  : 'BusFault',
+                   6  : 'UsageFault',
+                   7  : 'SecureFault',
+                   11 : 'SVCall',
+                   12 : 'DebugMonitor',
+                   14 : 'PendSV',
+                   15 : 'SysTick',
+                   }
+
+
+def exception_name(n):
+    '''
+    Returns the name of an exception number as found in ICSR.VECTACTIVE or an
+    exception trace packet; exception 0 means thread mode.
+    '''
+    if n == 0:
+        return 'Thread'
+    if n >= 16:
+        return 'IRQ%u' % (n - 16)
+    return EXCEPTION_NAMES.get(n, 'Exception%u' % n)
+
+
+class Profile:
+    '''
+    A statistical profile made up of PC samples.  Each sample carries a
+    context, a tuple of frame names describing the exception nesting at the
+    time of the sample that becomes the root of the sample's stack in the
+    collapsed-stack output.  A PC of None means the core was sleeping.
+    '''
+    def __init__(self):
+        self.samples = collections.Counter()
+        self.total   = 0
+        self.invalid = 0
+
+    def add(self, pc, context=()):
+        self.samples[(context, pc)] += 1
+        self.total += 1
+
+    def symbolize(self, elf=None):
+        '''
+        Returns a Counter mapping (context, function name) to sample count.
+        PCs are resolved against the function symbols of an ELFBinary if one
+        is given; PCs outside any known function are reported by address.
+        '''
+        cache  = {}
+        counts = collections.Counter()
+        for (context, pc), n in self.samples.items():
+            name = cache.get(pc)
+            if name is None:
+                if pc is None:
+                    name = '[sleep]'
+                else:
+                    f    = elf.lookup_func(pc) if elf else None
+                    name = f[2] if f else '0x%08X' % pc
+                cache[pc] = name
+            counts[(context, name)] += n
+        return counts
+
+    def write_flat(self, f, elf=None, limit=None):
+        '''
+        Writes a flat profile, listing functions in decreasing order of the
+        number of samples that hit them regardless of context.
+        '''
+        counts = collections.Counter()
+        for (_, name), n in self.symbolize(elf).items():
+            counts[name] += n
+
+        f.write('%u samples, %u invalid\n' % (self.total, self.invalid))
+        f.write('%10s %7s %7s  %s\n' % ('Samples', '%', 'Cum %', 'Function'))
+        cum = 0
+        for name, n in counts.most_common(limit):
+            cum += n
+            f.write('%10u %6.2f%% %6.2f%%  %s\n'
+                    % (n, 100 * n / self.total, 100 * cum / self.total, name))
+
+    def write_collapsed(self, f, elf=None):
+        '''
+        Writes the profile in the collapsed-stack format consumed by
+        flamegraph.pl and compatible tools, one "frame;frame;... count" line
+        per distinct stack.
+        '''
+        for (context, name), n in sorted(self.symbolize(elf).items()):
+            f.write('%s %u\n' % (';'.join(context + (name,)), n))
+
+
+class PCSRSampler:
+    '''
+    Samples the PC of a running CPU by repeatedly reading DWT_PCSR, which
+    doesn't disturb the core.  Reads are issued in batches through the
+    probe's exec_cmd_list() so that probes with scatter/gather or pipelined
+    reads amortize their USB round-trips over a whole batch.  If context is
+    True, ICSR is read along with each PCSR sample so that samples taken in
+    exception handlers can be attributed to the active exception; this halves
+    the sample rate.
+    '''
+    def __init__(self, cpu, batch_size=DEFAULT_BATCH_SIZE, context=False):
+        dwt = cpu.devs.get('DWT')
+        if dwt is None:
+            raise psdb.PSDBException('CPU%u has no DWT.' % cpu.cpu_index)
+
+        cpu.scs._DEMCR.TRCENA = 1
+        dwt._CTRL.CYCCNTENA   = 1
+
+        pcsr = psdb.devices.ReadCommand(dwt.ap, dwt._PCSR.addr, 4)
+        if context:
+            icsr = psdb.devices.ReadCommand(cpu.ap,
+                                            cpu.scs.dev_base + SCS_ICSR_OFFSET,
+                                            4)
+            self.cmds = [pcsr, icsr] * batch_size
+        else:
+            self.cmds = [pcsr] * batch_size
+
+        self.db      = dwt.ap.db
+        self.context = context
+        self.names   = {}
+
+    def _context(self, icsr):
+        vectactive = icsr & 0x1FF
+        name       = self.names.get(vectactive)
+        if name is None:
+            name = self.names[vectactive] = (exception_name(vectactive),)
+        return name
+
+    def sample(self, profile):
+        '''
+        Takes one batch of samples and adds the valid ones to the profile.
+        '''
+        vals = self.db.exec_cmd_list(self.cmds)
+        if self.context:
+            for pc, icsr in zip(vals[0::2], vals[1::2]):
+                if pc == PCSR_INVALID:
+                    profile.invalid += 1
+                else:
+                    profile.add(pc, self._context(icsr))
+        else:
+            for pc in vals:
+                if pc == PCSR_INVALID:
+                    profile.invalid += 1
+                else:
+                    profile.add(pc)
+
+    def run(self, profile, duration):
+        '''
+        Samples for the specified number of seconds and returns the achieved
+        sample rate in samples per second.
+        '''
+        n  = 0
+        t0 = time.time()
+        while time.time() - t0 < duration:
+            self.sample(profile)
+            n += len(self.cmds) // (2 if self.context else 1)
+        return n / (time.time() - t0)
+
+
+class SWOCollector:
+    '''
+    ITMDecoder callback that adds DWT PC sample packets to a profile.  If
+    exception tracing is enabled as well, the nesting of active exceptions is
+    tracked and used as the context of each sample.  Any lost data resets the
+    exception stack, since entries and exits may have been missed.
+    '''
+    def __init__(self, profile):
+        self.profile = profile
+        self.stack   = ()
+
+    def __call__(self, pkt, _timestamp):
+        if isinstance(pkt, itm.PCSample):
+            self.profile.add(pkt.pc, self.stack or ('Thread',))
+        elif isinstance(pkt, itm.ExceptionTrace):
+            name = exception_name(pkt.exception)
+            if pkt.function == itm.EXC_ENTERED:
+                self.stack += (name,)
+            elif pkt.function == itm.EXC_EXITED:
+                if self.stack and self.stack[-1] == name:
+                    self.stack = self.stack[:-1]
+            elif pkt.function == itm.EXC_RETURNED:
+                if pkt.exception == 0:
+                    self.stack = ()
+                elif name in self.stack:
+                    self.stack = self.stack[:self.stack.index(name) + 1]
+        elif isinstance(pkt, (itm.Lost, itm.Overflow)):
+            self.stack = ()
@@ -0,0 +1,267 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import math
+import threading
+import time
+
+import psdb
+from .itm import ITMDecoder
+
+
+# Key written to a CoreSight LAR to unlock the component's registers.
+CS_UNLOCK_KEY = 0xC5ACCE55
+
+# TPIU SPPR.TXMODE value selecting asynchronous SWO with NRZ (UART) encoding.
+TXMODE_NRZ = 2
+
+# ITM TraceBusID; any non-zero value will do when the ITM is the only source.
+ITM_TRACE_BUS_ID = 1
+
+DEFAULT_RING_SIZE = 16*1024*1024
+
+
+class SWOException(psdb.PSDBException):
+    pass
+
+
+def choose_swo_freq(f_traceclk, max_swo_freq):
+    '''
+    Returns a (swo_freq, prescaler) tuple selecting the highest SWO frequency
+    that the TPIU can derive from the specified trace clock without exceeding
+    the probe's maximum SWO frequency.
+    '''
+    prescaler = max(1, math.ceil(f_traceclk / max_swo_freq))
+    if prescaler > 0x2000:
+        raise SWOException('Trace clock %u Hz too fast for SWO.' % f_traceclk)
+    return f_traceclk / prescaler, prescaler
+
+
+def get_traceclk(target, f_traceclk=None):
+    '''
+    Returns the trace clock frequency, which is the specified one if given or
+    else HCLK as computed by the target's RCC, if we know how to do that.
+    '''
+    if f_traceclk:
+        return f_traceclk
+
+    rcc = target.devs.get('RCC')
+    if rcc is None or not hasattr(rcc, 'f_hclk'):
+        raise SWOException('Unknown trace clock frequency; '
+                           'specify --traceclk-freq.')
+    return rcc.f_hclk
+
+
+def _find_dev(cpu, name):
+    dev = cpu.devs.get(name)
+    if dev is None:
+        raise SWOException('CPU%u has no %s.' % (cpu.cpu_index, name))
+    return dev
+
+
+def stop_itm(cpu, timeout=1):
+    '''
+    Disables the CPU's ITM and waits for it to drain, so that the trace port
+    goes idle on a packet boundary.  Raises an exception if the ITM is still
+    busy after the timeout.
+    '''
+    itm      = _find_dev(cpu, 'ITM')
+    itm._LAR = CS_UNLOCK_KEY
+    itm._TCR = 0
+    t0 = time.time()
+    while itm._TCR.BUSY:
+        if time.time() - t0 > timeout:
+            raise SWOException('Timed out waiting for ITM to drain.')
+
+
+def configure(target, cpu, prescaler, ports=0xFFFFFFFF, timestamps=True,
+              pc_sampling=False, exceptions=False):
+    '''
+    Configures the CPU's trace components to stream ITM/DWT packets over SWO
+    in NRZ mode, with the TPIU dividing the trace clock (normally HCLK) down
+    by the prescaler returned from choose_swo_freq().  The ports argument is
+    a bitmask of stimulus ports to enable.  DWT PC sampling and exception
+    tracing are optional since they consume a lot of bandwidth.
+    Periodic sync packets are always enabled so that the decoder can recover
+    from dropped data.
+    '''
+    dwt  = _find_dev(cpu, 'DWT')
+    itm  = _find_dev(cpu, 'ITM')
+    tpiu = _find_dev(cpu, 'TPIU')
+
+    # Route SWO out of the MCU if the target has a DBGMCU that needs it.
+    dbgmcu = target.devs.get('DBGMCU')
+    if dbgmcu is not None and 'TRACE_IOEN' in dbgmcu._CR.reg.fields_map:
+        with dbgmcu.transaction():
+            dbgmcu._CR.TRACE_IOEN = 1
+            dbgmcu._CR.TRACE_MODE = 0
+            if 'TRACE_EN' in dbgmcu._CR.reg.fields_map:
+                dbgmcu._CR.TRACE_EN = 1
+
+    cpu.scs._DEMCR.TRCENA = 1
+
+    # Bypass the formatter; only the ITM is routed to SWO.
+    tpiu._SPPR  = TXMODE_NRZ
+    tpiu._ACPR  = prescaler - 1
+    tpiu._FFCR  = (1 << 8)
+    tpiu._CSPSR = 1
+
+    stop_itm(cpu)
+    itm._TER = ports
+    itm._TPR = 0
+    itm._TCR = ((ITM_TRACE_BUS_ID << 16) |
+                ((1 << 3) if pc_sampling or exceptions else 0) |
+                ((1 << 1) if timestamps else 0) |
+                (1 << 2) |
+                (1 << 0))
+
+    # Sync packets are generated from CYCCNT, so it has to run.  SYNCTAP=1
+    # taps CYCCNT bit 24, giving a sync packet every 16M cycles; POSTPRESET
+    # and CYCTAP=1 give a PC sample every 16*1024 cycles when enabled.
+    ctrl = dwt._CTRL.read() & 0xF0000000
+    ctrl |= (1 << 0) | (1 << 10)
+    if pc_sampling:
+        ctrl |= (15 << 1) | (1 << 9) | (1 << 12)
+    if exceptions:
+        ctrl |= (1 << 16)
+    dwt._CTRL = ctrl
+
+
+class SWOReader:
+    '''
+    Drains a probe's trace endpoint from a background thread into a ring
+    buffer so that USB polling never waits on decoding or file I/O.  If the
+    consumer falls behind and the ring fills up, newly-arrived data is dropped
+    and the number of dropped bytes is reported through the decoder's lost()
+    method the next time the ring is drained.
+
+    Polling the trace endpoint also issues commands on the probe's debug
+    endpoint, so the reader holds its lock while polling and any other thread
+    that accesses the probe while the reader is running must do the same.
+    '''
+    def __init__(self, probe, swo_freq, ring_size=DEFAULT_RING_SIZE,
+                 poll_interval=0.001, lock=None):
+        if not hasattr(probe, 'trace_read'):
+            raise SWOException('Probe does not support SWO trace.')
+
+        self.probe         = probe
+        self.swo_freq      = swo_freq
+        self.poll_interval = poll_interval
+        self.ring          = bytearray(ring_size)
+        self.head          = 0
+        self.tail          = 0
+        self.count         = 0
+        self.dropped       = 0
+        self.total         = 0
+        self.lock          = lock or threading.Lock()
+        self.cond          = threading.Condition()
+        self.running       = False
+        self.thread        = None
+        self.exception     = None
+
+    def start(self):
+        with self.lock:
+            self.probe.trace_enable(int(self.swo_freq))
+        self.running = True
+        self.thread  = threading.Thread(target=self._workloop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        with self.lock:
+            self.probe.trace_disable()
+
+    def _put(self, data):
+        n = min(len(data), len(self.ring) - self.count)
+        self.dropped += len(data) - n
+        self.total   += len(data)
+        if not n:
+            return
+
+        end = min(n, len(self.ring) - self.tail)
+        self.ring[self.tail:self.tail + end] = data[:end]
+        self.ring[:n - end] = data[end:n]
+        self.tail   = (self.tail + n) % len(self.ring)
+        self.count += n
+
+    def _workloop(self):
+        try:
+            while self.running:
+                with self.lock:
+                    data = self.probe.trace_read()
+                if data:
+                    with self.cond:
+                        self._put(data)
+                        self.cond.notify_all()
+                else:
+                    with self.cond:
+                        self.cond.wait(self.poll_interval)
+        except Exception as e:
+            self.exception = e
+        finally:
+            with self.cond:
+                self.running = False
+                self.cond.notify_all()
+
+    def read(self, timeout=None):
+        '''
+        Waits for trace data and returns a (data, dropped) tuple holding all
+        buffered data along with the number of bytes dropped before it.
+        Returns (b'', 0) on timeout or once the reader stops.  Re-raises any
+        exception that stopped the reader thread.
+        '''
+        with self.cond:
+            if not self.count and not self.dropped and self.running:
+                self.cond.wait(timeout)
+            if self.exception:
+                raise self.exception
+
+            n    = self.count
+            end  = min(n, len(self.ring) - self.head)
+            data = bytes(self.ring[self.head:self.head + end] +
+                         self.ring[:n - end])
+            dropped      = self.dropped
+            self.head    = (self.head + n) % len(self.ring)
+            self.count   = 0
+            self.dropped = 0
+            return data, dropped
+
+    def decode(self, decoder, timeout=None):
+        '''
+        Drains the ring into an ITMDecoder.  Returns False once the reader has
+        stopped and no more data is buffered.
+        '''
+        data, dropped = self.read(timeout=timeout)
+        if dropped:
+            decoder.lost(dropped)
+        if data:
+            decoder.feed(data)
+        return self.running or bool(data)
+
+
+def start(target, cpu, callback, f_traceclk, max_swo_freq=None, **kwargs):
+    '''
+    Configures SWO at the highest frequency supported by both the probe and
+    the trace clock, starts a SWOReader and returns it along with an
+    ITMDecoder that passes packets to the callback.  The ITM is stopped
+    before the probe starts capturing so that the decoder sees the stream
+    from a packet boundary.  Extra keyword arguments are passed to
+    configure().
+    '''
+    probe = target.db
+    if max_swo_freq is None:
+        max_swo_freq = getattr(probe, 'max_swo_freq', 0)
+    if not max_swo_freq:
+        raise SWOException('Probe does not support SWO trace.')
+
+    swo_freq, prescaler = choose_swo_freq(f_traceclk, max_swo_freq)
+    reader  = SWOReader(probe, swo_freq)
+    decoder = ITMDecoder(callback, synced=True)
+    stop_itm(cpu)
+    reader.start()
+    with reader.lock:
+        configure(target, cpu, prescaler, **kwargs)
+    return reader, decoder
@@ -1,13 +1,18 @@
 # Copyright (c) 2020 Phase Advanced Sensor Systems, Inc.
 from .prange import piter, prange
 from .hexify import hexify
+from .crc import crc32_mpeg2, crc32_stm32
+from . import cache
 
 
 def round_up_pow_2(v, p2):
     return (v + p2 - 1) & ~(p2 - 1)
 
 
-__all__ = ['hexify',
+__all__ = ['cache',
+           'crc32_mpeg2',
+           'crc32_stm32',
+           'hexify',
            'piter',
            'prange',
            'round_up_pow_2',
@@ -0,0 +1,64 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import json
+import os
+
+
+def cache_dir():
+    '''
+    Returns the directory in which psdb keeps its persistent caches, or None
+    if caching has been disabled.  The location can be overridden by setting
+    the PSDB_CACHE_DIR environment variable; setting it to the empty string
+    disables caching entirely.
+    '''
+    path = os.environ.get('PSDB_CACHE_DIR')
+    if path is None:
+        base = (os.environ.get('XDG_CACHE_HOME') or
+                os.path.join(os.path.expanduser('~'), '.cache'))
+        path = os.path.join(base, 'psdb')
+    return path or None
+
+
+def cache_path(name):
+    '''
+    Returns the path of the named cache file, or None if caching is disabled.
+    '''
+    path = cache_dir()
+    return os.path.join(path, name) if path else None
+
+
+def load_json(name):
+    '''
+    Loads the named JSON cache file.  Returns None if caching is disabled or
+    the file is missing or unreadable; a cache is never worth failing over.
+    '''
+    path = cache_path(name)
+    if not path:
+        return None
+
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_json(name, obj):
+    '''
+    Atomically replaces the named JSON cache file.  Failures to write the
+    cache are silently ignored.
+    '''
+    path = cache_path(name)
+    if not path:
+        return
+
+    tmp = '%s.%u.tmp' % (path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, 'w') as f:
+            json.dump(obj, f)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
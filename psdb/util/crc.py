@@ -0,0 +1,36 @@
+# Copyright (c) 2026 Phase Advanced Sensor Systems, Inc.
+import binascii
+
+
+# Translation table that reverses the bit order of each byte.
+BITREV_TABLE = bytes(int('{:08b}'.format(i)[::-1], 2) for i in range(256))
+
+
+def crc32_mpeg2(data):
+    '''
+    Computes the CRC-32/MPEG-2 of the data: polynomial 0x04C11DB7, initial
+    value 0xFFFFFFFF, no reflection and no final XOR.  This is the same CRC
+    as the standard reflected CRC-32 computed on bit-reversed input, so we
+    let binascii do the heavy lifting.
+    '''
+    crc = binascii.crc32(bytes(data).translate(BITREV_TABLE)) ^ 0xFFFFFFFF
+    return int('{:032b}'.format(crc)[::-1], 2)
+
+
+def crc32_stm32(data):
+    '''
+    Computes the CRC that the STM32 CRC units generate in their default
+    configuration, where the data is fed in as little-endian 32-bit words
+    with the most-significant bit of each word first.  The data must be a
+    multiple of 4 bytes in length.
+    '''
+    assert len(data) % 4 == 0
+    mv      = memoryview(data).cast('B')
+    swapped = bytearray(len(mv))
+    for i in range(4):
+        swapped[i::4] = mv[3 - i::4]
+    return crc32_mpeg2(swapped)
+
+
+assert crc32_mpeg2(b'123456789') == 0x0376E6E7
+assert crc32_stm32(b'4321') == crc32_mpeg2(b'1234')